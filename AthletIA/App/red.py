@@ -11,7 +11,8 @@ from django.utils.formats import date_format
 from django.views.decorators.http import require_POST
 from django.utils.html import escape
 
-from api_ejercicio.models import Rutina, RutinaEjercicio, RutinaGuardada
+from api_ejercicio.models import Rutina, RutinaGuardada
+from IA.contenido_rutinas import contenido_rutinas
 from .models import (
     Publicacion, Comentario, Like, FavoritoPublicacion,
     SeguimientoUsuario, Perfil, Tip, ComentarioReporte,
@@ -353,14 +354,12 @@ def compartir_rutina_en_muro(request):
             "nivel_dificultad"
         ).get(id=rutina_id)
 
-        ejercicios = (
-            RutinaEjercicio.objects
-            .filter(rutina=rutina)
-            .select_related("ejercicio")
-            .values("ejercicio__nombre", "ejercicio__descripcion")
-        )
+        ejercicios = [
+            {"ejercicio__nombre": e["nombre"], "ejercicio__descripcion": e["descripcion"]}
+            for e in contenido_rutinas.de_rutina(rutina)
+        ]
 
-        ejercicios_json_str = json.dumps(list(ejercicios))
+        ejercicios_json_str = json.dumps(ejercicios)
 
         nombre_usuario = request.user.first_name or request.user.username
 
@@ -459,17 +458,16 @@ def preview_rutina(request, rutina_id):
     except Rutina.DoesNotExist:
         return JsonResponse({"success": False, "error": "Rutina no encontrada"})
 
-    ejercicios = list(
-        RutinaEjercicio.objects.filter(rutina=rutina)
-        .select_related("ejercicio")
-        .values(
-            "ejercicio__nombre",
-            "ejercicio__descripcion",
-            "repeticiones",
-            "orden",
-            "ejercicio__musculo__nombre",
-        )
-    )
+    ejercicios = [
+        {
+            "ejercicio__nombre": e["nombre"],
+            "ejercicio__descripcion": e["descripcion"],
+            "repeticiones": e["repeticiones"],
+            "orden": e["orden"],
+            "ejercicio__musculo__nombre": e["musculo"],
+        }
+        for e in contenido_rutinas.de_rutina(rutina)
+    ]
 
     total_ejercicios = len(ejercicios)
     musculos = list({e["ejercicio__musculo__nombre"] for e in ejercicios})
@@ -0,0 +1,147 @@
+"""
+Snapshot del perfil para el recomendador y las verificaciones de datos.
+
+Trae en UNA consulta el perfil, su ficha de salud y el "último registro" de
+ProgresoUsuario, ObjetivoUsuario, SuenoUsuario, NutricionRegistro e
+HistorialMedidas mediante subconsultas correlacionadas, en vez de un
+round trip a la base por cada modelo.
+"""
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+from django.db.models import OuterRef, Subquery
+
+from App.models import (
+    Perfil, ProgresoUsuario, ObjetivoUsuario, SuenoUsuario,
+    NutricionRegistro, HistorialMedidas, SaludUsuario
+)
+
+
+@dataclass
+class SnapshotPerfil:
+    perfil: Perfil
+    salud: Optional[SaludUsuario]
+
+    progreso_id: Optional[int] = None
+    altura_cm: Optional[float] = None
+    peso_kg: Optional[float] = None
+
+    objetivo_id: Optional[int] = None
+    objetivo_nombre: Optional[str] = None
+
+    sueno_id: Optional[int] = None
+    horas_dormidas: Optional[float] = None
+    calidad_sueno: Optional[str] = None
+    despertares_nocturnos: Optional[int] = None
+
+    nutricion_id: Optional[int] = None
+    comida: Optional[str] = None
+    calorias: Optional[float] = None
+    proteinas: Optional[float] = None
+
+    medidas_id: Optional[int] = None
+    grasa_corporal: Optional[float] = None
+    masa_muscular: Optional[float] = None
+    cintura_cm: Optional[float] = None
+    cadera_cm: Optional[float] = None
+
+    @property
+    def tiene_progreso(self):
+        return self.progreso_id is not None
+
+    @property
+    def tiene_objetivo(self):
+        return self.objetivo_id is not None
+
+    @property
+    def tiene_sueno(self):
+        return self.sueno_id is not None
+
+    @property
+    def tiene_nutricion(self):
+        return self.nutricion_id is not None
+
+    @property
+    def edad(self):
+        if not self.perfil.fecha_nacimiento:
+            return None
+        return date.today().year - self.perfil.fecha_nacimiento.year
+
+
+# (campo del snapshot, modelo, campo del modelo, orden, filtros extra)
+# El orden incluye "-id" para que todas las columnas salgan de la misma fila.
+_CAMPOS = [
+    ("progreso_id", ProgresoUsuario, "id", ("-fecha", "-id"), {}),
+    ("altura_cm", ProgresoUsuario, "altura_cm", ("-fecha", "-id"), {}),
+    ("peso_kg", ProgresoUsuario, "peso_kg", ("-fecha", "-id"), {}),
+
+    ("objetivo_id", ObjetivoUsuario, "id", ("id",), {"activo": True}),
+    ("objetivo_nombre", ObjetivoUsuario, "tipo_objetivo__nombre", ("id",), {"activo": True}),
+
+    ("sueno_id", SuenoUsuario, "id", ("-fecha", "-id"), {}),
+    ("horas_dormidas", SuenoUsuario, "horas_dormidas", ("-fecha", "-id"), {}),
+    ("calidad_sueno", SuenoUsuario, "calidad_sueno", ("-fecha", "-id"), {}),
+    ("despertares_nocturnos", SuenoUsuario, "despertares_nocturnos", ("-fecha", "-id"), {}),
+
+    ("nutricion_id", NutricionRegistro, "id", ("-fecha", "-id"), {}),
+    ("comida", NutricionRegistro, "comida", ("-fecha", "-id"), {}),
+    ("calorias", NutricionRegistro, "calorias", ("-fecha", "-id"), {}),
+    ("proteinas", NutricionRegistro, "proteinas", ("-fecha", "-id"), {}),
+
+    ("medidas_id", HistorialMedidas, "id", ("-id",), {}),
+    ("grasa_corporal", HistorialMedidas, "grasa_corporal", ("-id",), {}),
+    ("masa_muscular", HistorialMedidas, "masa_muscular", ("-id",), {}),
+    ("cintura_cm", HistorialMedidas, "cintura_cm", ("-id",), {}),
+    ("cadera_cm", HistorialMedidas, "cadera_cm", ("-id",), {}),
+]
+
+
+def _anotaciones():
+    return {
+        f"snap_{nombre}": Subquery(
+            modelo.objects
+            .filter(perfil=OuterRef("pk"), **filtros)
+            .order_by(*orden)
+            .values(campo)[:1]
+        )
+        for nombre, modelo, campo, orden, filtros in _CAMPOS
+    }
+
+
+def _snapshot_desde_fila(fila):
+    return SnapshotPerfil(
+        perfil=fila,
+        salud=fila.salud_usuario,
+        **{nombre: getattr(fila, f"snap_{nombre}") for nombre, *_ in _CAMPOS},
+    )
+
+
+def cargar_snapshot(perfil):
+    """Devuelve el SnapshotPerfil del usuario con una sola consulta."""
+    fila = (
+        Perfil.objects
+        .filter(pk=perfil.pk)
+        .select_related("salud_usuario")
+        .annotate(**_anotaciones())
+        .get()
+    )
+    return _snapshot_desde_fila(fila)
+
+
+def iterar_snapshots(queryset=None, tamano=500, desde_id=0):
+    """
+    Recorre los perfiles de `queryset` en bloques de `tamano` snapshots,
+    paginando por id (keyset) para poder retomar desde `desde_id`.
+    Cada bloque es una sola consulta.
+    """
+    queryset = Perfil.objects.all() if queryset is None else queryset
+    base = queryset.select_related("salud_usuario").annotate(**_anotaciones()).order_by("pk")
+
+    ultimo_id = desde_id
+    while True:
+        bloque = list(base.filter(pk__gt=ultimo_id)[:tamano])
+        if not bloque:
+            return
+        ultimo_id = bloque[-1].pk
+        yield [_snapshot_desde_fila(fila) for fila in bloque]
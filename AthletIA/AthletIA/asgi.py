@@ -3,6 +3,15 @@ ASGI config for AthletIA project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Con IA_CHAT_ASINCRONO=1 el chat del coach usa vistas async (IA/chat_async.py)
+y las esperas a Ollama no ocupan hilos del servidor:
+
+    IA_CHAT_ASINCRONO=1 uvicorn AthletIA.asgi:application --workers 2
+
+Las vistas síncronas del resto del sitio comparten un hilo por proceso bajo
+ASGI; conviene usar varios workers (o enrutar solo /ia/chat_api/ a ASGI y
+dejar el resto en wsgi.py).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -151,4 +151,124 @@ GOOGLE_API_SCOPES = ['https://www.googleapis.com/auth/calendar.events']
 if DEBUG:
     os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
-GOOGLE_REDIRECT_URI = 'http://127.0.0.1:8000/api/IA/google/callback/'
\ No newline at end of file
+GOOGLE_REDIRECT_URI = 'http://127.0.0.1:8000/api/IA/google/callback/'
+
+
+# ==========================================================
+# IA AthletIA
+# ==========================================================
+
+# Cargar el modelo del recomendador al arrancar (en vez de en la primera petición)
+IA_PRECALENTAR_MODELO = os.environ.get("IA_PRECALENTAR_MODELO", "0") == "1"
+
+# Micro-lotes del recomendador: ventana de espera (ms) y tamaño máximo del lote
+IA_LOTE_VENTANA_MS = 5
+IA_LOTE_MAX = 32
+IA_LOTE_TIMEOUT_S = 30.0          # espera máxima de una petición por su resultado
+
+# Inferencia con forward pass compilado (tf.function) en vez de model.predict
+IA_INFERENCIA_COMPILADA = True
+
+# Caché LRU de predicciones del recomendador (número máximo de entradas)
+IA_CACHE_RECOMENDACIONES_MAX = 2048
+
+# Índice en memoria de ejercicios del recomendador: segundos antes de releer el catálogo
+IA_INDICE_EJERCICIOS_TTL = 600
+
+# Auditoría del recomendador (RecomendacionIA): escritura diferida vía spool local
+IA_AUDITORIA_ASINCRONA = True
+IA_AUDITORIA_LOTE = 50            # filas que disparan un bulk_create
+IA_AUDITORIA_INTERVALO_S = 2.0    # segundos máximos entre vaciados
+IA_AUDITORIA_FSYNC = False        # fsync por fila (más durable, más lento)
+IA_AUDITORIA_MAX_INTENTOS = 3     # vaciados fallidos antes de insertar un archivo fila por fila
+IA_AUDITORIA_SPOOL_DIR = os.path.join(BASE_DIR, "spool", "auditoria_ia")
+
+# Registro de versiones del modelo (subcarpetas de IA/modelos).
+# La selección en IA_MODELO_ESTADO_ARCHIVO (manage.py modelo_ia) tiene prioridad.
+IA_MODELO_ACTIVO = os.environ.get("IA_MODELO_ACTIVO", "")   # "" = versión histórica
+IA_MODELO_SOMBRA = os.environ.get("IA_MODELO_SOMBRA", "")   # "" = sin sombra
+IA_MODELO_ESTADO_ARCHIVO = os.path.join(BASE_DIR, "spool", "modelo_activo.json")
+IA_MODELO_SONDEO_S = 5                  # cada cuánto se relee la selección
+IA_MODELO_SOMBRA_MAX_PENDIENTES = 64    # lotes en cola para la sombra antes de descartar
+
+# Feed del calendario: días que se recuerdan los eventos borrados para
+# /ia/calendario/eventos/?since=<token> (un token más viejo recarga todo)
+IA_CALENDARIO_SYNC_RETENCION_DIAS = 30
+IA_CALENDARIO_MAX_FECHAS_PROGRAMAR = 366   # fechas por petición a /ia/calendario/programar/
+
+# Caché de los ejercicios de cada rutina (calendario, guardadas, muro, detalle)
+IA_CONTENIDO_RUTINAS_MAX = 4096
+IA_CONTENIDO_RUTINAS_TTL_S = 600
+
+# ==========================================================
+# Chat del coach (Ollama)
+# ==========================================================
+
+# Servidor de Ollama; None = OLLAMA_HOST del entorno o http://127.0.0.1:11434
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST") or None
+
+# Modelo del coach y cuánto lo mantiene Ollama en memoria tras cada llamada
+IA_CHAT_MODELO = os.environ.get("IA_CHAT_MODELO", "phi3")
+IA_CHAT_KEEP_ALIVE = os.environ.get("IA_CHAT_KEEP_ALIVE", "30m")
+
+# Cargar el modelo al arrancar y volver a tocarlo cada N segundos (< keep_alive)
+IA_CHAT_CALENTAR = os.environ.get("IA_CHAT_CALENTAR", "0") == "1"
+IA_CHAT_CALENTAR_INTERVALO_S = 600
+IA_CHAT_SALUD_CACHE_S = 5       # /ia/chat_api/salud/ reutiliza la consulta a Ollama (/api/ps)
+
+# Vistas async del chat (requiere servir con AthletIA/asgi.py)
+IA_CHAT_ASINCRONO = os.environ.get("IA_CHAT_ASINCRONO", "0") == "1"
+IA_CHAT_MAX_CONEXIONES = 8      # pool httpx hacia Ollama
+IA_CHAT_TIMEOUT_S = 120
+
+# Admisión del chat (IA/admision_chat.py); vale para las vistas sync y async
+IA_CHAT_MAX_CONCURRENCIA = 4    # generaciones simultáneas por proceso (~ OLLAMA_NUM_PARALLEL)
+IA_CHAT_MAX_COLA = 16           # chats esperando cupo; sobre esto se responde "ocupado"
+IA_CHAT_ESPERA_MAX_S = 30
+IA_CHAT_LIMITE_POR_MINUTO = 20  # mensajes al modelo por usuario (0 = sin límite)
+
+# Contexto del chat: turnos recientes que caben en el presupuesto + resumen del resto
+IA_CHAT_PRESUPUESTO_TOKENS = 1024
+IA_CHAT_MIN_PARA_RESUMIR = 6     # mensajes fuera de la ventana antes de resumir
+
+# Bloque con los datos del usuario en el prompt (IA/contexto_usuario.py)
+IA_CHAT_CONTEXTO_USUARIO = True
+IA_CHAT_CONTEXTO_USUARIO_MAX_TOKENS = 150
+IA_CHAT_CONTEXTO_USUARIO_TTL_S = 900
+
+# Fragmentos del catálogo (ejercicios y tips) en el prompt (IA/busqueda_catalogo.py)
+IA_CHAT_RAG = True
+IA_CHAT_RAG_K = 3
+IA_CHAT_RAG_MAX_TOKENS = 200
+IA_CHAT_RAG_TTL_S = 600
+
+# Caché de respuestas a preguntas de primer turno (0 = desactivada)
+IA_CHAT_CACHE_MAX = 512
+IA_CHAT_CACHE_TTL_S = 3600
+
+# Métricas por petición del chat (IA/metricas_chat.py): peticiones en la ventana
+# de percentiles del panel y archivo opcional con una línea JSON por petición
+IA_CHAT_METRICAS_VENTANA = 1000
+IA_CHAT_METRICAS_LOG = os.environ.get("IA_CHAT_METRICAS_LOG") or None
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "formatters": {
+        "json": {"format": "%(message)s"},
+        "simple": {"format": "%(asctime)s %(levelname)s %(name)s: %(message)s"},
+    },
+    "handlers": {
+        "metricas_chat": (
+            {"class": "logging.handlers.WatchedFileHandler", "filename": IA_CHAT_METRICAS_LOG, "formatter": "json"}
+            if IA_CHAT_METRICAS_LOG else
+            {"class": "logging.StreamHandler", "formatter": "json"}
+        ),
+        "consola": {"class": "logging.StreamHandler", "formatter": "simple"},
+    },
+    "loggers": {
+        "IA.chat.metricas": {"handlers": ["metricas_chat"], "level": "INFO", "propagate": False},
+        # Cambios de versión del recomendador y resúmenes de la sombra (IA/registro_modelos.py)
+        "IA.modelos": {"handlers": ["consola"], "level": "INFO", "propagate": False},
+    },
+}
@@ -3,7 +3,12 @@ from django.urls import path, include
 from django.conf.urls.static import static
 from django.conf import settings
 from App import views 
-from IA.chat_virtual import chat_view, chat_api
+from IA.chat_virtual import chat_view, chat_api, chat_api_stream, estado_chat, salud_chat, panel_metricas_chat
+from IA.chat_async import chat_api_async, chat_api_stream_async
+
+# Servido con ASGI (AthletIA/asgi.py), el chat espera a Ollama sin retener un hilo
+if getattr(settings, "IA_CHAT_ASINCRONO", False):
+    chat_api, chat_api_stream = chat_api_async, chat_api_stream_async
 
 urlpatterns = [
     path('', views.index, name='base'), 
@@ -12,6 +17,10 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path("ia/chat/", chat_view, name="chat_view"),
     path("ia/chat_api/", chat_api, name="chat_api"),
+    path("ia/chat_api/stream/", chat_api_stream, name="chat_api_stream"),
+    path("ia/chat_api/estado/", estado_chat, name="estado_chat"),
+    path("ia/chat_api/salud/", salud_chat, name="salud_chat"),
+    path("panel-admin/chat/", panel_metricas_chat, name="panel_metricas_chat"),
     path('ia/', include('IA.urls')),
 ]
 
@@ -0,0 +1,163 @@
+"""
+Resumen mensual de adherencia del calendario (KPI mensual).
+
+obtener_kpi_mensual contaba las rutinas del mes, volvía a contar las
+completadas y recorría las filas para armar `dias_completados` en cada
+llamada. Ahora lee una fila de AdherenciaMensual (perfil, año, mes: índice
+único) con esos totales ya calculados, para cualquier mes.
+
+La fila se mantiene por diferencias: al guardar o borrar un CalendarioRutina
+se compara con cómo estaba al leerlo (post_init, sin consultas extra), y
+solo si cambió el mes, el perfil o `completada` se suma/resta en el mes que
+corresponde, con la fila bloqueada en la misma transacción del cambio.
+Marcar una rutina (actualizar_rutina_calendario) o moverla de día
+(mover_rutina_calendario) toca a lo más dos filas; editar solo las notas o
+la hora no toca ninguna. bulk_create no emite señales: quien lo use llama a
+registrar_nuevas(). Si algo se desalinea (un .update() sobre `completada`,
+SQL a mano), `python manage.py recalcular_adherencia` lo rehace desde el
+calendario.
+"""
+from collections import defaultdict
+from datetime import date
+
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from App.models import Perfil
+from api_ejercicio.models import AdherenciaMensual, CalendarioRutina
+
+
+def _fecha(valor):
+    # Quien crea el evento puede haber pasado la fecha como texto
+    return date.fromisoformat(valor[:10]) if isinstance(valor, str) else valor
+
+
+def _estado(evento):
+    """(perfil_id, fecha, completada) del evento, sin cargar campos diferidos."""
+    campos = evento.__dict__
+    if "perfil_id" not in campos or "fecha" not in campos or "completada" not in campos:
+        return None
+    if campos["perfil_id"] is None or campos["fecha"] is None:
+        return None
+    return campos["perfil_id"], _fecha(campos["fecha"]), bool(campos["completada"])
+
+
+def _sumar(cambios, estado, signo):
+    perfil_id, fecha, completada = estado
+    cambio = cambios[(perfil_id, fecha.year, fecha.month)]
+    cambio["programadas"] += signo
+    if completada:
+        cambio["completadas"] += signo
+        cambio["dias"][fecha.day] += signo
+
+
+def _nuevos_cambios():
+    return defaultdict(lambda: {"programadas": 0, "completadas": 0, "dias": defaultdict(int)})
+
+
+def aplicar(cambios):
+    """Suma {(perfil_id, año, mes): cambio} a sus filas, creándolas si faltan."""
+    with transaction.atomic():
+        for (perfil_id, anio, mes), cambio in sorted(cambios.items()):
+            dias = {dia: n for dia, n in cambio["dias"].items() if n}
+            if not cambio["programadas"] and not cambio["completadas"] and not dias:
+                continue
+            fila, _ = AdherenciaMensual.objects.select_for_update().get_or_create(
+                perfil_id=perfil_id, anio=anio, mes=mes
+            )
+            fila.programadas = max(fila.programadas + cambio["programadas"], 0)
+            fila.completadas = max(fila.completadas + cambio["completadas"], 0)
+            for dia, n in dias.items():
+                total = fila.dias_completados.get(str(dia), 0) + n
+                if total > 0:
+                    fila.dias_completados[str(dia)] = total
+                else:
+                    fila.dias_completados.pop(str(dia), None)
+            fila.save()
+
+
+def registrar_nuevas(perfil_id, fechas, completada=False):
+    """Para eventos creados con bulk_create (no emite post_save)."""
+    cambios = _nuevos_cambios()
+    for fecha in fechas:
+        _sumar(cambios, (perfil_id, _fecha(fecha), completada), +1)
+    aplicar(cambios)
+
+
+def del_mes(perfil_id, anio, mes):
+    """Totales del mes desde el resumen: una consulta por (perfil, año, mes)."""
+    fila = (
+        AdherenciaMensual.objects
+        .filter(perfil_id=perfil_id, anio=anio, mes=mes)
+        .values("programadas", "completadas", "dias_completados")
+        .first()
+    )
+    return fila or {"programadas": 0, "completadas": 0, "dias_completados": {}}
+
+
+def reconstruir(perfil_ids=None):
+    """Rehace el resumen desde CalendarioRutina; devuelve cuántos meses quedaron."""
+    eventos = CalendarioRutina.objects.all()
+    resumenes = AdherenciaMensual.objects.all()
+    if perfil_ids is not None:
+        eventos = eventos.filter(perfil_id__in=perfil_ids)
+        resumenes = resumenes.filter(perfil_id__in=perfil_ids)
+
+    cambios = _nuevos_cambios()
+    for estado in eventos.values_list("perfil_id", "fecha", "completada").iterator():
+        _sumar(cambios, estado, +1)
+
+    with transaction.atomic():
+        resumenes.delete()
+        AdherenciaMensual.objects.bulk_create([
+            AdherenciaMensual(
+                perfil_id=perfil_id, anio=anio, mes=mes,
+                programadas=cambio["programadas"], completadas=cambio["completadas"],
+                dias_completados={str(dia): n for dia, n in sorted(cambio["dias"].items())},
+            )
+            for (perfil_id, anio, mes), cambio in cambios.items()
+        ], batch_size=500)
+    return len(cambios)
+
+
+# ==========================================================
+# Mantenimiento por señales
+# ==========================================================
+@receiver(post_init, sender=CalendarioRutina)
+def recordar_estado(sender, instance, **kwargs):
+    instance._adherencia = _estado(instance)
+
+
+@receiver(post_save, sender=CalendarioRutina)
+def actualizar_adherencia(sender, instance, created=False, **kwargs):
+    antes = None if created else getattr(instance, "_adherencia", None)
+    ahora = _estado(instance)
+    if not created and antes is None:
+        # Se leyó sin esos campos (.only/.defer): no hay con qué comparar
+        reconstruir([instance.perfil_id])
+        instance._adherencia = ahora
+        return
+    if antes == ahora:
+        return
+    cambios = _nuevos_cambios()
+    if antes is not None:
+        _sumar(cambios, antes, -1)
+    if ahora is not None:
+        _sumar(cambios, ahora, +1)
+    aplicar(cambios)
+    instance._adherencia = ahora
+
+
+@receiver(post_delete, sender=CalendarioRutina)
+def descontar_adherencia(sender, instance, origin=None, **kwargs):
+    # Al borrar el perfil, su resumen se va en cascada
+    if isinstance(origin, Perfil):
+        return
+    antes = getattr(instance, "_adherencia", None)
+    if antes is None:
+        reconstruir([instance.perfil_id])
+        return
+    cambios = _nuevos_cambios()
+    _sumar(cambios, antes, -1)
+    aplicar(cambios)
@@ -0,0 +1,263 @@
+"""
+Control de admisión para las llamadas del chat a Ollama.
+
+Un Ollama local genera de a una respuesta (o unas pocas): si todos los chats
+le llegan a la vez, se encolan dentro de Ollama y vencen juntos. Aquí se
+decide antes de llamar:
+
+- límite por usuario (IA_CHAT_LIMITE_POR_MINUTO mensajes al modelo por minuto),
+- a lo más IA_CHAT_MAX_CONCURRENCIA generaciones en curso por proceso,
+- una cola acotada (IA_CHAT_MAX_COLA) con espera máxima IA_CHAT_ESPERA_MAX_S.
+
+Si la cola está llena o el usuario pasó su límite se responde al tiro
+"ocupado, intenta de nuevo" (503 / 429 con Retry-After) en vez de esperar
+a que venza el timeout. Las vistas síncronas usan `turno()` y las async
+`aturno()`; ambos toman cupos del mismo contador (protegido por un lock), así
+que el límite vale para el proceso completo aunque convivan los dos modos.
+"""
+import asyncio
+import contextlib
+import math
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.http import JsonResponse
+
+
+VENTANA_ESPERAS = 1000
+MAX_USUARIOS_LIMITE = 10000   # usuarios recordados por el límite por minuto
+
+# Lugar en la cola que admitir() reservó para el turno siguiente de esta petición
+_reserva_actual = ContextVar("reserva_admision", default=None)
+
+
+class ChatOcupado(Exception):
+
+    def __init__(self, motivo, reintentar_s):
+        super().__init__(motivo)
+        self.motivo = motivo            # "limite", "cola" o "espera"
+        self.reintentar_s = reintentar_s
+
+
+def mensaje_ocupado(error):
+    if error.motivo == "limite":
+        return "⏳ Estás enviando mensajes muy rápido. Espera unos segundos e intenta de nuevo."
+    return "⏳ El coach está atendiendo a muchas personas. Intenta de nuevo en unos segundos."
+
+
+def respuesta_ocupado(error):
+    respuesta = JsonResponse(
+        {"respuesta": mensaje_ocupado(error), "ocupado": True},
+        status=429 if error.motivo == "limite" else 503,
+    )
+    respuesta["Retry-After"] = str(max(1, math.ceil(error.reintentar_s)))
+    return respuesta
+
+
+def clave_usuario(request, user):
+    return f"u{user.pk}" if user.is_authenticated else f"ip{request.META.get('REMOTE_ADDR', '')}"
+
+
+class _Espera:
+    """Un llamador en la cola de cupos; `avisar` lo despierta cuando se le cede uno."""
+
+    __slots__ = ("avisar", "concedido")
+
+    def __init__(self, avisar):
+        self.avisar = avisar
+        self.concedido = False
+
+
+def _resolver(futuro):
+    if not futuro.done():
+        futuro.set_result(None)
+
+
+class ControlAdmision:
+
+    def __init__(self, max_concurrencia=4, max_cola=16, espera_max_s=30, limite_por_minuto=20):
+        self.max_concurrencia = max_concurrencia
+        self.max_cola = max_cola
+        self.espera_max_s = espera_max_s
+        self.limite_por_minuto = limite_por_minuto
+
+        # Un solo contador de cupos para turno() y aturno(): en_curso son los
+        # cupos tomados y _cola los que esperan, en orden de llegada.
+        self._lock = threading.Lock()
+        self._cola = deque()
+        self._reservas = {}                            # Reserva -> vencimiento
+        self._envios = {}                              # usuario -> deque de instantes
+
+        self.en_curso = 0
+        self.esperando = 0
+        self.admitidas = 0
+        self.rechazos = {"limite": 0, "cola": 0, "espera": 0}
+        self._esperas = deque(maxlen=VENTANA_ESPERAS)
+
+    # ------------------------------------------------------
+    # Decisión rápida (antes de responder)
+    # ------------------------------------------------------
+    def admitir(self, usuario):
+        """
+        Lanza ChatOcupado si el usuario pasó su límite o la cola está llena.
+        Si admite, deja reservado un lugar en la cola (cuenta en `esperando`)
+        que el siguiente turno()/aturno() de este contexto ocupa; si nadie lo
+        ocupa, vence a los espera_max_s.
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            self._vencer_reservas(ahora)
+            if self.esperando >= self.max_cola:
+                self.rechazos["cola"] += 1
+                raise ChatOcupado("cola", self.espera_max_s / 2)
+
+            if self.limite_por_minuto:
+                envios = self._envios.get(usuario)
+                if envios is None:
+                    if len(self._envios) >= MAX_USUARIOS_LIMITE:
+                        self._purgar(ahora)
+                    envios = self._envios[usuario] = deque()
+                while envios and ahora - envios[0] >= 60:
+                    envios.popleft()
+                if len(envios) >= self.limite_por_minuto:
+                    self.rechazos["limite"] += 1
+                    raise ChatOcupado("limite", 60 - (ahora - envios[0]))
+                envios.append(ahora)
+
+            reserva = object()
+            self._reservas[reserva] = ahora + self.espera_max_s
+            self.esperando += 1
+            self.admitidas += 1
+        _reserva_actual.set(reserva)
+
+    def _purgar(self, ahora):
+        for usuario in [u for u, e in self._envios.items() if not e or ahora - e[-1] >= 60]:
+            del self._envios[usuario]
+
+    def _vencer_reservas(self, ahora):
+        for reserva in [r for r, vence in self._reservas.items() if vence <= ahora]:
+            del self._reservas[reserva]
+            self.esperando -= 1
+
+    # ------------------------------------------------------
+    # Espera por un cupo de generación
+    # ------------------------------------------------------
+    def _pedir(self, espera):
+        """Entra a la cola (o ocupa la reserva de admitir) y toma un cupo si hay uno libre."""
+        reserva = _reserva_actual.get()
+        if reserva is not None:
+            _reserva_actual.set(None)
+        with self._lock:
+            if self._reservas.pop(reserva, None) is None:
+                self.esperando += 1
+            if self.en_curso < self.max_concurrencia and not self._cola:
+                self.en_curso += 1
+                espera.concedido = True
+            else:
+                self._cola.append(espera)
+        return time.monotonic()
+
+    def _salir_cola(self, espera, t0):
+        with self._lock:
+            self.esperando -= 1
+            if espera.concedido:
+                self._esperas.append(time.monotonic() - t0)
+                return
+            self._cola.remove(espera)
+            self.rechazos["espera"] += 1
+        raise ChatOcupado("espera", self.espera_max_s / 2)
+
+    def _abandonar(self, espera):
+        """El llamador dejó de esperar (cliente desconectado): devuelve el cupo si alcanzó a recibirlo."""
+        with self._lock:
+            self.esperando -= 1
+            if espera.concedido:
+                self._ceder()
+            else:
+                self._cola.remove(espera)
+
+    def _liberar(self):
+        with self._lock:
+            self._ceder()
+
+    def _ceder(self):
+        # Con el lock tomado: el cupo pasa directo al primero de la cola
+        while self._cola:
+            espera = self._cola.popleft()
+            espera.concedido = True
+            try:
+                espera.avisar()
+                return
+            except RuntimeError:
+                # Su event loop ya se cerró: nadie lo va a usar
+                continue
+        self.en_curso -= 1
+
+    @contextlib.contextmanager
+    def turno(self):
+        evento = threading.Event()
+        espera = _Espera(evento.set)
+        t0 = self._pedir(espera)
+        try:
+            if not espera.concedido:
+                evento.wait(self.espera_max_s)
+        except BaseException:
+            self._abandonar(espera)
+            raise
+        self._salir_cola(espera, t0)
+        try:
+            yield
+        finally:
+            self._liberar()
+
+    @contextlib.asynccontextmanager
+    async def aturno(self):
+        loop = asyncio.get_running_loop()
+        futuro = loop.create_future()
+        espera = _Espera(lambda: loop.call_soon_threadsafe(_resolver, futuro))
+        t0 = self._pedir(espera)
+        try:
+            if not espera.concedido:
+                await asyncio.wait_for(futuro, self.espera_max_s)
+        except asyncio.TimeoutError:
+            pass    # _salir_cola decide con `concedido`, que pudo llegar junto con el timeout
+        except BaseException:
+            self._abandonar(espera)
+            raise
+        self._salir_cola(espera, t0)
+        try:
+            yield
+        finally:
+            self._liberar()
+
+    def estadisticas(self):
+        with self._lock:
+            self._vencer_reservas(time.monotonic())
+            esperas = sorted(self._esperas)
+
+        def p(q):
+            return round(esperas[min(int(len(esperas) * q / 100), len(esperas) - 1)] * 1000, 1) if esperas else None
+
+        return {
+            "en_curso": self.en_curso,
+            "esperando": self.esperando,
+            "max_concurrencia": self.max_concurrencia,
+            "max_cola": self.max_cola,
+            "espera_max_s": self.espera_max_s,
+            "limite_por_minuto": self.limite_por_minuto,
+            "admitidas": self.admitidas,
+            "rechazos": dict(self.rechazos),
+            "espera_p50_ms": p(50),
+            "espera_p95_ms": p(95),
+        }
+
+
+control_admision = ControlAdmision(
+    max_concurrencia=getattr(settings, "IA_CHAT_MAX_CONCURRENCIA", 4),
+    max_cola=getattr(settings, "IA_CHAT_MAX_COLA", 16),
+    espera_max_s=getattr(settings, "IA_CHAT_ESPERA_MAX_S", 30),
+    limite_por_minuto=getattr(settings, "IA_CHAT_LIMITE_POR_MINUTO", 20),
+)
@@ -1,6 +1,28 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class IaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'IA'
+
+    def ready(self):
+        # Registra las señales que invalidan el índice de ejercicios, el contexto del chat
+        # y el contenido de las rutinas, marcan los cambios del calendario y
+        # mantienen su resumen mensual
+        from . import indice_ejercicios  # noqa: F401
+        from . import contexto_usuario  # noqa: F401
+        from . import busqueda_catalogo  # noqa: F401
+        from . import sync_calendario  # noqa: F401
+        from . import contenido_rutinas  # noqa: F401
+        from . import adherencia_mensual  # noqa: F401
+
+        # Precarga opcional del modelo AthletIA al arrancar el proceso
+        if getattr(settings, "IA_PRECALENTAR_MODELO", False):
+            from .ia import precalentar
+            precalentar()
+
+        # Carga y mantiene caliente el modelo del chat en Ollama
+        if getattr(settings, "IA_CHAT_CALENTAR", False):
+            from .backend_chat import backend_chat
+            backend_chat.iniciar()
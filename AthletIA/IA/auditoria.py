@@ -0,0 +1,248 @@
+"""
+Escritura diferida y por lotes de los registros RecomendacionIA.
+
+recomendar_rutina ya no inserta su fila de auditoría antes de responder:
+la agrega a un archivo spool local (JSON por línea) y un hilo en segundo plano
+la inserta con bulk_create cuando se juntan IA_AUDITORIA_LOTE filas o pasan
+IA_AUDITORIA_INTERVALO_S segundos.
+
+El spool es la cola: si el proceso muere, las filas siguen en disco y se
+insertan en el próximo vaciado (de este u otro proceso). Nota: como
+fecha_recomendacion es auto_now_add, queda con la hora de inserción.
+
+La entrega es "al menos una vez": si el proceso muere entre el commit de un
+archivo y su os.remove, el archivo se vuelve a insertar y sus filas quedan
+duplicadas.
+
+Si un archivo falla IA_AUDITORIA_MAX_INTENTOS veces seguidas (p. ej. una
+fila cuyo perfil se borró antes del vaciado rompe la FK de todo el
+bulk_create), sus filas se insertan de a una y las que la BD rechaza se
+apartan en un `.error` junto al spool. Un archivo que falla no detiene el
+vaciado de los demás.
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DataError, IntegrityError, close_old_connections, transaction
+
+from .models import RecomendacionIA
+
+
+CAMPOS = (
+    "perfil_id", "rutina_recomendada", "top3_recomendaciones", "ejercicios",
+    "parametros_entrada", "precision_modelo", "modelo_version", "estado",
+)
+
+
+class EscritorAuditoria:
+
+    def __init__(self, directorio, lote=50, intervalo_s=2.0, huerfano_s=120, max_intentos=3):
+        self.directorio = directorio
+        self.lote = max(int(lote), 1)
+        self.intervalo_s = intervalo_s
+        self.max_intentos = max(int(max_intentos), 1)
+        # Un spool sin tocar por más de esto pertenece a un proceso muerto
+        self.huerfano_s = max(huerfano_s, 10 * intervalo_s)
+        self._lock = threading.Lock()
+        self._vaciando = threading.Lock()
+        self._evento = threading.Event()
+        self._pendientes = 0
+        self._hilo = None
+        self._pid = None
+        self._intentos = {}          # archivo .procesando -> vaciados fallidos seguidos
+        self.insertadas = 0
+        self.errores = 0
+        self.rechazadas = 0
+
+    # ------------------------------------------------------
+    # Rutas del spool (una por proceso)
+    # ------------------------------------------------------
+    @property
+    def _spool(self):
+        return os.path.join(self.directorio, f"spool-{os.getpid()}.jsonl")
+
+    def _asegurar_hilo(self):
+        if self._hilo is not None and self._hilo.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive() and self._pid == os.getpid():
+                return
+            os.makedirs(self.directorio, exist_ok=True)
+            self._pid = os.getpid()
+            self._pendientes = 0
+            self._hilo = threading.Thread(target=self._bucle, name="ia-auditoria", daemon=True)
+            self._hilo.start()
+
+    # ------------------------------------------------------
+    # API
+    # ------------------------------------------------------
+    def registrar(self, **datos):
+        """Agrega una fila al spool; se insertará en el próximo vaciado."""
+        self._asegurar_hilo()
+        linea = json.dumps({c: datos.get(c) for c in CAMPOS}, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+        with self._lock:
+            with open(self._spool, "a", encoding="utf-8") as f:
+                f.write(linea + "\n")
+                f.flush()
+                if getattr(settings, "IA_AUDITORIA_FSYNC", False):
+                    os.fsync(f.fileno())
+            self._pendientes += 1
+            if self._pendientes >= self.lote:
+                self._evento.set()
+
+    def vaciar(self):
+        """Inserta todo lo pendiente (propio y huérfano). Devuelve filas insertadas."""
+        with self._vaciando:
+            self._rotar_spool_propio()
+            self._reclamar_huerfanos()
+
+            total = 0
+            for ruta in sorted(glob.glob(os.path.join(self.directorio, f"*-{os.getpid()}-*.procesando"))):
+                try:
+                    total += self._insertar_archivo(ruta, de_a_una=self._intentos.get(ruta, 0) >= self.max_intentos)
+                    self._intentos.pop(ruta, None)
+                except Exception as e:
+                    # Se reintenta en el próximo vaciado; mtime al día = sigue siendo nuestro.
+                    # Los demás archivos se procesan igual.
+                    self._intentos[ruta] = self._intentos.get(ruta, 0) + 1
+                    self.errores += 1
+                    print(f"🔥 ERROR auditoría IA ({os.path.basename(ruta)}, intento {self._intentos[ruta]}):", e)
+                    try:
+                        os.utime(ruta)
+                    except OSError:
+                        self._intentos.pop(ruta, None)
+            return total
+
+    def estadisticas(self):
+        return {
+            "pendientes": self._pendientes,
+            "insertadas": self.insertadas,
+            "errores": self.errores,
+            "rechazadas": self.rechazadas,
+            "lote": self.lote,
+            "intervalo_s": self.intervalo_s,
+        }
+
+    # ------------------------------------------------------
+    # Internos
+    # ------------------------------------------------------
+    def _bucle(self):
+        while True:
+            self._evento.wait(self.intervalo_s)
+            self._evento.clear()
+            try:
+                self.vaciar()
+            except Exception as e:
+                self.errores += 1
+                print("🔥 ERROR auditoría IA:", e)
+
+    def _nombre_procesando(self):
+        return os.path.join(self.directorio, f"{int(time.time() * 1000)}-{os.getpid()}-{uuid.uuid4().hex[:8]}.procesando")
+
+    def _rotar_spool_propio(self):
+        with self._lock:
+            if not os.path.exists(self._spool):
+                self._pendientes = 0
+                return
+            os.replace(self._spool, self._nombre_procesando())
+            self._pendientes = 0
+
+    def _reclamar_huerfanos(self):
+        propios = (os.path.abspath(self._spool), f"-{os.getpid()}-")
+        limite = time.time() - self.huerfano_s
+        candidatos = glob.glob(os.path.join(self.directorio, "spool-*.jsonl")) + glob.glob(os.path.join(self.directorio, "*.procesando"))
+        for ruta in candidatos:
+            if os.path.abspath(ruta) == propios[0] or propios[1] in os.path.basename(ruta):
+                continue
+            try:
+                if os.path.getmtime(ruta) < limite:
+                    os.replace(ruta, self._nombre_procesando())
+            except OSError:
+                continue  # otro proceso lo reclamó primero
+
+    def _insertar_archivo(self, ruta, de_a_una=False):
+        filas = []
+        try:
+            with open(ruta, encoding="utf-8") as f:
+                for linea in f:
+                    try:
+                        filas.append(json.loads(linea))
+                    except ValueError:
+                        continue  # línea a medio escribir por una caída
+        except FileNotFoundError:
+            return 0
+
+        insertadas = filas
+        if filas:
+            close_old_connections()
+            if de_a_una:
+                insertadas = self._insertar_de_a_una(ruta, filas)
+            else:
+                with transaction.atomic():
+                    RecomendacionIA.objects.bulk_create(
+                        [RecomendacionIA(**fila) for fila in filas],
+                        batch_size=self.lote,
+                    )
+            # bulk_create no envía post_save: el bloque de contexto del chat se invalida aquí
+            from .contexto_usuario import contexto_usuario
+            contexto_usuario.invalidar({fila["perfil_id"] for fila in insertadas})
+        os.remove(ruta)
+        self.insertadas += len(insertadas)
+        return len(insertadas)
+
+    def _insertar_de_a_una(self, ruta, filas):
+        """
+        Inserta cada fila en su propia transacción y aparta en `<ruta>.error`
+        las que la BD rechaza por su contenido. Un error de conexión se
+        propaga: el archivo completo se reintenta en el próximo vaciado.
+        """
+        insertadas, rechazadas = [], []
+        for fila in filas:
+            try:
+                with transaction.atomic():
+                    RecomendacionIA.objects.create(**fila)
+                insertadas.append(fila)
+            except (IntegrityError, DataError, TypeError, ValueError) as e:
+                rechazadas.append({**fila, "_error": str(e)})
+
+        if rechazadas:
+            with open(f"{ruta}.error", "a", encoding="utf-8") as f:
+                for fila in rechazadas:
+                    f.write(json.dumps(fila, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n")
+            self.rechazadas += len(rechazadas)
+            print(f"⚠️ Auditoría IA: {len(rechazadas)} fila(s) rechazadas, apartadas en {os.path.basename(ruta)}.error")
+        return insertadas
+
+
+escritor_auditoria = EscritorAuditoria(
+    directorio=getattr(settings, "IA_AUDITORIA_SPOOL_DIR", os.path.join(settings.BASE_DIR, "spool", "auditoria_ia")),
+    lote=getattr(settings, "IA_AUDITORIA_LOTE", 50),
+    intervalo_s=getattr(settings, "IA_AUDITORIA_INTERVALO_S", 2.0),
+    max_intentos=getattr(settings, "IA_AUDITORIA_MAX_INTENTOS", 3),
+)
+
+
+def registrar_recomendacion(**datos):
+    """Punto de entrada para las vistas: diferido o síncrono según settings."""
+    if getattr(settings, "IA_AUDITORIA_ASINCRONA", True):
+        escritor_auditoria.registrar(**datos)
+    else:
+        RecomendacionIA.objects.create(**{c: datos.get(c) for c in CAMPOS})
+
+
+@atexit.register
+def _vaciar_al_salir():
+    # Solo si este proceso llegó a escribir algo
+    if escritor_auditoria._pid == os.getpid():
+        try:
+            escritor_auditoria.vaciar()
+        except Exception as e:
+            print("🔥 ERROR vaciando auditoría IA al salir:", e)
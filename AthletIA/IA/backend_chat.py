@@ -0,0 +1,157 @@
+"""
+Configuración del backend Ollama del chat y su precalentamiento.
+
+Ollama descarga el modelo tras `keep_alive` sin uso, y la primera pregunta
+después paga varios segundos de carga antes del primer token. Aquí quedan
+juntos el modelo (IA_CHAT_MODELO), el keep_alive que se manda en cada
+llamada (IA_CHAT_KEEP_ALIVE) y un hilo que, con IA_CHAT_CALENTAR=1, carga el
+modelo al arrancar el proceso y lo vuelve a "tocar" cada
+IA_CHAT_CALENTAR_INTERVALO_S (menos que keep_alive), para que el usuario
+nunca sea el que lo carga. /ia/chat_api/salud/ informa si está listo; la
+consulta a Ollama (/api/ps) se reutiliza por IA_CHAT_SALUD_CACHE_S segundos,
+así sondear ese endpoint (no pide sesión) no se traduce en una llamada a
+Ollama por petición.
+"""
+import os
+import threading
+import time
+
+import ollama
+from django.conf import settings
+
+
+class BackendChat:
+
+    def __init__(self, host=None, modelo="phi3", keep_alive="30m", intervalo_s=600, timeout_s=120,
+                 timeout_salud_s=2, salud_cache_s=5):
+        self.host = host
+        self.modelo = modelo
+        self.keep_alive = keep_alive
+        self.intervalo_s = intervalo_s
+        self.timeout_s = timeout_s
+        self.timeout_salud_s = timeout_salud_s
+        self.salud_cache_s = salud_cache_s
+
+        self._hilo = None
+        self._pid = None
+        self._detener = threading.Event()
+        self._lock = threading.Lock()
+        self._lock_salud = threading.Lock()
+        self._salud = None                 # (time.monotonic(), resultado de /api/ps o su excepción)
+
+        self.listo = False
+        self.cargando = False
+        self.calentamientos = 0
+        self.ultimo_calentamiento = None   # time.time()
+        self.ultimo_ping_ms = None         # ida y vuelta del último calentamiento
+        self.ultima_carga_ms = None        # load_duration informado por Ollama al cargar
+        self.error = None
+
+    def parametros(self):
+        """model y keep_alive para cada llamada a chat()."""
+        return {"model": self.modelo, "keep_alive": self.keep_alive}
+
+    # ------------------------------------------------------
+    # Calentamiento
+    # ------------------------------------------------------
+    def calentar(self):
+        """Carga el modelo (generate sin prompt: Ollama lo carga y no genera nada)."""
+        self.cargando = True
+        t0 = time.perf_counter()
+        try:
+            respuesta = ollama.Client(host=self.host, timeout=self.timeout_s).generate(
+                model=self.modelo, prompt="", keep_alive=self.keep_alive
+            )
+            self.ultimo_ping_ms = round((time.perf_counter() - t0) * 1000, 1)
+            if respuesta.get("load_duration"):
+                self.ultima_carga_ms = round(respuesta["load_duration"] / 1e6, 1)
+            self.listo = True
+            self.error = None
+            self.calentamientos += 1
+            self.ultimo_calentamiento = time.time()
+        except Exception as e:
+            self.listo = False
+            self.error = str(e)
+            print(f"🔥 ERROR precalentando {self.modelo} en Ollama:", e)
+        finally:
+            self.cargando = False
+
+    def _bucle(self):
+        while not self._detener.is_set():
+            self.calentar()
+            self._detener.wait(self.intervalo_s)
+
+    def iniciar(self):
+        """Hilo de calentamiento (uno por proceso; se rehace tras un fork)."""
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive() and self._pid == os.getpid():
+                return self._hilo
+            self._detener.clear()
+            self._pid = os.getpid()
+            self._hilo = threading.Thread(target=self._bucle, name="ia-chat-calentar", daemon=True)
+            self._hilo.start()
+            return self._hilo
+
+    def detener(self):
+        self._detener.set()
+
+    # ------------------------------------------------------
+    # Salud
+    # ------------------------------------------------------
+    def _cargado_en_ollama(self):
+        """(cargado, vence_en_s) según /api/ps."""
+        procesos = ollama.Client(host=self.host, timeout=self.timeout_salud_s).ps()
+        for modelo in procesos.models:
+            nombre = modelo.model or modelo.name or ""
+            if nombre == self.modelo or nombre.split(":")[0] == self.modelo:
+                vence = modelo.expires_at.timestamp() - time.time() if modelo.expires_at else None
+                return True, round(vence) if vence is not None else None
+        return False, None
+
+    def _cargado_en_ollama_cacheado(self):
+        # Con el lock tomado: las consultas simultáneas esperan la misma respuesta
+        with self._lock_salud:
+            if self._salud is None or time.monotonic() - self._salud[0] >= self.salud_cache_s:
+                try:
+                    resultado = self._cargado_en_ollama()
+                except Exception as e:
+                    resultado = e
+                self._salud = (time.monotonic(), resultado)
+            resultado = self._salud[1]
+        if isinstance(resultado, Exception):
+            raise resultado
+        return resultado
+
+    def estado(self, consultar_ollama=False):
+        datos = {
+            "modelo": self.modelo,
+            "host": self.host or os.environ.get("OLLAMA_HOST") or "http://127.0.0.1:11434",
+            "keep_alive": self.keep_alive,
+            "listo": self.listo,
+            "cargando": self.cargando,
+            "calentando_en_segundo_plano": self._hilo is not None and self._hilo.is_alive(),
+            "calentamientos": self.calentamientos,
+            "ultimo_calentamiento_hace_s": (
+                round(time.time() - self.ultimo_calentamiento) if self.ultimo_calentamiento else None
+            ),
+            "ultimo_ping_ms": self.ultimo_ping_ms,
+            "ultima_carga_ms": self.ultima_carga_ms,
+            "error": self.error,
+        }
+        if consultar_ollama:
+            try:
+                datos["cargado"], datos["vence_en_s"] = self._cargado_en_ollama_cacheado()
+                datos["ollama_disponible"] = True
+            except Exception as e:
+                datos.update({"cargado": False, "ollama_disponible": False, "error": str(e)})
+        return datos
+
+
+backend_chat = BackendChat(
+    host=getattr(settings, "OLLAMA_HOST", None),
+    modelo=getattr(settings, "IA_CHAT_MODELO", "phi3"),
+    keep_alive=getattr(settings, "IA_CHAT_KEEP_ALIVE", "30m"),
+    intervalo_s=getattr(settings, "IA_CHAT_CALENTAR_INTERVALO_S", 600),
+    timeout_s=getattr(settings, "IA_CHAT_TIMEOUT_S", 120),
+    salud_cache_s=getattr(settings, "IA_CHAT_SALUD_CACHE_S", 5),
+)
@@ -0,0 +1,295 @@
+"""
+Búsqueda BM25 en memoria sobre el catálogo de la app para el chat del coach.
+
+Indexa los ejercicios vigentes (nombre, descripción, músculo, tipo y nivel)
+y los tips vigentes; por cada pregunta el chat agrega al prompt los
+IA_CHAT_RAG_K fragmentos más relevantes, para que el coach responda con el
+contenido curado de AthletIA y no solo con lo que sabe el modelo.
+
+El índice se arma una vez por proceso. Guardar o borrar un Ejercicio o un Tip
+actualiza solo ese documento; renombrar un Músculo, TipoEjercicio o
+NivelDificultad (raro) lo rearma completo. Como respaldo entre procesos se
+rearma por tiempo (IA_CHAT_RAG_TTL_S), igual que indice_ejercicios.
+
+El rearmado lee la BD sin tomar el lock de las búsquedas: salvo la primera
+vez, corre en otro hilo y mientras tanto se sigue buscando en el índice
+anterior; el nuevo se pone en uso de una vez al terminar.
+"""
+import heapq
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, deque
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from App.models import Tip
+from api_ejercicio.models import Ejercicio, Musculo, TipoEjercicio, NivelDificultad
+
+from .cache_chat import PALABRAS_VACIAS
+from .contexto_chat import contar_tokens
+
+
+K1 = 1.2
+B = 0.75
+PESO_NOMBRE = 3         # el nombre/título cuenta como si apareciera 3 veces
+MAX_LARGO_FRAGMENTO = 240
+VENTANA_LATENCIAS = 1000
+
+ENCABEZADO = "Información del catálogo de AthletIA (úsala si responde la pregunta):"
+
+
+def terminos(texto):
+    """Minúsculas, sin tildes ni palabras vacías, con un singular aproximado."""
+    texto = unicodedata.normalize("NFKD", (texto or "").lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    resultado = []
+    for palabra in re.findall(r"\w+", texto):
+        if palabra in PALABRAS_VACIAS or len(palabra) < 2:
+            continue
+        if len(palabra) > 4 and palabra.endswith("es"):
+            palabra = palabra[:-2]
+        elif len(palabra) > 3 and palabra.endswith("s"):
+            palabra = palabra[:-1]
+        resultado.append(palabra)
+    return resultado
+
+
+def _recortar(texto):
+    texto = " ".join((texto or "").split())
+    return texto if len(texto) <= MAX_LARGO_FRAGMENTO else texto[:MAX_LARGO_FRAGMENTO - 1].rstrip() + "…"
+
+
+def _documento_ejercicio(nombre, descripcion, musculo, tipo, nivel):
+    detalles = ", ".join(x for x in (musculo, tipo, nivel) if x)
+    fragmento = _recortar(f"Ejercicio {nombre} ({detalles}): {descripcion or ''}")
+    texto = " ".join([nombre or ""] * PESO_NOMBRE + [musculo or "", tipo or "", nivel or "", descripcion or ""])
+    return fragmento, Counter(terminos(texto))
+
+
+def _documento_tip(titulo, contenido):
+    fragmento = _recortar(f"Tip {titulo}: {contenido}")
+    return fragmento, Counter(terminos(" ".join([titulo or ""] * PESO_NOMBRE + [contenido or ""])))
+
+
+_CAMPOS_EJERCICIO = ("id", "nombre", "descripcion", "musculo__nombre", "tipo_ejercicio__nombre", "nivel_dificultad__nombre")
+
+
+class _Indice:
+    """Documentos y listas de postings; se arma fuera del lock y se reemplaza completo."""
+
+    def __init__(self):
+        self.documentos = {}        # ("ejercicio" | "tip", id) -> (fragmento, Counter de términos)
+        self.postings = {}          # término -> {clave: frecuencia}
+        self.largos = {}            # clave -> cantidad de términos
+        self.largo_total = 0
+
+    def quitar(self, clave):
+        anterior = self.documentos.pop(clave, None)
+        if anterior is None:
+            return
+        for termino in anterior[1]:
+            postings = self.postings[termino]
+            del postings[clave]
+            if not postings:
+                del self.postings[termino]
+        self.largo_total -= self.largos.pop(clave)
+
+    def poner(self, clave, documento):
+        self.quitar(clave)
+        if not documento[1]:
+            return
+        self.documentos[clave] = documento
+        for termino, frecuencia in documento[1].items():
+            self.postings.setdefault(termino, {})[clave] = frecuencia
+        self.largos[clave] = sum(documento[1].values())
+        self.largo_total += self.largos[clave]
+
+
+class IndiceBM25:
+
+    def __init__(self, ttl_s=600):
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()           # índice en uso: búsquedas y cambios de un documento
+        self._construyendo = threading.Lock()   # un solo rearmado a la vez (lee la BD sin tomar _lock)
+        self._indice = None
+        self._vence = 0.0
+        self._generacion = 0                    # sube con cada cambio; detecta rearmados desactualizados
+        self._latencias = deque(maxlen=VENTANA_LATENCIAS)
+        self.reconstrucciones = 0
+        self.actualizaciones = 0
+
+    # ------------------------------------------------------
+    # Mantención
+    # ------------------------------------------------------
+    def _reconstruir(self):
+        """Arma un índice nuevo desde la BD y lo pone en uso. Requiere `_construyendo`."""
+        generacion = self._generacion
+        indice = _Indice()
+        for id_, *campos in Ejercicio.objects.filter(vigente=True).values_list(*_CAMPOS_EJERCICIO):
+            indice.poner(("ejercicio", id_), _documento_ejercicio(*campos))
+        for id_, titulo, contenido in Tip.objects.filter(vigente=True).values_list("id", "titulo", "contenido"):
+            indice.poner(("tip", id_), _documento_tip(titulo, contenido))
+
+        with self._lock:
+            self._indice = indice
+            # Si algo cambió mientras se leía el catálogo, se usa igual y se rearma de nuevo
+            self._vence = time.monotonic() + self.ttl_s if generacion == self._generacion else 0.0
+            self.reconstrucciones += 1
+
+    def _reconstruir_en_segundo_plano(self):
+        try:
+            close_old_connections()
+            self._reconstruir()
+        except Exception as e:
+            print("🔥 ERROR rearmando el índice del catálogo (se sigue usando el anterior):", e)
+        finally:
+            connection.close()
+            self._construyendo.release()
+
+    def _asegurar(self):
+        if self._indice is None:
+            # Primera búsqueda: no hay índice que servir mientras tanto
+            with self._construyendo:
+                if self._indice is None:
+                    self._reconstruir()
+        elif time.monotonic() >= self._vence and self._construyendo.acquire(blocking=False):
+            # Vencido: se rearma en otro hilo y mientras tanto se sigue buscando en el actual
+            threading.Thread(
+                target=self._reconstruir_en_segundo_plano, name="ia-indice-catalogo", daemon=True
+            ).start()
+
+    def invalidar(self):
+        with self._lock:
+            self._generacion += 1
+            self._vence = 0.0
+
+    def _actualizar(self, clave, leer_documento):
+        if self._indice is None:
+            return  # se arma completo en la próxima búsqueda
+        with self._lock:
+            self._generacion += 1
+        documento = leer_documento()     # la consulta va fuera del lock
+        with self._lock:
+            if documento is None:
+                self._indice.quitar(clave)
+            else:
+                self._indice.poner(clave, documento)
+            self.actualizaciones += 1
+
+    def actualizar_ejercicio(self, ejercicio_id):
+        def leer():
+            fila = Ejercicio.objects.filter(pk=ejercicio_id, vigente=True).values_list(*_CAMPOS_EJERCICIO).first()
+            return None if fila is None else _documento_ejercicio(*fila[1:])
+        self._actualizar(("ejercicio", ejercicio_id), leer)
+
+    def actualizar_tip(self, tip_id):
+        def leer():
+            fila = Tip.objects.filter(pk=tip_id, vigente=True).values_list("titulo", "contenido").first()
+            return None if fila is None else _documento_tip(*fila)
+        self._actualizar(("tip", tip_id), leer)
+
+    # ------------------------------------------------------
+    # Búsqueda
+    # ------------------------------------------------------
+    def buscar(self, pregunta, k=3):
+        """[(puntaje, fragmento)] de los k documentos más relevantes."""
+        consulta = set(terminos(pregunta))
+        if not consulta:
+            return []
+
+        self._asegurar()
+        with self._lock:
+            t0 = time.perf_counter()
+            indice = self._indice
+            n = len(indice.documentos)
+            if not n:
+                return []
+            promedio = indice.largo_total / n
+            puntajes = {}
+            for termino in consulta:
+                postings = indice.postings.get(termino)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for clave, frecuencia in postings.items():
+                    largo = indice.largos[clave]
+                    puntajes[clave] = puntajes.get(clave, 0.0) + idf * frecuencia * (K1 + 1) / (
+                        frecuencia + K1 * (1 - B + B * largo / promedio)
+                    )
+            mejores = heapq.nlargest(k, puntajes.items(), key=lambda item: item[1])
+            resultado = [(round(puntaje, 3), indice.documentos[clave][0]) for clave, puntaje in mejores]
+        self._latencias.append((time.perf_counter() - t0) * 1000)
+        return resultado
+
+    def estadisticas(self):
+        latencias = sorted(self._latencias)
+        indice = self._indice or _Indice()
+
+        def p(q):
+            return round(latencias[min(int(len(latencias) * q / 100), len(latencias) - 1)], 3) if latencias else None
+
+        return {
+            "documentos": len(indice.documentos),
+            "terminos": len(indice.postings),
+            "reconstrucciones": self.reconstrucciones,
+            "actualizaciones": self.actualizaciones,
+            "busquedas": len(latencias),
+            "busqueda_p50_ms": p(50),
+            "busqueda_p95_ms": p(95),
+        }
+
+
+class BusquedaCatalogo:
+    """Arma el bloque de fragmentos para el prompt a partir del índice."""
+
+    def __init__(self, indice, activo=True, k=3, max_tokens=200):
+        self.indice = indice
+        self.activo = activo
+        self.k = k
+        self.max_tokens = max_tokens
+
+    def bloque(self, pregunta):
+        if not self.activo:
+            return ""
+        bloque = ENCABEZADO
+        for _, fragmento in self.indice.buscar(pregunta, self.k):
+            if contar_tokens(f"{bloque}\n- {fragmento}") > self.max_tokens:
+                break
+            bloque += f"\n- {fragmento}"
+        return "" if bloque == ENCABEZADO else bloque
+
+
+indice_catalogo = IndiceBM25(getattr(settings, "IA_CHAT_RAG_TTL_S", 600))
+
+busqueda_catalogo = BusquedaCatalogo(
+    indice_catalogo,
+    activo=getattr(settings, "IA_CHAT_RAG", True),
+    k=getattr(settings, "IA_CHAT_RAG_K", 3),
+    max_tokens=getattr(settings, "IA_CHAT_RAG_MAX_TOKENS", 200),
+)
+
+
+# ==========================================================
+# Actualización incremental
+# ==========================================================
+@receiver([post_save, post_delete], sender=Ejercicio)
+def actualizar_ejercicio_indexado(sender, instance, **kwargs):
+    indice_catalogo.actualizar_ejercicio(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Tip)
+def actualizar_tip_indexado(sender, instance, **kwargs):
+    indice_catalogo.actualizar_tip(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Musculo)
+@receiver([post_save, post_delete], sender=TipoEjercicio)
+@receiver([post_save, post_delete], sender=NivelDificultad)
+def invalidar_indice_catalogo(sender, **kwargs):
+    indice_catalogo.invalidar()
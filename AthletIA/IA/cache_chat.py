@@ -0,0 +1,63 @@
+"""
+Caché de respuestas del chat del coach para preguntas frecuentes.
+
+Solo aplica al primer turno de una conversación (sin historial ni resumen),
+donde la respuesta depende únicamente de la pregunta. La clave es el modelo +
+el prompt de sistema + la pregunta normalizada (sin tildes, signos ni
+palabras vacías, con las palabras ordenadas), así "¿Cuántas series hago para
+pecho?" y "cuantas series hago para el pecho" comparten respuesta. Las
+entradas expiran a los IA_CHAT_CACHE_TTL_S segundos. Se puede saltar por
+petición con ?sin_cache=1.
+"""
+import hashlib
+import re
+import unicodedata
+
+from django.conf import settings
+
+from .cache_recomendaciones import CacheLRUConVencimiento
+
+
+PALABRAS_VACIAS = {
+    "a", "al", "con", "de", "del", "el", "en", "es", "la", "las", "lo", "los", "me", "mi", "mis",
+    "o", "para", "por", "que", "se", "su", "sus", "te", "tu", "tus", "un", "una", "unas", "unos", "y", "yo",
+}
+
+MAX_LARGO_PREGUNTA = 300  # preguntas más largas casi nunca se repiten
+
+
+def normalizar_pregunta(texto):
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    palabras = {p for p in re.findall(r"\w+", texto) if p not in PALABRAS_VACIAS}
+    return " ".join(sorted(palabras))
+
+
+class CacheRespuestasChat(CacheLRUConVencimiento):
+
+    def __init__(self, max_items=512, ttl_s=3600):
+        super().__init__(max_items, ttl_s)
+        self.omitidas = 0   # peticiones que no podían usar la caché (historial, ?sin_cache)
+
+    def clave(self, request, contexto, modelo):
+        """Clave de la pregunta, o None si esta petición no debe usar la caché."""
+        pregunta = contexto.mensajes[-1]["content"]
+        if (self.max_items == 0 or not contexto.primer_turno or request.GET.get("sin_cache")
+                or len(pregunta) > MAX_LARGO_PREGUNTA):
+            self.omitidas += 1
+            return None
+        normalizada = normalizar_pregunta(pregunta)
+        if not normalizada:
+            self.omitidas += 1
+            return None
+        sistema = hashlib.blake2b(contexto.mensajes[0]["content"].encode(), digest_size=8).hexdigest()
+        return (modelo, sistema, normalizada)
+
+    def estadisticas(self):
+        return {**super().estadisticas(), "omitidas": self.omitidas}
+
+
+cache_respuestas_chat = CacheRespuestasChat(
+    max_items=getattr(settings, "IA_CHAT_CACHE_MAX", 512),
+    ttl_s=getattr(settings, "IA_CHAT_CACHE_TTL_S", 3600),
+)
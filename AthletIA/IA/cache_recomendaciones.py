@@ -0,0 +1,120 @@
+"""
+Caché LRU en proceso para las predicciones del recomendador.
+
+La clave es la versión del modelo + un hash del vector codificado (redondeado),
+de modo que entradas equivalentes del wizard comparten resultado y un cambio
+de `modelo_version` invalida todo lo anterior.
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+
+DECIMALES_CLAVE = 4
+
+
+def clave_vector(version, X):
+    """Clave estable para una fila codificada (array 1 x n)."""
+    import numpy as np
+
+    fila = np.round(np.asarray(X, dtype=np.float64).ravel(), DECIMALES_CLAVE) + 0.0  # + 0.0 normaliza -0.0
+    return (version, hashlib.blake2b(fila.tobytes(), digest_size=16).hexdigest())
+
+
+class CacheLRU:
+    """Diccionario acotado con expulsión LRU y contadores de aciertos/fallos."""
+
+    def __init__(self, max_items=2048):
+        self.max_items = max(int(max_items), 0)
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            if clave in self._datos:
+                self._datos.move_to_end(clave)
+                self.aciertos += 1
+                return copy.deepcopy(self._datos[clave])
+            self.fallos += 1
+            return None
+
+    def guardar(self, clave, valor):
+        if self.max_items == 0:
+            return
+        with self._lock:
+            self._datos[clave] = copy.deepcopy(valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_items:
+                self._datos.popitem(last=False)
+                self.expulsiones += 1
+
+    def obtener_o_calcular(self, clave, calcular):
+        valor = self.obtener(clave)
+        if valor is None:
+            valor = calcular()
+            self.guardar(clave, valor)
+        return valor
+
+    def descartar(self, claves):
+        with self._lock:
+            for clave in claves:
+                self._datos.pop(clave, None)
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                "items": len(self._datos),
+                "max_items": self.max_items,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "expulsiones": self.expulsiones,
+                "tasa_aciertos": round(self.aciertos / total, 3) if total else 0.0,
+            }
+
+
+class CacheLRUConVencimiento(CacheLRU):
+    """
+    CacheLRU cuyas entradas vencen a los `ttl_s` segundos. Los valores se
+    copian al guardar (como en CacheLRU) pero se devuelven sin copiar: quien
+    los lee no debe modificarlos.
+    """
+
+    def __init__(self, max_items=512, ttl_s=3600):
+        super().__init__(max_items)
+        self.ttl_s = ttl_s
+        self.expiradas = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            item = self._datos.get(clave)
+            if item is not None:
+                expira, valor = item
+                if expira > time.monotonic():
+                    self._datos.move_to_end(clave)
+                    self.aciertos += 1
+                    return valor
+                del self._datos[clave]
+                self.expiradas += 1
+            self.fallos += 1
+            return None
+
+    def guardar(self, clave, valor):
+        super().guardar(clave, (time.monotonic() + self.ttl_s, valor))
+
+    def estadisticas(self):
+        return {**super().estadisticas(), "ttl_s": self.ttl_s, "expiradas": self.expiradas}
+
+
+cache_predicciones = CacheLRU(getattr(settings, "IA_CACHE_RECOMENDACIONES_MAX", 2048))
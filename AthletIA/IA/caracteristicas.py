@@ -0,0 +1,109 @@
+"""
+Codificación de entradas del recomendador sin pandas ni ColumnTransformer.
+
+Las tablas (medias/escalas del StandardScaler y posiciones de cada categoría
+del OneHotEncoder) se extraen una vez del preprocesador ajustado, y cada fila
+se convierte directamente en el vector codificado.
+"""
+import numpy as np
+
+
+class CodificadorCaracteristicas:
+    """Réplica en NumPy de `preprocessor.transform` para los bloques soportados."""
+
+    def __init__(self, preprocessor):
+        self.columnas_entrada = list(preprocessor.feature_names_in_)
+        self.bloques_num = []
+        self.bloques_cat = []
+        self.n_salida = 0
+
+        for nombre, transformador, columnas in preprocessor.transformers_:
+            if transformador == "drop" or nombre == "remainder":
+                continue
+
+            salida = preprocessor.output_indices_[nombre]
+            tipo = type(transformador).__name__
+            columnas = list(columnas)
+
+            if tipo == "StandardScaler":
+                media = transformador.mean_ if transformador.with_mean else np.zeros(len(columnas))
+                escala = transformador.scale_ if transformador.with_std else np.ones(len(columnas))
+                self.bloques_num.append((columnas, np.asarray(media, dtype=np.float64), np.asarray(escala, dtype=np.float64), salida.start))
+
+            elif tipo == "OneHotEncoder":
+                if transformador.drop is not None or transformador.handle_unknown != "ignore":
+                    raise ValueError("OneHotEncoder con drop/handle_unknown no soportado")
+                tablas = []
+                offset = salida.start
+                for categorias in transformador.categories_:
+                    tablas.append({c: offset + i for i, c in enumerate(categorias)})
+                    offset += len(categorias)
+                self.bloques_cat.append((columnas, tablas))
+
+            else:
+                raise ValueError(f"Transformador '{tipo}' no soportado por el codificador NumPy")
+
+            self.n_salida = max(self.n_salida, salida.stop)
+
+    def transformar(self, filas):
+        """Lista de dicts (mismas claves que recomendar_rutina) -> matriz codificada."""
+        X = np.zeros((len(filas), self.n_salida), dtype=np.float64)
+
+        for columnas, media, escala, inicio in self.bloques_num:
+            valores = np.array([[fila[c] for c in columnas] for fila in filas], dtype=np.float64)
+            X[:, inicio:inicio + len(columnas)] = (valores - media) / escala
+
+        for columnas, tablas in self.bloques_cat:
+            for i, fila in enumerate(filas):
+                for c, tabla in zip(columnas, tablas):
+                    # Categoría desconocida -> fila de ceros (handle_unknown="ignore")
+                    j = tabla.get(fila[c])
+                    if j is not None:
+                        X[i, j] = 1.0
+
+        return X
+
+    def grilla_muestras(self, n=64, semilla=0):
+        """Filas de prueba: numéricos alrededor de la media y categorías conocidas o no."""
+        rng = np.random.default_rng(semilla)
+        filas = [{} for _ in range(n)]
+
+        for columnas, media, escala, _ in self.bloques_num:
+            for k, c in enumerate(columnas):
+                valores = media[k] + escala[k] * rng.uniform(-2, 2, size=n)
+                for fila, v in zip(filas, valores):
+                    fila[c] = float(v)
+
+        for columnas, tablas in self.bloques_cat:
+            for c, tabla in zip(columnas, tablas):
+                opciones = list(tabla.keys()) + ["__desconocido__"]
+                for fila in filas:
+                    fila[c] = opciones[rng.integers(len(opciones))]
+
+        for fila in filas:
+            for c in self.columnas_entrada:
+                fila.setdefault(c, None)
+        return filas
+
+
+def verificar_equivalencia(preprocessor, codificador, n=64, semilla=0, atol=1e-9):
+    """Compara el codificador contra `preprocessor.transform` en una grilla muestreada."""
+    import pandas as pd
+
+    filas = codificador.grilla_muestras(n=n, semilla=semilla)
+    esperado = preprocessor.transform(pd.DataFrame(filas, columns=codificador.columnas_entrada))
+    if hasattr(esperado, "toarray"):
+        esperado = esperado.toarray()
+    esperado = np.asarray(esperado, dtype=np.float64)
+    obtenido = codificador.transformar(filas)
+
+    if esperado.shape != obtenido.shape:
+        return {"filas": len(filas), "columnas": codificador.n_salida, "max_diferencia": None, "equivalente": False}
+
+    diferencia = float(np.abs(esperado - obtenido).max()) if len(filas) else 0.0
+    return {
+        "filas": len(filas),
+        "columnas": codificador.n_salida,
+        "max_diferencia": diferencia,
+        "equivalente": diferencia <= atol,
+    }
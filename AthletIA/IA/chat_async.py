@@ -0,0 +1,228 @@
+"""
+Chat del coach en modo asíncrono (ASGI).
+
+Mismo contrato que chat_api / chat_api_stream, pero la espera a Ollama no
+ocupa un hilo del servidor: se usa ollama.AsyncClient con un pool httpx
+acotado y control_admision limita las generaciones simultáneas. Se activa con
+IA_CHAT_ASINCRONO=1 sirviendo el proyecto con AthletIA/asgi.py.
+"""
+import asyncio
+import json
+import weakref
+
+import httpx
+import ollama
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from . import historial_chat
+from .backend_chat import backend_chat
+from .admision_chat import ChatOcupado, clave_usuario, control_admision, mensaje_ocupado, respuesta_ocupado
+from .cache_chat import cache_respuestas_chat
+from .chat_virtual import MODELO_IA, MAX_HISTORIAL, PROMPT_SISTEMA, _error_conexion, _evento
+from .busqueda_catalogo import busqueda_catalogo
+from .contexto_chat import con_bloques, gestor_contexto
+from .contexto_usuario import contexto_usuario
+from .metricas_chat import metricas_chat
+
+
+class PoolOllama:
+    """Un AsyncClient (pool de conexiones acotado) por event loop; el cupo lo da control_admision."""
+
+    def __init__(self, host=None, max_conexiones=8, timeout_s=120):
+        self.host = host
+        self.max_conexiones = max_conexiones
+        self.timeout_s = timeout_s
+        # Los objetos asyncio quedan atados a su loop (runserver crea uno por petición)
+        self._por_loop = weakref.WeakKeyDictionary()
+
+    def _cliente(self):
+        loop = asyncio.get_running_loop()
+        cliente = self._por_loop.get(loop)
+        if cliente is None:
+            cliente = ollama.AsyncClient(
+                host=self.host,
+                timeout=self.timeout_s,
+                limits=httpx.Limits(max_connections=self.max_conexiones, max_keepalive_connections=self.max_conexiones),
+            )
+            self._por_loop[loop] = cliente
+        return cliente
+
+    async def chat(self, medicion=None, **kwargs):
+        if medicion:
+            medicion.pedir_turno()
+        async with control_admision.aturno():
+            if medicion:
+                medicion.inicio_llamada()
+            respuesta = await self._cliente().chat(**kwargs)
+            if medicion:
+                medicion.fin_llamada(respuesta)
+            return respuesta
+
+    async def chat_stream(self, medicion=None, **kwargs):
+        if medicion:
+            medicion.pedir_turno()
+        async with control_admision.aturno():
+            if medicion:
+                medicion.inicio_llamada()
+            async for parte in await self._cliente().chat(stream=True, **kwargs):
+                if medicion and parte.get("done"):
+                    medicion.fin_llamada(parte)
+                yield parte
+
+    def estadisticas(self):
+        return {"max_conexiones": self.max_conexiones, "timeout_s": self.timeout_s}
+
+
+pool_ollama = PoolOllama(
+    host=getattr(settings, "OLLAMA_HOST", None),
+    max_conexiones=getattr(settings, "IA_CHAT_MAX_CONEXIONES", 8),
+    timeout_s=getattr(settings, "IA_CHAT_TIMEOUT_S", 120),
+)
+
+
+async def _leer_mensaje(request):
+    data = json.loads(request.body)
+    mensaje_usuario = data.get("mensaje", "").strip()
+
+    if not mensaje_usuario:
+        return None, "Por favor escribe algo 😅."
+
+    if mensaje_usuario == "__reset__":
+        await historial_chat.areiniciar(request)
+        return None, "💬 Historial reiniciado. ¿En qué puedo ayudarte ahora?"
+
+    return mensaje_usuario, None
+
+
+async def _contexto_con_mensaje(request, mensaje_usuario):
+    conversacion_id = await historial_chat.aconversacion_actual(request, MAX_HISTORIAL)
+    nuevo = {"role": "user", "content": mensaje_usuario}
+    prompt = con_bloques(
+        PROMPT_SISTEMA,
+        await contexto_usuario.abloque(await request.auser()),
+        # La primera búsqueda arma el índice con el ORM
+        await sync_to_async(busqueda_catalogo.bloque)(mensaje_usuario),
+    )
+    return conversacion_id, nuevo, await gestor_contexto.apreparar(conversacion_id, prompt, nuevo)
+
+
+@csrf_exempt
+async def chat_api_async(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Método no permitido."}, status=405)
+
+    try:
+        mensaje_usuario, inmediata = await _leer_mensaje(request)
+    except Exception as e:
+        return JsonResponse({"respuesta": _error_conexion(e)})
+    if inmediata:
+        return JsonResponse({"respuesta": inmediata})
+
+    medicion = metricas_chat.medir("chat_api_async", MODELO_IA)
+
+    try:
+        conversacion_id, nuevo, contexto = await _contexto_con_mensaje(request, mensaje_usuario)
+        clave = cache_respuestas_chat.clave(request, contexto, MODELO_IA)
+        texto = cache_respuestas_chat.obtener(clave) if clave else None
+
+        if texto is None:
+            control_admision.admitir(clave_usuario(request, await request.auser()))
+            respuesta = await pool_ollama.chat(medicion, **backend_chat.parametros(), messages=contexto.mensajes)
+            texto = respuesta["message"]["content"].strip()
+            if clave and texto:
+                cache_respuestas_chat.guardar(clave, texto)
+        else:
+            medicion.cacheada()
+
+        await historial_chat.aagregar_mensajes(conversacion_id, [nuevo, {"role": "assistant", "content": texto}])
+        gestor_contexto.programar_resumen(conversacion_id, contexto)
+
+        medicion.terminar()
+        return JsonResponse({"respuesta": texto})
+
+    except ChatOcupado as e:
+        medicion.terminar("ocupado")
+        return respuesta_ocupado(e)
+    except Exception as e:
+        medicion.terminar("error")
+        return JsonResponse({"respuesta": _error_conexion(e)})
+
+
+async def _tokens(contexto, cacheada, medicion):
+    if cacheada is not None:
+        medicion.cacheada()
+        yield cacheada
+        return
+    async for parte in pool_ollama.chat_stream(medicion, **backend_chat.parametros(), messages=contexto.mensajes):
+        token = parte["message"]["content"]
+        if token:
+            medicion.primer_token()
+            yield token
+
+
+async def _evento_error(e):
+    yield _evento({"error": _error_conexion(e)})
+
+
+@csrf_exempt
+async def chat_api_stream_async(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Método no permitido."}, status=405)
+
+    try:
+        mensaje_usuario, inmediata = await _leer_mensaje(request)
+    except Exception as e:
+        return StreamingHttpResponse(_evento_error(e), content_type="text/event-stream")
+    if inmediata:
+        async def inmediato():
+            yield _evento({"token": inmediata})
+            yield _evento({"fin": True, "respuesta": inmediata})
+        return StreamingHttpResponse(inmediato(), content_type="text/event-stream")
+
+    medicion = metricas_chat.medir("chat_api_stream_async", MODELO_IA)
+    try:
+        conversacion_id, nuevo, contexto = await _contexto_con_mensaje(request, mensaje_usuario)
+        clave = cache_respuestas_chat.clave(request, contexto, MODELO_IA)
+        cacheada = cache_respuestas_chat.obtener(clave) if clave else None
+        if cacheada is None:
+            control_admision.admitir(clave_usuario(request, await request.auser()))
+    except ChatOcupado as e:
+        medicion.terminar("ocupado")
+        return respuesta_ocupado(e)
+    except Exception as e:
+        medicion.terminar("error")
+        return StreamingHttpResponse(_evento_error(e), content_type="text/event-stream")
+
+    async def generar():
+        partes = []
+        try:
+            async for token in _tokens(contexto, cacheada, medicion):
+                partes.append(token)
+                yield _evento({"token": token})
+        except ChatOcupado as e:
+            medicion.terminar("ocupado")
+            yield _evento({"error": mensaje_ocupado(e), "ocupado": True})
+            return
+        except Exception as e:
+            medicion.terminar("error")
+            yield _evento({"error": _error_conexion(e)})
+            return
+        except (asyncio.CancelledError, GeneratorExit):
+            medicion.terminar("cancelado")
+            raise
+
+        texto = "".join(partes).strip()
+        if clave and cacheada is None and texto:
+            cache_respuestas_chat.guardar(clave, texto)
+        await historial_chat.aagregar_mensajes(conversacion_id, [nuevo, {"role": "assistant", "content": texto}])
+        medicion.terminar()
+        yield _evento({"fin": True, "respuesta": texto})
+        gestor_contexto.programar_resumen(conversacion_id, contexto)
+
+    respuesta = StreamingHttpResponse(generar(), content_type="text/event-stream")
+    respuesta["Cache-Control"] = "no-cache"
+    respuesta["X-Accel-Buffering"] = "no"
+    return respuesta
@@ -1,53 +1,260 @@
 import ollama
-from django.http import JsonResponse
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET
 import json
 
-MODELO_IA = "phi3"  
+from . import historial_chat
+from .backend_chat import backend_chat
+from .admision_chat import ChatOcupado, clave_usuario, control_admision, mensaje_ocupado, respuesta_ocupado
+from .cache_chat import cache_respuestas_chat
+from .busqueda_catalogo import busqueda_catalogo
+from .contexto_chat import con_bloques, gestor_contexto
+from .contexto_usuario import contexto_usuario
+from .metricas_chat import metricas_chat
+
+# Modelo y keep_alive: IA_CHAT_MODELO / IA_CHAT_KEEP_ALIVE (ver IA/backend_chat.py)
+MODELO_IA = backend_chat.modelo
+
+PROMPT_SISTEMA = (
+    "Eres un entrenador general que sabe todo tipo de ejercicio. Responde en español con un máximo de una frase. Si el usuario saluda, responde solo con un saludo corto. No des explicaciones largas, ejemplos ni detalles adicionales bajo ninguna circunstancia, Solo responde en base a lo que te pregunten"
+)
+
+MAX_HISTORIAL = 30
+
+# Cliente de Ollama (OLLAMA_HOST en settings; None = el del entorno / localhost)
+cliente = ollama.Client(host=getattr(settings, "OLLAMA_HOST", None))
+
 
 def chat_view(request):
     return render(request, "IA/chat.html")
 
-@csrf_exempt
-def chat_api(request):
-    if request.method == "POST":
-        data = json.loads(request.body)
-        mensaje_usuario = data.get("mensaje", "").strip()
 
-        if not mensaje_usuario:
-            return JsonResponse({"respuesta": "Por favor escribe algo 😅."})
+def _contexto_con_mensaje(request, mensaje_usuario):
+    """
+    (id de conversación, mensaje nuevo, Contexto acotado por IA_CHAT_PRESUPUESTO_TOKENS).
+    El prompt de sistema lleva los datos del usuario y los fragmentos del catálogo.
+    """
+    conversacion_id = historial_chat.conversacion_actual(request, MAX_HISTORIAL)
+    nuevo = {"role": "user", "content": mensaje_usuario}
+    prompt = con_bloques(
+        PROMPT_SISTEMA, contexto_usuario.bloque(request.user), busqueda_catalogo.bloque(mensaje_usuario)
+    )
+    return conversacion_id, nuevo, gestor_contexto.preparar(conversacion_id, prompt, nuevo)
+
+
+def _leer_mensaje(request):
+    """Devuelve (mensaje, respuesta_inmediata). Si hay respuesta inmediata no se llama al modelo."""
+    data = json.loads(request.body)
+    mensaje_usuario = data.get("mensaje", "").strip()
 
-        if mensaje_usuario == "__reset__":
-            request.session["chat_historial"] = []
-            return JsonResponse({"respuesta": "💬 Historial reiniciado. ¿En qué puedo ayudarte ahora?"})
+    if not mensaje_usuario:
+        return None, "Por favor escribe algo 😅."
 
-        historial = request.session.get("chat_historial", [])
+    if mensaje_usuario == "__reset__":
+        historial_chat.reiniciar(request)
+        return None, "💬 Historial reiniciado. ¿En qué puedo ayudarte ahora?"
 
-        if len(historial) > 30:
-            historial = historial[-30:]
-        historial.append({"role": "user", "content": mensaje_usuario})
+    return mensaje_usuario, None
+
+
+def _error_conexion(e):
+    return f"⚠️ Error al conectar con la IA. Verifica que Ollama esté corriendo.\n\nDetalles: {str(e)}"
+
+
+@csrf_exempt
+def chat_api(request):
+    if request.method == "POST":
+        mensaje_usuario, inmediata = _leer_mensaje(request)
+        if inmediata:
+            return JsonResponse({"respuesta": inmediata})
+
+        medicion = metricas_chat.medir("chat_api", MODELO_IA)
 
         try:
-            respuesta = ollama.chat(
-                model="phi3",
-                messages=[
-                    {"role": "system", "content": (
-                        "Eres un entrenador general que sabe todo tipo de ejercicio. Responde en español con un máximo de una frase. Si el usuario saluda, responde solo con un saludo corto. No des explicaciones largas, ejemplos ni detalles adicionales bajo ninguna circunstancia, Solo responde en base a lo que te pregunten"
-                    )}
-                ] + historial
-            )
+            conversacion_id, nuevo, contexto = _contexto_con_mensaje(request, mensaje_usuario)
+            clave = cache_respuestas_chat.clave(request, contexto, MODELO_IA)
+            texto = cache_respuestas_chat.obtener(clave) if clave else None
 
-            texto = respuesta["message"]["content"].strip()
+            if texto is None:
+                control_admision.admitir(clave_usuario(request, request.user))
+                medicion.pedir_turno()
+                with control_admision.turno():
+                    medicion.inicio_llamada()
+                    respuesta = cliente.chat(**backend_chat.parametros(), messages=contexto.mensajes)
+                    medicion.fin_llamada(respuesta)
+                texto = respuesta["message"]["content"].strip()
+                if clave and texto:
+                    cache_respuestas_chat.guardar(clave, texto)
+            else:
+                medicion.cacheada()
 
-            historial.append({"role": "assistant", "content": texto})
-            request.session["chat_historial"] = historial
+            # Solo se insertan los dos mensajes nuevos
+            historial_chat.agregar_mensajes(conversacion_id, [nuevo, {"role": "assistant", "content": texto}])
+            gestor_contexto.programar_resumen(conversacion_id, contexto)
 
+            medicion.terminar()
             return JsonResponse({"respuesta": texto})
 
+        except ChatOcupado as e:
+            medicion.terminar("ocupado")
+            return respuesta_ocupado(e)
         except Exception as e:
-            return JsonResponse({
-                "respuesta": f"⚠️ Error al conectar con la IA. Verifica que Ollama esté corriendo.\n\nDetalles: {str(e)}"
-            })
+            medicion.terminar("error")
+            return JsonResponse({"respuesta": _error_conexion(e)})
 
     return JsonResponse({"error": "Método no permitido."}, status=405)
+
+
+# ==========================================================
+# Chat con streaming (Server-Sent Events)
+# ==========================================================
+def _evento(datos):
+    return f"data: {json.dumps(datos, ensure_ascii=False)}\n\n"
+
+
+def _tokens(contexto, cacheada, medicion):
+    """Tokens de Ollama, o la respuesta cacheada de una sola vez."""
+    if cacheada is not None:
+        medicion.cacheada()
+        yield cacheada
+        return
+    medicion.pedir_turno()
+    with control_admision.turno():
+        medicion.inicio_llamada()
+        for parte in cliente.chat(**backend_chat.parametros(), messages=contexto.mensajes, stream=True):
+            token = parte["message"]["content"]
+            if token:
+                medicion.primer_token()
+                yield token
+            if parte.get("done"):
+                medicion.fin_llamada(parte)
+
+
+@csrf_exempt
+def chat_api_stream(request):
+    """
+    Igual que chat_api, pero reenvía los tokens a medida que Ollama los genera:
+    `data: {"token": "..."}` por fragmento y `data: {"fin": true, "respuesta": "..."}`
+    al terminar (o `{"error": "..."}`).
+    """
+    if request.method != "POST":
+        return JsonResponse({"error": "Método no permitido."}, status=405)
+
+    mensaje_usuario, inmediata = _leer_mensaje(request)
+    if inmediata:
+        return StreamingHttpResponse(
+            iter([_evento({"token": inmediata}), _evento({"fin": True, "respuesta": inmediata})]),
+            content_type="text/event-stream",
+        )
+
+    # La sesión solo cambia aquí (id de conversación nueva) y el middleware la
+    # guarda antes de empezar a enviar; el generador solo escribe mensajes.
+    medicion = metricas_chat.medir("chat_api_stream", MODELO_IA)
+    try:
+        conversacion_id, nuevo, contexto = _contexto_con_mensaje(request, mensaje_usuario)
+        clave = cache_respuestas_chat.clave(request, contexto, MODELO_IA)
+        cacheada = cache_respuestas_chat.obtener(clave) if clave else None
+        if cacheada is None:
+            control_admision.admitir(clave_usuario(request, request.user))
+    except ChatOcupado as e:
+        medicion.terminar("ocupado")
+        return respuesta_ocupado(e)
+    except Exception as e:
+        medicion.terminar("error")
+        return StreamingHttpResponse(iter([_evento({"error": _error_conexion(e)})]), content_type="text/event-stream")
+
+    def generar():
+        partes = []
+        try:
+            for token in _tokens(contexto, cacheada, medicion):
+                partes.append(token)
+                yield _evento({"token": token})
+        except ChatOcupado as e:
+            medicion.terminar("ocupado")
+            yield _evento({"error": mensaje_ocupado(e), "ocupado": True})
+            return
+        except Exception as e:
+            medicion.terminar("error")
+            yield _evento({"error": _error_conexion(e)})
+            return
+        except GeneratorExit:
+            # El cliente cerró la conexión a mitad de la respuesta
+            medicion.terminar("cancelado")
+            raise
+
+        texto = "".join(partes).strip()
+        if clave and cacheada is None and texto:
+            cache_respuestas_chat.guardar(clave, texto)
+        historial_chat.agregar_mensajes(conversacion_id, [nuevo, {"role": "assistant", "content": texto}])
+        medicion.terminar()
+        yield _evento({"fin": True, "respuesta": texto})
+        gestor_contexto.programar_resumen(conversacion_id, contexto)
+
+    respuesta = StreamingHttpResponse(generar(), content_type="text/event-stream")
+    respuesta["Cache-Control"] = "no-cache"
+    respuesta["X-Accel-Buffering"] = "no"  # que nginx no acumule los eventos
+    return respuesta
+
+
+# ==========================================================
+# Estado del chat (backend, admisión, caché, contexto, pool async)
+# ==========================================================
+@staff_member_required
+@require_GET
+def estado_chat(request):
+    from .chat_async import pool_ollama
+
+    return JsonResponse({
+        "backend": backend_chat.estado(),
+        "admision": control_admision.estadisticas(),
+        "cache": cache_respuestas_chat.estadisticas(),
+        "contexto": gestor_contexto.estadisticas(),
+        "contexto_usuario": contexto_usuario.estadisticas(),
+        "catalogo": busqueda_catalogo.indice.estadisticas(),
+        "pool_async": pool_ollama.estadisticas(),
+        "metricas": metricas_chat.resumen(),
+    })
+
+
+@staff_member_required
+@require_GET
+def panel_metricas_chat(request):
+    """Panel de staff: latencia y tokens del chat en la ventana de IA_CHAT_METRICAS_VENTANA peticiones."""
+    resumen = metricas_chat.resumen()
+    filas = [
+        (etiqueta, resumen["ollama"].get(campo), resumen["cache"].get(campo))
+        for campo, etiqueta in (
+            ("ttft_ms", "Primer token (ms)"),
+            ("total_ms", "Total (ms)"),
+            ("ollama_ms", "En Ollama (ms)"),
+            ("espera_ms", "Cola de admisión (ms)"),
+            ("django_ms", "En Django (ms)"),
+            ("carga_ms", "Carga del modelo (ms)"),
+            ("prompt_tokens", "Tokens del prompt"),
+            ("completion_tokens", "Tokens generados"),
+            ("tokens_s", "Tokens por segundo"),
+        )
+    ]
+    return render(request, "IA/admin_metricas_chat.html", {
+        "resumen": resumen,
+        "filas": filas,
+        "backend": backend_chat.estado(),
+        "admision": control_admision.estadisticas(),
+    })
+
+
+@require_GET
+def salud_chat(request):
+    """
+    Para balanceadores / monitoreo: 200 si el modelo está cargado en Ollama, 503 si no.
+    No pide sesión, así que solo informa el estado (el detalle está en estado_chat).
+    """
+    estado = backend_chat.estado(consultar_ollama=True)
+    return JsonResponse(
+        {"cargado": estado["cargado"], "listo": estado["listo"]},
+        status=200 if estado["cargado"] else 503,
+    )
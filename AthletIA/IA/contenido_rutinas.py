@@ -0,0 +1,124 @@
+"""
+Caché compartida del contenido de las rutinas (sus ejercicios).
+
+El calendario, las rutinas guardadas, el preview y el compartir del muro, el
+detalle de rutina y la sincronización con Google muestran la misma lista de
+ejercicios de una rutina; aquí se lee una vez por rutina y la comparten
+todos. Cada vista toma de cada ejercicio los campos que ya devolvía.
+
+Cada entrada guarda la versión de la rutina (Rutina.actualizado, que cambia
+al editarla o al cambiar sus ejercicios): quien ya tiene la fila de la rutina
+pasa su versión y, si no coincide, se vuelve a leer, así otro proceso nunca
+sirve una lista vieja. En este proceso las señales de Rutina y
+RutinaEjercicio (editar_rutina, toggle_rutina, el panel admin) descartan la
+entrada al tiro, y las de Ejercicio/Músculo/NivelDificultad vacían todo.
+Las entradas vencen a los IA_CONTENIDO_RUTINAS_TTL_S segundos.
+"""
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from api_ejercicio.models import Ejercicio, Musculo, NivelDificultad, Rutina, RutinaEjercicio
+
+from .cache_recomendaciones import CacheLRUConVencimiento
+
+
+MAX_IDS_POR_CONSULTA = 1000   # SQL Server acepta hasta 2100 parámetros
+
+_CAMPOS = (
+    "rutina_id", "ejercicio_id", "ejercicio__nombre", "ejercicio__descripcion",
+    "ejercicio__musculo__nombre", "ejercicio__nivel_dificultad__nombre", "repeticiones", "orden",
+)
+
+
+def leer_ejercicios(rutina_ids):
+    """{rutina_id: (ejercicio, ...)} desde la BD, en una consulta por cada MAX_IDS_POR_CONSULTA rutinas."""
+    rutina_ids = list(rutina_ids)
+    resultado = {rutina_id: [] for rutina_id in rutina_ids}
+    for i in range(0, len(rutina_ids), MAX_IDS_POR_CONSULTA):
+        filas = (
+            RutinaEjercicio.objects
+            .filter(rutina_id__in=rutina_ids[i:i + MAX_IDS_POR_CONSULTA])
+            .order_by("rutina_id", "id")
+            .values_list(*_CAMPOS)
+        )
+        for rutina_id, id_, nombre, descripcion, musculo, nivel, repeticiones, orden in filas:
+            resultado[rutina_id].append({
+                "id": id_,
+                "nombre": nombre,
+                "descripcion": descripcion,
+                "musculo": musculo,
+                "nivel": nivel,
+                "repeticiones": repeticiones,
+                "orden": orden,
+            })
+    return {rutina_id: tuple(ejercicios) for rutina_id, ejercicios in resultado.items()}
+
+
+class ContenidoRutinas:
+    """Los ejercicios que se devuelven son compartidos: no modificarlos."""
+
+    def __init__(self, max_items=4096, ttl_s=600):
+        self._cache = CacheLRUConVencimiento(max_items, ttl_s)
+        self.desactualizadas = 0
+
+    def varias(self, versiones):
+        """
+        {rutina_id: ejercicios} para {rutina_id: versión (Rutina.actualizado o None)},
+        con una sola lectura para todas las que falten o cambiaron.
+        """
+        resultado, faltan = {}, []
+        for rutina_id, version in versiones.items():
+            entrada = self._cache.obtener(rutina_id)
+            if entrada is not None and version is not None and entrada[0] != version:
+                self.desactualizadas += 1
+                entrada = None
+            if entrada is None:
+                faltan.append(rutina_id)
+            else:
+                resultado[rutina_id] = entrada[1]
+
+        if faltan:
+            for rutina_id, ejercicios in leer_ejercicios(faltan).items():
+                self._cache.guardar(rutina_id, (versiones[rutina_id], ejercicios))
+                resultado[rutina_id] = ejercicios
+        return resultado
+
+    def de_rutina(self, rutina):
+        """Ejercicios de una instancia de Rutina (su `actualizado` es la versión)."""
+        return self.varias({rutina.pk: rutina.actualizado})[rutina.pk]
+
+    def invalidar(self, rutina_ids):
+        self._cache.descartar(rutina_ids)
+
+    def limpiar(self):
+        self._cache.limpiar()
+
+    def estadisticas(self):
+        return {**self._cache.estadisticas(), "desactualizadas": self.desactualizadas}
+
+
+contenido_rutinas = ContenidoRutinas(
+    max_items=getattr(settings, "IA_CONTENIDO_RUTINAS_MAX", 4096),
+    ttl_s=getattr(settings, "IA_CONTENIDO_RUTINAS_TTL_S", 600),
+)
+
+
+# ==========================================================
+# Invalidación
+# ==========================================================
+@receiver([post_save, post_delete], sender=Rutina)
+def invalidar_rutina(sender, instance, **kwargs):
+    contenido_rutinas.invalidar([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=RutinaEjercicio)
+def invalidar_rutina_del_ejercicio(sender, instance, **kwargs):
+    contenido_rutinas.invalidar([instance.rutina_id])
+
+
+@receiver([post_save, post_delete], sender=Ejercicio)
+@receiver([post_save, post_delete], sender=Musculo)
+@receiver([post_save, post_delete], sender=NivelDificultad)
+def limpiar_contenido_rutinas(sender, **kwargs):
+    contenido_rutinas.limpiar()
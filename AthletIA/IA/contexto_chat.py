@@ -0,0 +1,213 @@
+"""
+Ventana de contexto del chat con presupuesto de tokens y resumen acumulado.
+
+En vez de mandar al modelo el prompt de sistema + hasta 30 turnos completos, se
+mandan los turnos más recientes que caben en IA_CHAT_PRESUPUESTO_TOKENS y un
+resumen de lo anterior guardado en ConversacionChat.resumen. El resumen se
+actualiza en segundo plano, después de responder, cuando se acumulan
+IA_CHAT_MIN_PARA_RESUMIR mensajes que ya no caben; así el tamaño del prompt
+(y el tiempo de procesarlo) no crece con el largo de la conversación.
+"""
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import ConversacionChat, MensajeChat
+
+
+# phi3 no trae tokenizador local: en español ~3.5 caracteres por token
+CARACTERES_POR_TOKEN = 3.5
+TOKENS_POR_MENSAJE = 4  # rol + separadores de la plantilla de chat
+
+MAX_TOKENS_RESUMEN = 120
+MAX_MENSAJES_POR_RESUMEN = 100
+
+PROMPT_RESUMEN = (
+    "Resume en español, en máximo tres frases, lo importante de esta conversación entre un usuario y "
+    "su entrenador: datos del usuario, objetivos, lesiones, preferencias y lo que ya se le recomendó. "
+    "Incluye lo que diga el resumen anterior si sigue siendo relevante."
+)
+
+
+def contar_tokens(texto):
+    return math.ceil(len(texto or "") / CARACTERES_POR_TOKEN)
+
+
+def tokens_mensaje(mensaje):
+    return contar_tokens(mensaje["content"]) + TOKENS_POR_MENSAJE
+
+
+def armar_contexto(prompt_sistema, resumen, anteriores, nuevo, presupuesto):
+    """
+    Mensajes para el modelo: sistema (+ resumen), los turnos más recientes de
+    `anteriores` que caben en `presupuesto` y el mensaje nuevo.
+    Devuelve (mensajes, tokens estimados, cuántos de `anteriores` quedaron fuera).
+    """
+    sistema = prompt_sistema
+    if resumen:
+        sistema += f"\n\nResumen de la conversación hasta ahora: {resumen}"
+    mensaje_sistema = {"role": "system", "content": sistema}
+
+    usados = tokens_mensaje(mensaje_sistema) + tokens_mensaje(nuevo)
+    recientes = []
+    for mensaje in reversed(anteriores):
+        tokens = tokens_mensaje(mensaje)
+        if usados + tokens > presupuesto:
+            break
+        recientes.append(mensaje)
+        usados += tokens
+    recientes.reverse()
+
+    # No empezar con una respuesta sin su pregunta
+    if recientes and recientes[0]["role"] == "assistant":
+        usados -= tokens_mensaje(recientes.pop(0))
+
+    return [mensaje_sistema] + recientes + [nuevo], usados, len(anteriores) - len(recientes)
+
+
+def con_bloques(prompt_sistema, *bloques):
+    """Prompt de sistema + los bloques de contexto no vacíos."""
+    return "\n\n".join([prompt_sistema, *(b for b in bloques if b)])
+
+
+def resumir(cliente, modelo, resumen_previo, mensajes, keep_alive=None):
+    """Un llamado corto al modelo que pliega `mensajes` en el resumen."""
+    texto = "\n".join(f"{'Usuario' if m['role'] == 'user' else 'Entrenador'}: {m['content']}" for m in mensajes)
+    if resumen_previo:
+        texto = f"Resumen anterior: {resumen_previo}\n\n{texto}"
+
+    respuesta = cliente.chat(
+        model=modelo,
+        messages=[{"role": "system", "content": PROMPT_RESUMEN}, {"role": "user", "content": texto}],
+        options={"num_predict": MAX_TOKENS_RESUMEN},
+        keep_alive=keep_alive,
+    )
+    resumen = respuesta["message"]["content"].strip()
+    return resumen[:int(MAX_TOKENS_RESUMEN * CARACTERES_POR_TOKEN)]
+
+
+@dataclass
+class Contexto:
+    mensajes: list
+    tokens_prompt: int
+    resumir_hasta_id: Optional[int] = None   # último id que conviene plegar en el resumen
+    primer_turno: bool = False                # sin mensajes previos ni resumen
+
+
+class GestorContexto:
+
+    def __init__(self, presupuesto_tokens=1024, min_para_resumir=6, ventana=30):
+        self.presupuesto_tokens = presupuesto_tokens
+        self.min_para_resumir = min_para_resumir
+        self.ventana = ventana
+        self._ejecutor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._en_curso = set()       # conversaciones con un resumen pendiente
+        self.resumenes = 0
+        self.errores = 0
+
+    # ------------------------------------------------------
+    # Armado del contexto (en el camino de la respuesta)
+    # ------------------------------------------------------
+    def _consulta(self, conversacion_id, desde_id):
+        return (
+            MensajeChat.objects
+            .filter(conversacion_id=conversacion_id, id__gt=desde_id)
+            .order_by("-id")
+            .values_list("id", "rol", "contenido")[:self.ventana]
+        )
+
+    def _contexto(self, prompt_sistema, conversacion, filas, nuevo):
+        filas = list(reversed(filas))
+        anteriores = [{"role": rol, "content": contenido} for _, rol, contenido in filas]
+        mensajes, tokens, fuera = armar_contexto(
+            prompt_sistema, conversacion["resumen"], anteriores, nuevo, self.presupuesto_tokens
+        )
+        hasta_id = filas[fuera - 1][0] if fuera >= self.min_para_resumir else None
+        return Contexto(mensajes, tokens, hasta_id, primer_turno=not filas and not conversacion["resumen"])
+
+    def preparar(self, conversacion_id, prompt_sistema, nuevo):
+        conversacion = ConversacionChat.objects.values("resumen", "resumen_hasta_id").get(pk=conversacion_id)
+        filas = list(self._consulta(conversacion_id, conversacion["resumen_hasta_id"]))
+        return self._contexto(prompt_sistema, conversacion, filas, nuevo)
+
+    async def apreparar(self, conversacion_id, prompt_sistema, nuevo):
+        conversacion = await ConversacionChat.objects.values("resumen", "resumen_hasta_id").aget(pk=conversacion_id)
+        filas = [f async for f in self._consulta(conversacion_id, conversacion["resumen_hasta_id"])]
+        return self._contexto(prompt_sistema, conversacion, filas, nuevo)
+
+    # ------------------------------------------------------
+    # Resumen (fuera del camino de la respuesta)
+    # ------------------------------------------------------
+    def programar_resumen(self, conversacion_id, contexto):
+        """Llamar después de responder, para no competir con la respuesta en Ollama."""
+        if contexto.resumir_hasta_id is None:
+            return
+        with self._lock:
+            if conversacion_id in self._en_curso:
+                return
+            self._en_curso.add(conversacion_id)
+            if self._ejecutor is None or self._pid != os.getpid():
+                self._ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ia-resumen")
+                self._pid = os.getpid()
+        self._ejecutor.submit(self._resumir, conversacion_id, contexto.resumir_hasta_id)
+
+    def _resumir(self, conversacion_id, hasta_id):
+        from .admision_chat import control_admision
+        from .backend_chat import backend_chat
+        from .chat_virtual import cliente
+
+        try:
+            close_old_connections()
+            conversacion = ConversacionChat.objects.values("resumen", "resumen_hasta_id").get(pk=conversacion_id)
+            desde_id = conversacion["resumen_hasta_id"]
+            mensajes = [
+                {"role": rol, "content": contenido}
+                for rol, contenido in MensajeChat.objects
+                .filter(conversacion_id=conversacion_id, id__gt=desde_id, id__lte=hasta_id)
+                .order_by("-id")
+                .values_list("rol", "contenido")[:MAX_MENSAJES_POR_RESUMEN]
+            ][::-1]
+            if not mensajes:
+                return
+
+            # Comparte el cupo de Ollama con los chats (si no hay cupo, se reintenta en otro turno)
+            with control_admision.turno():
+                resumen = resumir(
+                    cliente, backend_chat.modelo, conversacion["resumen"], mensajes, keep_alive=backend_chat.keep_alive
+                )
+
+            # Solo si nadie más avanzó el resumen mientras tanto
+            ConversacionChat.objects.filter(pk=conversacion_id, resumen_hasta_id=desde_id).update(
+                resumen=resumen, resumen_hasta_id=hasta_id
+            )
+            self.resumenes += 1
+        except Exception as e:
+            self.errores += 1
+            print("🔥 ERROR resumiendo conversación del chat:", e)
+        finally:
+            close_old_connections()
+            with self._lock:
+                self._en_curso.discard(conversacion_id)
+
+    def estadisticas(self):
+        return {
+            "presupuesto_tokens": self.presupuesto_tokens,
+            "min_para_resumir": self.min_para_resumir,
+            "resumenes": self.resumenes,
+            "resumenes_pendientes": len(self._en_curso),
+            "errores": self.errores,
+        }
+
+
+gestor_contexto = GestorContexto(
+    presupuesto_tokens=getattr(settings, "IA_CHAT_PRESUPUESTO_TOKENS", 1024),
+    min_para_resumir=getattr(settings, "IA_CHAT_MIN_PARA_RESUMIR", 6),
+)
@@ -0,0 +1,177 @@
+"""
+Bloque de contexto del usuario para el chat del coach.
+
+Unas pocas líneas (objetivo, datos físicos, salud, sueño, última
+recomendación y adherencia al calendario) que se agregan al prompt de
+sistema para que el coach responda sabiendo con quién habla. Se arma con
+cargar_snapshot + dos consultas la primera vez y queda en una caché en
+proceso por perfil: los turnos siguientes no consultan la BD. Se invalida
+con las señales de los modelos de los que sale y, como respaldo (update(),
+bulk_create, otros procesos), por tiempo (IA_CHAT_CONTEXTO_USUARIO_TTL_S).
+Se acota a IA_CHAT_CONTEXTO_USUARIO_MAX_TOKENS para no inflar el prompt.
+"""
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from App.models import (
+    Perfil, SaludUsuario, ProgresoUsuario, ObjetivoUsuario, SuenoUsuario, HistorialMedidas
+)
+from App.snapshot_perfil import cargar_snapshot
+from api_ejercicio.models import CalendarioRutina
+
+from .cache_recomendaciones import CacheLRUConVencimiento
+from .contexto_chat import contar_tokens
+from .models import RecomendacionIA
+
+
+DIAS_ADHERENCIA = 30
+
+ENCABEZADO = "Datos del usuario (úsalos solo si vienen al caso):"
+
+
+def _numero(valor):
+    return f"{valor:g}" if isinstance(valor, (int, float)) else valor
+
+
+def _lineas(perfil_id):
+    """Líneas del bloque, de la más a la menos importante."""
+    snap = cargar_snapshot(Perfil(pk=perfil_id))
+    lineas = []
+
+    if snap.objetivo_nombre:
+        lineas.append(f"- Objetivo: {snap.objetivo_nombre}.")
+
+    salud = snap.salud
+    if salud:
+        partes = [
+            f"{etiqueta}: {valor.strip()}"
+            for etiqueta, valor in (
+                ("lesiones", salud.lesiones_actuales),
+                ("enfermedades", salud.enfermedades_preexistentes),
+                ("alergias", salud.alergias),
+            )
+            if valor and valor.strip()
+        ]
+        if partes:
+            lineas.append(f"- Salud: {'; '.join(partes)}.")
+
+    fisico = [
+        texto for texto in (
+            f"{snap.edad} años" if snap.edad else None,
+            snap.perfil.genero,
+            f"{_numero(snap.peso_kg)} kg" if snap.peso_kg else None,
+            f"{_numero(snap.altura_cm)} cm" if snap.altura_cm else None,
+            f"{_numero(snap.grasa_corporal)}% de grasa" if snap.grasa_corporal else None,
+        )
+        if texto
+    ]
+    if fisico:
+        lineas.append(f"- {', '.join(fisico)}.")
+
+    ultima = (
+        RecomendacionIA.objects
+        .filter(perfil_id=perfil_id)
+        .order_by("-fecha_recomendacion")
+        .values_list("rutina_recomendada", "fecha_recomendacion")
+        .first()
+    )
+    if ultima:
+        lineas.append(f"- Última rutina recomendada: {ultima[0]} ({ultima[1]:%d-%m-%Y}).")
+
+    hoy = timezone.localdate()
+    adherencia = CalendarioRutina.objects.filter(
+        perfil_id=perfil_id, fecha__gte=hoy - timedelta(days=DIAS_ADHERENCIA), fecha__lte=hoy
+    ).aggregate(programadas=Count("id"), completadas=Count("id", filter=Q(completada=True)))
+    if adherencia["programadas"]:
+        lineas.append(
+            f"- Últimos {DIAS_ADHERENCIA} días: {adherencia['completadas']} de "
+            f"{adherencia['programadas']} entrenamientos completados."
+        )
+
+    if snap.horas_dormidas:
+        calidad = f" ({snap.calidad_sueno})" if snap.calidad_sueno else ""
+        lineas.append(f"- Duerme {_numero(snap.horas_dormidas)} h{calidad}.")
+
+    return lineas
+
+
+def construir_bloque(perfil_id, max_tokens):
+    """Bloque con las líneas que caben en `max_tokens` ("" si no hay datos)."""
+    bloque = ENCABEZADO
+    for linea in _lineas(perfil_id):
+        if contar_tokens(f"{bloque}\n{linea}") > max_tokens:
+            break
+        bloque += f"\n{linea}"
+    return "" if bloque == ENCABEZADO else bloque
+
+
+class ContextoUsuario:
+
+    def __init__(self, activo=True, max_tokens=150, max_items=2048, ttl_s=900):
+        self.activo = activo
+        self.max_tokens = max_tokens
+        self._cache = CacheLRUConVencimiento(max_items, ttl_s)
+
+    def bloque(self, user):
+        if not self.activo or not user.is_authenticated:
+            return ""
+        bloque = self._cache.obtener(user.pk)
+        if bloque is None:
+            bloque = construir_bloque(user.pk, self.max_tokens)
+            self._cache.guardar(user.pk, bloque)
+        return bloque
+
+    async def abloque(self, user):
+        if not self.activo or not user.is_authenticated:
+            return ""
+        bloque = self._cache.obtener(user.pk)
+        if bloque is None:
+            bloque = await sync_to_async(construir_bloque)(user.pk, self.max_tokens)
+            self._cache.guardar(user.pk, bloque)
+        return bloque
+
+    def invalidar(self, perfil_ids):
+        self._cache.descartar(perfil_ids)
+
+    def estadisticas(self):
+        return {"activo": self.activo, "max_tokens": self.max_tokens, **self._cache.estadisticas()}
+
+
+contexto_usuario = ContextoUsuario(
+    activo=getattr(settings, "IA_CHAT_CONTEXTO_USUARIO", True),
+    max_tokens=getattr(settings, "IA_CHAT_CONTEXTO_USUARIO_MAX_TOKENS", 150),
+    ttl_s=getattr(settings, "IA_CHAT_CONTEXTO_USUARIO_TTL_S", 900),
+)
+
+
+# ==========================================================
+# Invalidación
+# ==========================================================
+@receiver([post_save, post_delete], sender=ProgresoUsuario)
+@receiver([post_save, post_delete], sender=ObjetivoUsuario)
+@receiver([post_save, post_delete], sender=SuenoUsuario)
+@receiver([post_save, post_delete], sender=HistorialMedidas)
+@receiver([post_save, post_delete], sender=RecomendacionIA)
+@receiver([post_save, post_delete], sender=CalendarioRutina)
+def invalidar_por_registro(sender, instance, **kwargs):
+    if instance.perfil_id is not None:
+        contexto_usuario.invalidar([instance.perfil_id])
+
+
+@receiver(post_save, sender=Perfil)
+def invalidar_por_perfil(sender, instance, update_fields=None, **kwargs):
+    # El login guarda solo last_login: no cambia nada del bloque
+    if update_fields and set(update_fields) == {"last_login"}:
+        return
+    contexto_usuario.invalidar([instance.pk])
+
+
+@receiver(post_save, sender=SaludUsuario)
+def invalidar_por_salud(sender, instance, **kwargs):
+    contexto_usuario.invalidar(Perfil.objects.filter(salud_usuario=instance).values_list("pk", flat=True))
@@ -0,0 +1,161 @@
+"""
+Construcción de la fila de entrada del recomendador a partir de un SnapshotPerfil.
+
+La usan la vista recomendar_rutina (con los datos del wizard en `body`) y el
+comando puntuar_perfiles (sin body, solo con lo guardado en la BD), para que
+ambos puntúen exactamente la misma fila.
+"""
+from dataclasses import dataclass
+
+
+# Medidas corporales por defecto cuando el usuario no tiene HistorialMedidas.
+# Son fijas (punto medio del rango usado al entrenar) para que la misma
+# entrada produzca siempre el mismo vector y la caché pueda acertar.
+MEDIDAS_POR_DEFECTO = {
+    "grasa_corporal": 16.5,
+    "masa_muscular": 32.5,
+    "cintura_cm": 85.0,
+    "cadera_cm": 97.5,
+}
+
+
+@dataclass
+class EntradaRecomendador:
+    fila: dict
+    nivel_ajustado: str
+    duracion: float
+    riesgo: bool
+
+
+def construir_entrada(snap, body=None):
+    """Pasos 1-7 de recomendar_rutina: datos del perfil (+ wizard) -> fila del modelo."""
+    body = body or {}
+    salud = snap.salud
+
+    # Edad e IMC
+    edad = float(body.get("edad") or (snap.edad if snap.edad is not None else 28))
+    altura_cm = float(snap.altura_cm) if snap.altura_cm else 170
+    peso_kg = float(snap.peso_kg) if snap.peso_kg else 70
+    imc = peso_kg / ((altura_cm / 100) ** 2)
+
+    # ======================================================
+    # 2. Datos de ritmo y entrenamiento
+    # ======================================================
+    ritmo = float(body.get("ritmo_cardiaco") or (salud.frecuencia_cardiaca_reposo if salud and salud.frecuencia_cardiaca_reposo else 75))
+    
+    duracion = float(body.get("duracion_min", 45))
+    calorias = float(body.get("calorias_quemadas", 300))
+    objetivo_nombre = str(body.get("objetivo") or (snap.objetivo_nombre if snap.tiene_objetivo else "Mantener peso actual"))
+    nivel = str(body.get("nivel_experiencia", "Intermedio"))
+
+    # ======================================================
+    # 3. Salud y hábitos
+    # ======================================================
+    fuma = body.get("fuma") or ("Sí" if salud and salud.fuma else "No")
+    bebe = body.get("bebe") or ("Sí" if salud and salud.bebe else "No")
+    lesiones_actuales = body.get("lesiones_actuales") or (salud.lesiones_actuales if salud and salud.lesiones_actuales else "No tengo lesiones")
+    enfermedades_preexistentes = body.get("enfermedades_preexistentes") or (salud.enfermedades_preexistentes if salud and salud.enfermedades_preexistentes else "No poseo")
+
+    # ======================================================
+    # 4. Sueño y nutrición
+    # ======================================================
+    horas_sueno = body.get("horas_dormidas") or (snap.horas_dormidas if snap.tiene_sueno else "7 a 8 horas (óptimo)")
+    calidad_sueno = body.get("calidad_sueno") or (snap.calidad_sueno if snap.tiene_sueno else "Buena")
+    despertares = body.get("despertares_nocturnos") or (snap.despertares_nocturnos if snap.tiene_sueno else "1 vez")
+
+    tipo_comida = body.get("tipo_comida_principal") or (snap.comida if snap.tiene_nutricion else "Balanceada")
+    calorias_diarias = body.get("calorias_diarias_aprox") or (f"{int(snap.calorias)} kcal" if snap.calorias else "2000 - 2500 kcal")
+    consumo_prot = body.get("consumo_proteinas") or (
+        "Moderado" if not snap.proteinas else
+        "Alto (según objetivos)" if snap.proteinas >= 100 else
+        "Bajo"
+    )
+
+    meta_peso = body.get("meta_peso_corporal") or "Mantener peso actual"
+    meta_grasa = body.get("meta_grasa_corporal") or "Entre 10% y 15%"
+
+    # ======================================================
+    # 5. Ajuste de dificultad inteligente
+    # ======================================================
+    peso_dificultad = 0
+    if "avan" in nivel.lower(): peso_dificultad += 2
+    elif "inter" in nivel.lower(): peso_dificultad += 1
+
+    if duracion >= 100: peso_dificultad += 2
+    elif duracion >= 60: peso_dificultad += 1
+    elif duracion < 30: peso_dificultad -= 1
+
+    if any(x in objetivo_nombre.lower() for x in ["fuerza", "muscul", "intenso", "rendimiento"]): peso_dificultad += 1
+    elif any(x in objetivo_nombre.lower() for x in ["mantener", "salud", "bajar"]): peso_dificultad -= 1
+
+    nivel_ajustado = "Avanzado" if peso_dificultad >= 3 else "Intermedio" if peso_dificultad >= 1 else "Principiante"
+
+    # ======================================================
+    # 6. Reglas de salud antes de predicción
+    # ======================================================
+    riesgo_enfermedad = any(x in str(enfermedades_preexistentes).lower() for x in ["diab", "asma", "hipert", "card", "colest"])
+    riesgo_lesion = any(x in str(lesiones_actuales).lower() for x in ["rodilla", "hombro", "espalda", "desgarro", "esguince"])
+
+    if riesgo_enfermedad or riesgo_lesion:
+        duracion = min(duracion, 45)
+        calorias = min(calorias, 250)
+        nivel_ajustado = "Principiante"
+
+    # ======================================================
+    # 7. Fila completa de entrada para IA
+    # ======================================================
+    fila = {
+        "edad": edad,
+        "imc": imc,
+        "ritmo_cardiaco": ritmo,
+        "duracion_min": duracion,
+        "calorias_quemadas": calorias,
+        "altura_cm": altura_cm,
+        "peso_kg": peso_kg,
+        "grasa_corporal": float(snap.grasa_corporal) if snap.grasa_corporal else MEDIDAS_POR_DEFECTO["grasa_corporal"],
+        "masa_muscular": float(snap.masa_muscular) if snap.masa_muscular else MEDIDAS_POR_DEFECTO["masa_muscular"],
+        "cintura_cm": float(snap.cintura_cm) if snap.cintura_cm else MEDIDAS_POR_DEFECTO["cintura_cm"],
+        "cadera_cm": float(snap.cadera_cm) if snap.cadera_cm else MEDIDAS_POR_DEFECTO["cadera_cm"],
+        "fuma": fuma,
+        "bebe": bebe,
+        "lesiones_actuales": lesiones_actuales,
+        "enfermedades_preexistentes": enfermedades_preexistentes,
+        "horas_dormidas": horas_sueno,
+        "calidad_sueno": calidad_sueno,
+        "despertares_nocturnos": despertares,
+        "tipo_comida_principal": tipo_comida,
+        "calorias_diarias_aprox": calorias_diarias,
+        "consumo_proteinas": consumo_prot,
+        "meta_peso_corporal": meta_peso,
+        "meta_grasa_corporal": meta_grasa,
+        "objetivo": objetivo_nombre,
+        "nivel_experiencia": nivel_ajustado,
+    }
+
+    return EntradaRecomendador(
+        fila=fila,
+        nivel_ajustado=nivel_ajustado,
+        duracion=duracion,
+        riesgo=riesgo_enfermedad or riesgo_lesion,
+    )
+
+
+def aplicar_correcciones(entrada, resultado):
+    """Paso 9: reglas de salud sobre el resultado del modelo -> (rutina, top3, precisión)."""
+    top3 = resultado["top3"]
+    rutina_principal = resultado["rutina_principal"]
+    precision_modelo = resultado["precision_modelo"]
+
+    if entrada.riesgo:
+        rutina_principal = "Rehabilitación"
+        top3 = [
+            {"rutina": "Rehabilitación", "probabilidad": 85.0},
+            {"rutina": "Pilates", "probabilidad": 10.0},
+            {"rutina": "Yoga", "probabilidad": 5.0},
+        ]
+
+    if entrada.duracion > 120 and "fuerza" in rutina_principal.lower():
+        rutina_principal = "Full Body Workout"
+        precision_modelo = round(precision_modelo * 0.9, 2)
+
+    return rutina_principal, top3, precision_modelo
@@ -0,0 +1,90 @@
+"""
+Historial del chat del coach guardado en la BD (ConversacionChat / MensajeChat).
+
+La sesión solo guarda el id de la conversación: cada turno agrega sus dos
+mensajes con un INSERT y se leen los últimos `limite` mensajes con una
+consulta acotada, en vez de reescribir la lista completa en la sesión en
+cada turno. Hay versión síncrona (chat_virtual) y async (chat_async).
+"""
+from asgiref.sync import sync_to_async
+
+from .models import ConversacionChat, MensajeChat
+
+
+SESION_CONVERSACION = "chat_conversacion_id"
+
+# Clave usada antes de este módulo; se migra a la BD la primera vez
+SESION_HISTORIAL_ANTIGUO = "chat_historial"
+
+
+def _perfil(user):
+    return user if user.is_authenticated else None
+
+
+def _mensajes_modelo(conversacion_id, mensajes):
+    return [MensajeChat(conversacion_id=conversacion_id, rol=m["role"], contenido=m["content"]) for m in mensajes]
+
+
+def _como_historial(filas):
+    return [{"role": rol, "content": contenido} for rol, contenido in reversed(filas)]
+
+
+def _consulta_ventana(conversacion_id, limite):
+    return (
+        MensajeChat.objects
+        .filter(conversacion_id=conversacion_id)
+        .order_by("-id")
+        .values_list("rol", "contenido")[:limite]
+    )
+
+
+# ==========================================================
+# Versión síncrona
+# ==========================================================
+def conversacion_actual(request, limite):
+    """Id de la conversación de la sesión; la crea si no existe."""
+    conversacion_id = request.session.get(SESION_CONVERSACION)
+    if conversacion_id is None:
+        conversacion_id = ConversacionChat.objects.create(perfil=_perfil(request.user)).id
+        request.session[SESION_CONVERSACION] = conversacion_id
+
+        antiguo = request.session.pop(SESION_HISTORIAL_ANTIGUO, None)
+        if antiguo:
+            agregar_mensajes(conversacion_id, antiguo[-limite:])
+    return conversacion_id
+
+
+def cargar_historial(conversacion_id, limite):
+    """Últimos `limite` mensajes, en orden cronológico."""
+    return _como_historial(list(_consulta_ventana(conversacion_id, limite)))
+
+
+def agregar_mensajes(conversacion_id, mensajes):
+    MensajeChat.objects.bulk_create(_mensajes_modelo(conversacion_id, mensajes))
+
+
+def reiniciar(request):
+    """La próxima pregunta abre una conversación nueva (la anterior queda guardada)."""
+    request.session.pop(SESION_CONVERSACION, None)
+    request.session.pop(SESION_HISTORIAL_ANTIGUO, None)
+
+
+# ==========================================================
+# Versión async
+# ==========================================================
+# La sesión recién tiene aget/aset/apop desde Django 5.1 (requirements fija
+# 5.0.1): lo que la toca corre en un hilo con la versión síncrona.
+async def aconversacion_actual(request, limite):
+    return await sync_to_async(conversacion_actual)(request, limite)
+
+
+async def acargar_historial(conversacion_id, limite):
+    return _como_historial([fila async for fila in _consulta_ventana(conversacion_id, limite)])
+
+
+async def aagregar_mensajes(conversacion_id, mensajes):
+    await MensajeChat.objects.abulk_create(_mensajes_modelo(conversacion_id, mensajes))
+
+
+async def areiniciar(request):
+    await sync_to_async(reiniciar)(request)
@@ -0,0 +1,287 @@
+"""
+Runtime del modelo AthletIA.
+
+El modelo Keras, el preprocesador y el label encoder se cargan la primera vez
+que se necesitan (no al importar las vistas) y se mantiene una sola copia
+"caliente" por versión y proceso. Qué versión está activa (y cuál en sombra)
+lo decide el registro de IA/registro_modelos.py. Se puede precargar desde
+IaConfig.ready().
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_DIR = os.path.join(BASE_DIR, "modelos")
+
+MODELO_VERSION = "AthletIA v13 (Full Health + Habits)"
+
+# Llamadas recientes que se guardan para los percentiles de latencia
+VENTANA_LATENCIAS = 1000
+
+
+def memoria_rss_mb():
+    """Memoria residente del proceso en MB (None si no se puede medir)."""
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().rss / (1024 * 1024), 1)
+    except ImportError:
+        pass
+
+    try:
+        with open("/proc/self/statm") as f:
+            paginas = int(f.read().split()[1])
+        return round(paginas * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024), 1)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class ModeloRuntime:
+    """Contenedor perezoso de los artefactos del recomendador."""
+
+    def __init__(self, model_dir=MODEL_DIR, version=MODELO_VERSION):
+        self.model_dir = model_dir
+        self.version = version
+        self.model = None
+        self.preprocessor = None
+        self.label_encoder = None
+        self.metricas = {}
+        self._forward = None
+        self.codificador = None
+        self._lock = threading.Lock()
+        self._latencias = deque(maxlen=VENTANA_LATENCIAS)  # (ms, filas) por llamada
+        self.llamadas = 0
+        self.filas_puntuadas = 0
+
+    @property
+    def cargado(self):
+        return self.model is not None
+
+    def cargar(self):
+        if self.cargado:
+            return self
+
+        with self._lock:
+            if self.cargado:
+                return self
+
+            rss_inicio = memoria_rss_mb()
+            t0 = time.perf_counter()
+
+            import joblib
+            import tensorflow as tf
+            t_import = time.perf_counter()
+
+            model = tf.keras.models.load_model(os.path.join(self.model_dir, "athletia_recomendador.keras"), compile=False)
+            preprocessor = joblib.load(os.path.join(self.model_dir, "preprocessor_athletia.pkl"))
+            label_encoder = joblib.load(os.path.join(self.model_dir, "label_encoder_athletia.pkl"))
+            t_artefactos = time.perf_counter()
+
+            codificador = self._construir_codificador(preprocessor)
+
+            forward = None
+            if getattr(settings, "IA_INFERENCIA_COMPILADA", True):
+                forward = self._compilar(tf, model)
+            t_fin = time.perf_counter()
+
+            rss_fin = memoria_rss_mb()
+            self.metricas = {
+                "import_tf_s": round(t_import - t0, 3),
+                "carga_artefactos_s": round(t_artefactos - t_import, 3),
+                "compilacion_s": round(t_fin - t_artefactos, 3),
+                "carga_total_s": round(t_fin - t0, 3),
+                "parametros": int(model.count_params()),
+                "pesos_mb": round(sum(w.nbytes for w in model.get_weights()) / (1024 * 1024), 2),
+                "rss_antes_mb": rss_inicio,
+                "rss_despues_mb": rss_fin,
+                "rss_delta_mb": round(rss_fin - rss_inicio, 1) if rss_inicio is not None and rss_fin is not None else None,
+            }
+
+            self.preprocessor = preprocessor
+            self.label_encoder = label_encoder
+            self._forward = forward
+            self.codificador = codificador
+            # El modelo se asigna al final: `cargado` solo es True con todo listo.
+            self.model = model
+
+            print(f"✅ Modelo IA cargado ({self.version}) en {self.metricas['carga_total_s']} s")
+
+        return self
+
+    @staticmethod
+    def _construir_codificador(preprocessor):
+        """
+        Codificador NumPy equivalente al preprocesador. Solo se usa si pasa la
+        verificación contra `preprocessor.transform`; si no, se sigue usando pandas.
+        """
+        from .caracteristicas import CodificadorCaracteristicas, verificar_equivalencia
+
+        try:
+            codificador = CodificadorCaracteristicas(preprocessor)
+            verificacion = verificar_equivalencia(preprocessor, codificador)
+        except Exception as e:
+            print("⚠️ Codificador NumPy no disponible, se usa el preprocesador:", e)
+            return None
+
+        if not verificacion["equivalente"]:
+            print("⚠️ Codificador NumPy no coincide con el preprocesador:", verificacion)
+            return None
+        return codificador
+
+    @staticmethod
+    def _compilar(tf, model):
+        """
+        Forward pass en modo grafo (tf.function) con firma fija. Evita el
+        data-adapter y el pipeline tf.data que model.predict arma en cada
+        llamada. Se traza una vez aquí para que la primera petición no lo pague.
+        """
+        import numpy as np
+
+        dim = model.input_shape[-1]
+
+        @tf.function(input_signature=[tf.TensorSpec(shape=[None, dim], dtype=tf.float32)])
+        def forward(x):
+            return model(x, training=False)
+
+        forward(np.zeros((1, dim), dtype=np.float32))
+        return forward
+
+    @property
+    def compilado(self):
+        return self._forward is not None
+
+    def predecir(self, X, compilado=True):
+        """Probabilidades del modelo para la matriz X ya preprocesada."""
+        import numpy as np
+
+        self.cargar()
+        if hasattr(X, "toarray"):
+            X = X.toarray()
+        X = np.asarray(X, dtype=np.float32)
+
+        if compilado and self.compilado:
+            return self._forward(X).numpy()
+        return self.model.predict(X, verbose=0)
+
+    def codificar(self, filas):
+        """Filas de entrada (dicts) -> matriz lista para el modelo."""
+        self.cargar()
+        if self.codificador is not None:
+            return self.codificador.transformar(filas)
+
+        import pandas as pd
+        return self.preprocessor.transform(pd.DataFrame(filas))
+
+    def puntuar_filas(self, filas, k=3):
+        """
+        Puntúa varias filas de entrada (dicts con las 25 columnas) en una sola
+        pasada por el codificador y el modelo. Devuelve un resultado por fila.
+        """
+        t0 = time.perf_counter()
+        return self.puntuar_matriz(self.codificar(filas), k=k, t0=t0)
+
+    def puntuar_matriz(self, X, k=3, t0=None):
+        """Como puntuar_filas, para filas ya codificadas con `codificar` de este runtime."""
+        import numpy as np
+
+        t0 = time.perf_counter() if t0 is None else t0
+        preds = self.predecir(X)
+        self._latencias.append(((time.perf_counter() - t0) * 1000, len(preds)))
+        self.llamadas += 1
+        self.filas_puntuadas += len(preds)
+
+        resultados = []
+        for p in preds:
+            top_idx = np.argsort(p)[-k:][::-1]
+            rutinas = self.label_encoder.inverse_transform(top_idx)
+            resultados.append({
+                "top3": [{"rutina": r, "probabilidad": round(float(p[i]) * 100, 2)} for i, r in zip(top_idx, rutinas)],
+                "rutina_principal": rutinas[0],
+                "precision_modelo": round(float(np.max(p) * 100), 2),
+            })
+        return resultados
+
+    def latencias(self):
+        """Percentiles de las últimas llamadas a puntuar_filas (codificación + modelo)."""
+        muestras = list(self._latencias)
+        if not muestras:
+            return {"llamadas": self.llamadas, "filas": self.filas_puntuadas}
+
+        ms = sorted(m for m, _ in muestras)
+        por_fila = sorted(m / n for m, n in muestras)
+
+        def p(valores, q):
+            return round(valores[min(int(len(valores) * q / 100), len(valores) - 1)], 3)
+
+        return {
+            "llamadas": self.llamadas,
+            "filas": self.filas_puntuadas,
+            "latencia_p50_ms": p(ms, 50),
+            "latencia_p95_ms": p(ms, 95),
+            "latencia_fila_p50_ms": p(por_fila, 50),
+        }
+
+    def estadisticas(self):
+        return {
+            "version": self.version,
+            "model_dir": self.model_dir,
+            "cargado": self.cargado,
+            "compilado": self.compilado,
+            "codificador_numpy": self.codificador is not None,
+            "pid": os.getpid(),
+            "rss_actual_mb": memoria_rss_mb(),
+            **self.metricas,
+            **self.latencias(),
+        }
+
+
+def _registro():
+    from .registro_modelos import registro
+    return registro
+
+
+def obtener_runtime():
+    """Devuelve el runtime de la versión activa, cargándolo si aún no lo está."""
+    return _registro().runtime_activo()
+
+
+def estadisticas_runtime():
+    """Métricas de carga de la versión activa sin forzar la carga del modelo."""
+    return _registro().activo().estadisticas()
+
+
+def clases_modelo():
+    """Clases del label encoder si el modelo activo ya está cargado (no fuerza la carga)."""
+    runtime = _registro().activo()
+    if not runtime.cargado:
+        return []
+    return list(runtime.label_encoder.classes_)
+
+
+def puntuar_en_proceso(filas):
+    """
+    Punto de entrada picklable para ProcessPoolExecutor: cada proceso hijo
+    carga su propio runtime la primera vez y lo reutiliza.
+    """
+    return obtener_runtime().puntuar_filas(filas)
+
+
+def precalentar(en_segundo_plano=True):
+    """Carga el modelo antes de la primera petición (hook de arranque)."""
+    def _cargar():
+        try:
+            obtener_runtime()
+        except Exception as e:
+            print("🔥 ERROR precargando modelo IA:", e)
+
+    if not en_segundo_plano:
+        _cargar()
+        return None
+
+    hilo = threading.Thread(target=_cargar, name="ia-precalentar", daemon=True)
+    hilo.start()
+    return hilo
@@ -0,0 +1,146 @@
+"""
+Índice en memoria de ejercicios candidatos para el recomendador.
+
+Reemplaza la búsqueda `icontains` + `order_by("?")` de recomendar_rutina:
+el catálogo se lee una vez y, para cada (rutina recomendada, nivel), se guarda
+la lista ordenada de IDs que coinciden. Se invalida con las señales de
+Ejercicio / TipoEjercicio / NivelDificultad y, como respaldo entre procesos,
+por tiempo (IA_INDICE_EJERCICIOS_TTL).
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from api_ejercicio.models import Ejercicio, TipoEjercicio, NivelDificultad
+
+
+NIVELES = ("Principiante", "Intermedio", "Avanzado")
+
+
+class _Estado:
+    """Catálogo inmutable; se reemplaza completo al reconstruir."""
+
+    def __init__(self, ejercicios, filas):
+        self.ejercicios = ejercicios    # id -> {"nombre", "descripcion"}
+        self.filas = filas              # (id, nombre, descripcion, tipo, nivel) en minúsculas
+        self.candidatos = {}            # (rutina, nivel) -> [ids]
+        self.construido_en = time.monotonic()
+
+
+class IndiceEjercicios:
+
+    def __init__(self, ttl_s=600):
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._estado = None
+        self._generacion = 0
+        self.reconstrucciones = 0
+
+    def invalidar(self):
+        self._generacion += 1
+        self._estado = None
+
+    def _vigente(self, estado):
+        return estado is not None and (time.monotonic() - estado.construido_en) < self.ttl_s
+
+    def _asegurar(self):
+        estado = self._estado
+        if self._vigente(estado):
+            return estado
+
+        with self._lock:
+            estado = self._estado
+            if self._vigente(estado):
+                return estado
+
+            generacion = self._generacion
+            ejercicios, filas = {}, []
+            for id_, nombre, descripcion, tipo, nivel in Ejercicio.objects.values_list(
+                "id", "nombre", "descripcion", "tipo_ejercicio__nombre", "nivel_dificultad__nombre"
+            ).order_by("id"):
+                ejercicios[id_] = {"nombre": nombre, "descripcion": descripcion or "Sin descripción disponible."}
+                filas.append((id_, (nombre or "").lower(), (descripcion or "").lower(), (tipo or "").lower(), (nivel or "").lower()))
+
+            estado = _Estado(ejercicios, filas)
+
+            # Las clases del modelo se precalculan si el modelo ya está en memoria
+            from .ia import clases_modelo
+            for clase in clases_modelo():
+                for nivel in NIVELES:
+                    self._candidatos(estado, clase, nivel)
+
+            # Si se invalidó mientras se leía el catálogo, se usa una vez y se relee
+            if generacion == self._generacion:
+                self._estado = estado
+            self.reconstrucciones += 1
+            return estado
+
+    @staticmethod
+    def _buscar(estado, rutina, nivel):
+        """
+        Mismo criterio que la consulta original (nombre, descripción o tipo
+        contienen la rutina, y el nivel contiene el nivel ajustado), ordenado
+        por calidad de coincidencia: nombre > tipo > descripción.
+        """
+        rutina, nivel = rutina.lower(), nivel.lower()
+        ranking = []
+        for id_, nombre, descripcion, tipo, nivel_ej in estado.filas:
+            if nivel not in nivel_ej:
+                continue
+            if rutina in nombre:
+                ranking.append((0, id_))
+            elif rutina in tipo:
+                ranking.append((1, id_))
+            elif rutina in descripcion:
+                ranking.append((2, id_))
+        return [id_ for _, id_ in sorted(ranking)]
+
+    def _candidatos(self, estado, rutina, nivel):
+        clave = (str(rutina), str(nivel))
+        ids = estado.candidatos.get(clave)
+        if ids is None:
+            ids = self._buscar(estado, *clave)
+            estado.candidatos[clave] = ids
+        return ids
+
+    def candidatos(self, rutina, nivel):
+        return list(self._candidatos(self._asegurar(), rutina, nivel))
+
+    @staticmethod
+    def _muestra(estado, n, excluir=()):
+        excluir = set(excluir)
+        disponibles = [id_ for id_ in estado.ejercicios if id_ not in excluir]
+        return random.sample(disponibles, min(n, len(disponibles)))
+
+    def muestra_aleatoria(self, n, excluir=()):
+        return self._muestra(self._asegurar(), n, excluir)
+
+    def seleccionar(self, rutina, nivel, n=8):
+        """Hasta `n` ejercicios para la rutina, completando al azar si faltan."""
+        estado = self._asegurar()
+        ids = self._candidatos(estado, rutina, nivel)[:n]
+        if len(ids) < n:
+            ids = ids + self._muestra(estado, n - len(ids), excluir=ids)
+        return [dict(estado.ejercicios[id_]) for id_ in ids]
+
+    def estadisticas(self):
+        estado = self._estado
+        return {
+            "ejercicios": len(estado.ejercicios) if estado else 0,
+            "combinaciones": len(estado.candidatos) if estado else 0,
+            "reconstrucciones": self.reconstrucciones,
+        }
+
+
+indice_ejercicios = IndiceEjercicios(getattr(settings, "IA_INDICE_EJERCICIOS_TTL", 600))
+
+
+@receiver([post_save, post_delete], sender=Ejercicio)
+@receiver([post_save, post_delete], sender=TipoEjercicio)
+@receiver([post_save, post_delete], sender=NivelDificultad)
+def invalidar_indice_ejercicios(sender, **kwargs):
+    indice_ejercicios.invalidar()
@@ -0,0 +1,115 @@
+"""
+Micro-lotes para el recomendador AthletIA.
+
+Las peticiones concurrentes a recomendar_rutina se juntan durante unos
+milisegundos y se puntúan como una sola matriz; cada llamador recibe su
+propio top-3. Cada petición llega ya codificada (la misma matriz de su clave
+de caché), así que no se codifica dos veces.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+
+from .registro_modelos import registro
+
+
+class PlanificadorLotes:
+    """Cola en proceso que agrupa filas y las puntúa con `funcion_lote`."""
+
+    def __init__(self, funcion_lote, ventana_ms=5, max_lote=32, timeout_s=30.0):
+        self.funcion_lote = funcion_lote
+        self.ventana_s = max(ventana_ms, 0) / 1000
+        self.max_lote = max(int(max_lote), 1)
+        self.timeout_s = timeout_s
+        self._cola = queue.Queue()
+        self._hilo = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _asegurar_hilo(self):
+        # Tras un fork (gunicorn --preload) el hilo del padre no existe en el hijo
+        if self._hilo is not None and self._hilo.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive() and self._pid == os.getpid():
+                return
+            self._cola = queue.Queue()
+            self._pid = os.getpid()
+            self._hilo = threading.Thread(target=self._bucle, name="ia-lotes", daemon=True)
+            self._hilo.start()
+
+    def enviar(self, fila):
+        """Encola una fila y devuelve un Future con su resultado."""
+        self._asegurar_hilo()
+        futuro = Future()
+        self._cola.put((fila, futuro))
+        return futuro
+
+    def puntuar(self, fila, timeout=None):
+        """Encola una fila y espera su resultado (a lo más `timeout` o timeout_s segundos)."""
+        if self.max_lote == 1:
+            return self.funcion_lote([fila])[0]
+        return self.enviar(fila).result(timeout=self.timeout_s if timeout is None else timeout)
+
+    def _recolectar(self):
+        lote = [self._cola.get()]
+        limite = time.monotonic() + self.ventana_s
+        while len(lote) < self.max_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _bucle(self):
+        while True:
+            lote = self._recolectar()
+            filas = [fila for fila, _ in lote]
+            try:
+                resultados = list(self.funcion_lote(filas))
+                if len(resultados) != len(lote):
+                    raise RuntimeError(f"El lote de {len(lote)} filas devolvió {len(resultados)} resultados.")
+                for (_, futuro), resultado in zip(lote, resultados):
+                    futuro.set_result(resultado)
+            except Exception as e:
+                # Ningún llamador queda esperando un resultado que no llegará
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+
+
+def _puntuar_lote(pedidos):
+    """
+    Cada pedido es (runtime, X, fila): la fila ya codificada por el runtime
+    con el que se armó la clave de caché. Se puntúa con ese mismo runtime
+    (tras un cambio de versión puede haber dos en un lote) y se envía a la
+    sombra si la hay (ver IA/registro_modelos.py).
+    """
+    import numpy as np
+
+    grupos = {}
+    for i, (runtime, X, fila) in enumerate(pedidos):
+        grupos.setdefault(id(runtime), (runtime, []))[1].append((i, X, fila))
+
+    resultados = [None] * len(pedidos)
+    for runtime, items in grupos.values():
+        X = np.vstack([np.asarray(X.toarray() if hasattr(X, "toarray") else X) for _, X, _ in items])
+        puntuados = registro.puntuar_codificadas(runtime, X, [fila for _, _, fila in items])
+        for (i, _, _), resultado in zip(items, puntuados):
+            resultados[i] = resultado
+    return resultados
+
+
+planificador = PlanificadorLotes(
+    _puntuar_lote,
+    ventana_ms=getattr(settings, "IA_LOTE_VENTANA_MS", 5),
+    max_lote=getattr(settings, "IA_LOTE_MAX", 32),
+    timeout_s=getattr(settings, "IA_LOTE_TIMEOUT_S", 30.0),
+)
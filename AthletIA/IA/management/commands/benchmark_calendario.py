@@ -0,0 +1,312 @@
+"""
+Mediciones del feed del calendario (IA/views_calendario.py).
+
+    python manage.py benchmark_calendario --modo consultas
+    python manage.py benchmark_calendario --modo consultas --eventos 1 30 365 --usuario ana
+    python manage.py benchmark_calendario --modo ventana --eventos 30 365 1095
+    python manage.py benchmark_calendario --modo programar --semanas 12
+    python manage.py benchmark_calendario --modo kpi --eventos 30 365 1095
+
+Los eventos se crean dentro de una transacción que se revierte al final: la
+BD queda como estaba.
+"""
+import json
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from App.models import Perfil
+from api_ejercicio.models import CalendarioRutina, Rutina, RutinaEjercicio
+from IA import adherencia_mensual, views_calendario
+from IA.contenido_rutinas import contenido_rutinas
+
+
+class Revertir(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Mide consultas y tiempo del feed del calendario."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modo", choices=["consultas", "ventana", "programar", "kpi"], default="consultas")
+        parser.add_argument("--eventos", type=int, nargs="+", default=[1, 10, 100, 365],
+                            help="Cantidades de eventos a programar (uno por día).")
+        parser.add_argument("--semanas", type=int, default=12, help="Semanas de lunes/miércoles/viernes (modo programar).")
+        parser.add_argument("--usuario", help="Username del perfil de prueba (por defecto el primero).")
+
+    def handle(self, *args, **options):
+        getattr(self, f"medir_{options['modo']}")(options)
+
+    def reportar(self, titulo, datos):
+        self.stdout.write(self.style.SUCCESS(f"== {titulo} =="))
+        self.stdout.write(json.dumps(datos, indent=2, ensure_ascii=False))
+
+    def _perfil(self, options):
+        perfiles = Perfil.objects.order_by("id")
+        perfil = perfiles.filter(username=options["usuario"]).first() if options["usuario"] else perfiles.first()
+        if perfil is None:
+            raise CommandError("No hay un perfil para la prueba (--usuario).")
+        return perfil
+
+    def _rutinas(self):
+        rutinas = list(
+            Rutina.objects
+            .filter(vigente=True, id__in=RutinaEjercicio.objects.values("rutina_id"))
+            .values_list("id", flat=True)[:7]
+        )
+        if not rutinas:
+            raise CommandError("Se necesita al menos una rutina vigente con ejercicios.")
+        return rutinas
+
+    @staticmethod
+    def peticion(vista, perfil, ruta, params=None, cuerpo=None):
+        if cuerpo is None:
+            request = RequestFactory().get(ruta, params or {})
+        else:
+            request = RequestFactory().post(ruta, data=json.dumps(cuerpo), content_type="application/json")
+        request.user = perfil
+        with CaptureQueriesContext(connection) as consultas:
+            t0 = time.perf_counter()
+            respuesta = vista(request)
+            duracion = time.perf_counter() - t0
+        return respuesta, len(consultas), duracion
+
+    # ======================================================
+    # Consultas del feed según la cantidad de eventos
+    # ======================================================
+    def medir_consultas(self, options):
+        perfil = self._perfil(options)
+        rutinas = self._rutinas()
+
+        resultados = []
+        try:
+            with transaction.atomic():
+                CalendarioRutina.objects.filter(perfil=perfil).delete()
+                inicio = timezone.localdate()
+                creados = 0
+                for cantidad in sorted(options["eventos"]):
+                    # Una rutina por día, rotando entre las de prueba
+                    CalendarioRutina.objects.bulk_create([
+                        CalendarioRutina(perfil=perfil, rutina_id=rutinas[i % len(rutinas)],
+                                         fecha=inicio + timedelta(days=i))
+                        for i in range(creados, cantidad)
+                    ])
+                    creados = max(creados, cantidad)
+
+                    # En frío (sin el contenido de las rutinas en caché) y luego en caliente
+                    contenido_rutinas.limpiar()
+                    respuesta, consultas, duracion = self.peticion(
+                        views_calendario.obtener_calendario, perfil, "/ia/calendario/eventos/"
+                    )
+                    _, consultas_cache, duracion_cache = self.peticion(
+                        views_calendario.obtener_calendario, perfil, "/ia/calendario/eventos/"
+                    )
+                    eventos = json.loads(respuesta.content)
+                    resultados.append({
+                        "eventos": len(eventos),
+                        "consultas": consultas,
+                        "ms": round(duracion * 1000, 1),
+                        "consultas_con_cache": consultas_cache,
+                        "ms_con_cache": round(duracion_cache * 1000, 1),
+                        "kb": round(len(respuesta.content) / 1024, 1),
+                    })
+                raise Revertir
+        except Revertir:
+            pass
+
+        distintas = {r["consultas"] for r in resultados}
+        self.reportar("Feed del calendario (obtener_calendario)", {
+            "perfil": perfil.username,
+            "rutinas_de_prueba": len(rutinas),
+            "resultados": resultados,
+            "consultas_constantes": len(distintas) == 1,
+        })
+        if len(distintas) != 1:
+            raise CommandError(f"La cantidad de consultas depende de los eventos: {sorted(distintas)}")
+
+    # ======================================================
+    # Feed completo vs ventana de un mes vs cambios (?since)
+    # ======================================================
+    def medir_ventana(self, options):
+        perfil = self._perfil(options)
+        rutinas = self._rutinas()
+        hoy = timezone.localdate()
+        # Lo que pide FullCalendar en vista de mes: seis semanas alrededor de hoy
+        ventana = {"start": (hoy - timedelta(days=14)).isoformat(), "end": (hoy + timedelta(days=28)).isoformat()}
+        ruta = "/ia/calendario/eventos/"
+        vista = views_calendario.obtener_calendario
+
+        def medir(params=None):
+            respuesta, consultas, duracion = self.peticion(vista, perfil, ruta, params)
+            return respuesta, {
+                "consultas": consultas,
+                "ms": round(duracion * 1000, 1),
+                "kb": round(len(respuesta.content) / 1024, 1),
+            }
+
+        resultados = []
+        try:
+            with transaction.atomic():
+                CalendarioRutina.objects.filter(perfil=perfil).delete()
+                creados = 0
+                for cantidad in sorted(options["eventos"]):
+                    # La cuenta "envejece": los eventos nuevos van hacia atrás desde hoy
+                    CalendarioRutina.objects.bulk_create([
+                        CalendarioRutina(perfil=perfil, rutina_id=rutinas[i % len(rutinas)],
+                                         fecha=hoy - timedelta(days=i))
+                        for i in range(creados, cantidad)
+                    ])
+                    creados = max(creados, cantidad)
+                    # Como si fueran de antes del token (que lleva unos segundos de margen)
+                    CalendarioRutina.objects.filter(perfil=perfil).update(
+                        actualizado=timezone.now() - timedelta(hours=1)
+                    )
+
+                    _, completo = medir()
+                    respuesta, mes = medir(ventana)
+                    _, cambios = medir({**ventana, "since": respuesta["X-Sync-Token"]})
+                    resultados.append({"eventos": cantidad, "completo": completo, "mes": mes, "since": cambios})
+                raise Revertir
+        except Revertir:
+            pass
+
+        self.reportar("Feed del calendario: completo vs ventana vs since", {
+            "perfil": perfil.username,
+            "ventana": ventana,
+            "resultados": resultados,
+        })
+
+    # ======================================================
+    # Programar un plan: una petición por día vs una sola
+    # ======================================================
+    def medir_programar(self, options):
+        perfil = self._perfil(options)
+        rutina_id = self._rutinas()[0]
+        lunes = timezone.localdate() + timedelta(days=7 - timezone.localdate().weekday())
+        regla = {"dias": ["lunes", "miercoles", "viernes"], "desde": lunes.isoformat(), "semanas": options["semanas"]}
+
+        def limpiar():
+            CalendarioRutina.objects.filter(perfil=perfil, fecha__gte=lunes).delete()
+
+        resultados = {}
+        try:
+            with transaction.atomic():
+                limpiar()
+                fechas = views_calendario._fechas_recurrencia(regla)
+
+                # Como hoy: asignar_rutina_guardada día por día
+                consultas, duracion = 0, 0.0
+                for fecha in fechas:
+                    _, c, d = self.peticion(
+                        views_calendario.asignar_rutina_guardada, perfil, "/ia/asignar_rutina_guardada/",
+                        cuerpo={"rutina_id": rutina_id, "fecha": fecha.isoformat()},
+                    )
+                    consultas, duracion = consultas + c, duracion + d
+                resultados["dia_por_dia"] = {
+                    "peticiones": len(fechas), "consultas": consultas, "ms": round(duracion * 1000, 1),
+                }
+
+                limpiar()
+                respuesta, consultas, duracion = self.peticion(
+                    views_calendario.programar_rutina_calendario, perfil, "/ia/calendario/programar/",
+                    cuerpo={"rutina_id": rutina_id, "recurrencia": regla},
+                )
+                resultados["programar"] = {
+                    "peticiones": 1, "consultas": consultas, "ms": round(duracion * 1000, 1),
+                    "creadas": len(json.loads(respuesta.content).get("creadas", [])),
+                }
+                raise Revertir
+        except Revertir:
+            pass
+
+        self.reportar("Programar un plan en el calendario", {
+            "perfil": perfil.username,
+            "regla": regla,
+            "fechas": len(fechas),
+            **resultados,
+        })
+
+    # ======================================================
+    # KPI mensual desde el resumen, y su costo al marcar/mover
+    # ======================================================
+    def medir_kpi(self, options):
+        perfil = self._perfil(options)
+        rutinas = self._rutinas()
+        hoy = timezone.localdate()
+        mes = hoy.strftime("%Y-%m")
+
+        def esperado():
+            # Lo que calculaba la vista antes: contando las filas del mes
+            eventos = CalendarioRutina.objects.filter(perfil=perfil, fecha__year=hoy.year, fecha__month=hoy.month)
+            dias = {}
+            for fecha in eventos.filter(completada=True).values_list("fecha", flat=True):
+                dias[fecha.day] = dias.get(fecha.day, 0) + 1
+            return eventos.count(), eventos.filter(completada=True).count(), dias
+
+        def kpi():
+            respuesta, consultas, duracion = self.peticion(
+                views_calendario.obtener_kpi_mensual, perfil, "/ia/calendario/kpi-mensual/", {"mes": mes}
+            )
+            datos = json.loads(respuesta.content)
+            obtenido = (datos["total"], datos["completadas"], {int(d): n for d, n in datos["dias_completados"].items()})
+            return obtenido, consultas, duracion
+
+        resultados, errores = [], []
+        try:
+            with transaction.atomic():
+                CalendarioRutina.objects.filter(perfil=perfil).delete()
+                creados = 0
+                for cantidad in sorted(options["eventos"]):
+                    # Hacia atrás desde hoy (varios meses), completando uno de cada tres
+                    nuevos = CalendarioRutina.objects.bulk_create([
+                        CalendarioRutina(perfil=perfil, rutina_id=rutinas[i % len(rutinas)],
+                                         fecha=hoy - timedelta(days=i), completada=i % 3 == 0)
+                        for i in range(creados, cantidad)
+                    ])
+                    for completada in (False, True):
+                        adherencia_mensual.registrar_nuevas(
+                            perfil.id, [e.fecha for e in nuevos if e.completada == completada], completada
+                        )
+                    creados = max(creados, cantidad)
+
+                    obtenido, consultas, duracion = kpi()
+                    if obtenido != esperado():
+                        errores.append({"eventos": cantidad, "kpi": obtenido, "esperado": esperado()})
+                    resultados.append({"eventos": cantidad, "consultas": consultas, "ms": round(duracion * 1000, 1)})
+
+                # Marcar y mover un evento de hoy, y comprobar que el resumen siguió
+                evento = CalendarioRutina.objects.filter(perfil=perfil, fecha=hoy).first()
+                _, c_marcar, d_marcar = self.peticion(
+                    views_calendario.actualizar_rutina_calendario, perfil, "/ia/calendario/actualizar/",
+                    cuerpo={"id": evento.id, "completada": not evento.completada, "notas": ""},
+                )
+                _, c_mover, d_mover = self.peticion(
+                    views_calendario.mover_rutina_calendario, perfil, "/ia/api/calendario/mover/",
+                    cuerpo={"id": evento.id, "nueva_fecha": (hoy.replace(day=1) - timedelta(days=1)).isoformat()},
+                )
+                obtenido, _, _ = kpi()
+                if obtenido != esperado():
+                    errores.append({"tras": "marcar y mover", "kpi": obtenido, "esperado": esperado()})
+                operaciones = {
+                    "marcar": {"consultas": c_marcar, "ms": round(d_marcar * 1000, 1)},
+                    "mover_a_otro_mes": {"consultas": c_mover, "ms": round(d_mover * 1000, 1)},
+                }
+                raise Revertir
+        except Revertir:
+            pass
+
+        self.reportar("KPI mensual desde AdherenciaMensual", {
+            "perfil": perfil.username,
+            "mes": mes,
+            "kpi": resultados,
+            **operaciones,
+            "coincide_con_conteo": not errores,
+        })
+        if errores:
+            raise CommandError(f"El resumen no coincide con el calendario: {errores}")
@@ -0,0 +1,482 @@
+"""
+Mediciones del chat del coach contra un Ollama falso local (IA/ollama_falso.py),
+sin GPU ni modelo descargado.
+
+    python manage.py benchmark_chat --modo ttft --repeticiones 10
+    python manage.py benchmark_chat --modo ttft --latencia-inicial 1.0 --latencia-token 0.05
+    python manage.py benchmark_chat --modo carga --chats 8 --peticiones-sitio 20
+    python manage.py benchmark_chat --modo escritura --turnos 50
+    python manage.py benchmark_chat --modo contexto --latencia-prompt-token 0.002
+    python manage.py benchmark_chat --modo cache --repeticiones 20
+    python manage.py benchmark_chat --modo admision --chats 16 --paralelo-ollama 1 --timeout 10
+    python manage.py benchmark_chat --modo rag --repeticiones 200 --sinteticos 5000
+    python manage.py benchmark_chat --modo frio --latencia-carga 3.0 --repeticiones 3
+"""
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import ollama
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.cache import SessionStore
+from django.contrib.sessions.backends.db import SessionStore as SessionStoreBD
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, override_settings
+from django.urls import include, path
+
+from IA import chat_async, chat_virtual, contexto_chat
+from IA.admision_chat import ControlAdmision, control_admision
+from IA.backend_chat import BackendChat, backend_chat
+from IA.busqueda_catalogo import IndiceBM25, _documento_ejercicio
+from IA.cache_chat import cache_respuestas_chat
+from IA.management.commands.benchmark_ia import percentil
+from IA.ollama_falso import ServidorOllamaFalso
+
+
+PREGUNTA_EJEMPLO = "¿Cuántas series hago para pecho?"
+
+
+def vista_sitio(request):
+    """Vista síncrona mínima que representa el resto del sitio (muro, calendario...)."""
+    return HttpResponse("ok")
+
+
+def ms(valores, p):
+    return round(percentil(valores, p) * 1000, 1) if valores else None
+
+
+class Command(BaseCommand):
+    help = "Mide el chat del coach (tiempo al primer token, etc.) contra un Ollama falso."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modo", choices=["ttft", "carga", "escritura", "contexto", "cache", "admision", "rag", "frio"], default="ttft")
+        parser.add_argument("--repeticiones", type=int, default=10)
+        parser.add_argument("--latencia-inicial", type=float, default=0.5, help="Segundos hasta el primer token.")
+        parser.add_argument("--latencia-token", type=float, default=0.03, help="Segundos entre tokens.")
+        parser.add_argument("--latencia-prompt-token", type=float, default=0.001,
+                            help="Segundos extra por token del prompt (procesar el contexto).")
+        parser.add_argument("--chats", type=int, default=8, help="Chats concurrentes (modo carga).")
+        parser.add_argument("--peticiones-sitio", type=int, default=20, help="Peticiones al sitio durante la carga.")
+        parser.add_argument("--url-sitio", default=None, help="URL real del sitio a medir (por defecto una vista mínima).")
+        parser.add_argument("--turnos", type=int, default=50, help="Turnos de conversación (modo escritura).")
+        parser.add_argument("--paralelo-ollama", type=int, default=0,
+                            help="Generaciones a la vez del Ollama falso (0 = sin límite).")
+        parser.add_argument("--timeout", type=float, default=10.0, help="Timeout del cliente Ollama (modo admision).")
+        parser.add_argument("--max-cola", type=int, default=4, help="Cola del control de admisión (modo admision).")
+        parser.add_argument("--espera-max", type=float, default=5.0, help="Espera máxima en cola (modo admision).")
+        parser.add_argument("--latencia-carga", type=float, default=0.0,
+                            help="Segundos que tarda el Ollama falso en cargar el modelo (modo frio).")
+        parser.add_argument("--sinteticos", type=int, default=0,
+                            help="Ejercicios inventados que se suman al catálogo real (modo rag).")
+
+    def handle(self, *args, **options):
+        with ServidorOllamaFalso(
+            options["latencia_inicial"], options["latencia_token"],
+            latencia_prompt_token_s=options["latencia_prompt_token"],
+            paralelo=options["paralelo_ollama"] or None,
+            latencia_carga_s=options["latencia_carga"],
+        ) as falso:
+            anterior, anterior_pool = chat_virtual.cliente, chat_async.pool_ollama
+            chat_virtual.cliente = ollama.Client(host=falso.url)
+            chat_async.pool_ollama = chat_async.PoolOllama(host=falso.url, max_conexiones=anterior_pool.max_conexiones)
+            # Todas las peticiones del benchmark son del mismo "usuario"
+            limite_anterior, control_admision.limite_por_minuto = control_admision.limite_por_minuto, 0
+            try:
+                getattr(self, f"medir_{options['modo']}")(options, falso)
+            finally:
+                chat_virtual.cliente, chat_async.pool_ollama = anterior, anterior_pool
+                control_admision.limite_por_minuto = limite_anterior
+
+    def reportar(self, titulo, datos):
+        self.stdout.write(self.style.SUCCESS(f"== {titulo} =="))
+        self.stdout.write(json.dumps(datos, indent=2, ensure_ascii=False))
+
+    @staticmethod
+    def peticion(mensaje=PREGUNTA_EJEMPLO, session=None, ruta="/ia/chat_api/"):
+        request = RequestFactory().post(
+            ruta, data=json.dumps({"mensaje": mensaje}), content_type="application/json"
+        )
+        # Sesión en caché (locmem); el historial sí se guarda en la BD
+        request.session = session if session is not None else SessionStore()
+        request.user = AnonymousUser()
+        return request
+
+    # ======================================================
+    # Tiempo al primer token: chat_api vs chat_api_stream
+    # ======================================================
+    def medir_ttft(self, options, falso):
+        bloqueante, primer_token, total_stream = [], [], []
+
+        for _ in range(options["repeticiones"]):
+            t0 = time.perf_counter()
+            chat_virtual.chat_api(self.peticion())
+            bloqueante.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            eventos = iter(chat_virtual.chat_api_stream(self.peticion()).streaming_content)
+            next(eventos)
+            primer_token.append(time.perf_counter() - t0)
+            for _ in eventos:
+                pass
+            total_stream.append(time.perf_counter() - t0)
+
+        self.reportar("Tiempo al primer token", {
+            "latencia_inicial_s": options["latencia_inicial"],
+            "latencia_token_s": options["latencia_token"],
+            "tokens_respuesta": len(falso.tokens),
+            "bloqueante_p50_ms": ms(bloqueante, 50),
+            "bloqueante_p95_ms": ms(bloqueante, 95),
+            "stream_primer_token_p50_ms": ms(primer_token, 50),
+            "stream_primer_token_p95_ms": ms(primer_token, 95),
+            "stream_total_p50_ms": ms(total_stream, 50),
+        })
+
+    # ======================================================
+    # Carga: latencia del sitio mientras hay chats en curso (ASGI)
+    # ======================================================
+    def medir_carga(self, options, falso):
+        urls = SimpleNamespace(urlpatterns=[
+            path("chat/sync/", chat_virtual.chat_api),
+            path("chat/async/", chat_async.chat_api_async),
+            path("sitio/", vista_sitio),
+            path("", include("AthletIA.urls")),  # para --url-sitio
+        ])
+        # Sesiones en caché: se mide el chat, no el backend de sesiones
+        with override_settings(ROOT_URLCONF=urls, SESSION_ENGINE="django.contrib.sessions.backends.cache"):
+            datos = asyncio.run(self._carga(options))
+
+        datos.update({
+            "chats_concurrentes": options["chats"],
+            "max_concurrencia_ollama": control_admision.max_concurrencia,
+            "latencia_inicial_s": options["latencia_inicial"],
+            "latencia_token_s": options["latencia_token"],
+        })
+        self.reportar("Latencia del sitio con chats en curso (ASGI)", datos)
+
+    async def _carga(self, options):
+        url_sitio = options["url_sitio"] or "/sitio/"
+        cuerpo = json.dumps({"mensaje": PREGUNTA_EJEMPLO})
+
+        async def medir_sitio(cliente):
+            latencias = []
+            for _ in range(options["peticiones_sitio"]):
+                t0 = time.perf_counter()
+                await cliente.get(url_sitio)
+                latencias.append(time.perf_counter() - t0)
+            return latencias
+
+        async def escenario(ruta_chat):
+            cliente = AsyncClient()
+            chats = [
+                asyncio.create_task(cliente.post(ruta_chat, data=cuerpo, content_type="application/json"))
+                for _ in range(options["chats"])
+            ]
+            await asyncio.sleep(0.05)  # que los chats ya estén esperando a Ollama
+            t0 = time.perf_counter()
+            sitio = await medir_sitio(cliente)
+            await asyncio.gather(*chats)
+            return sitio, time.perf_counter() - t0
+
+        sin_carga = await medir_sitio(AsyncClient())
+        con_sync, total_sync = await escenario("/chat/sync/")
+        con_async, total_async = await escenario("/chat/async/")
+
+        return {
+            "sitio_sin_carga_p50_ms": ms(sin_carga, 50),
+            "sitio_sin_carga_p95_ms": ms(sin_carga, 95),
+            "sitio_chat_sync_p50_ms": ms(con_sync, 50),
+            "sitio_chat_sync_p95_ms": ms(con_sync, 95),
+            "chats_sync_total_s": round(total_sync, 2),
+            "sitio_chat_async_p50_ms": ms(con_async, 50),
+            "sitio_chat_async_p95_ms": ms(con_async, 95),
+            "chats_async_total_s": round(total_async, 2),
+        }
+
+    # ======================================================
+    # Bytes escritos por turno: historial en sesión vs en tablas
+    # ======================================================
+    def medir_escritura(self, options, falso):
+        """
+        Antes: la sesión (backend db) guardaba la lista completa y se reescribía
+        entera en cada turno. Ahora: la sesión guarda solo el id (se escribe en
+        el primer turno) y cada turno inserta sus dos filas en MENSAJE_CHAT.
+        """
+        sesion = SessionStoreBD()
+        # Claves que ya tiene la sesión de un usuario logueado
+        base = {"_auth_user_id": "123", "_auth_user_backend": "django.contrib.auth.backends.ModelBackend",
+                "_auth_user_hash": "0" * 64}
+        # id + FK + fecha + rol aproximados (8 + 4 + 8 + largo del rol)
+        fijo_fila = 20
+
+        historial, filas = [], []
+        for turno in range(1, options["turnos"] + 1):
+            nuevos = [
+                {"role": "user", "content": f"{PREGUNTA_EJEMPLO} ({turno})"},
+                {"role": "assistant", "content": falso.respuesta},
+            ]
+
+            # Mismo recorte que tenía chat_api: 30 anteriores + los nuevos
+            historial = (historial[-chat_virtual.MAX_HISTORIAL:] + nuevos)
+            antes = len(sesion.encode({**base, "chat_historial": historial}))
+
+            despues = sum(fijo_fila + len(m["role"]) + len(m["content"].encode()) for m in nuevos)
+            if turno == 1:
+                despues += len(sesion.encode({**base, "chat_conversacion_id": 1}))
+
+            filas.append({"turno": turno, "antes_bytes": antes, "despues_bytes": despues})
+
+        muestra = [f for f in filas if f["turno"] in (1, 5, 10, 20, 30, 50, 100) or f["turno"] == options["turnos"]]
+        self.reportar("Bytes escritos por turno de chat", {
+            "turnos": options["turnos"],
+            "antes_total_bytes": sum(f["antes_bytes"] for f in filas),
+            "despues_total_bytes": sum(f["despues_bytes"] for f in filas),
+            "por_turno": muestra,
+        })
+
+    # ======================================================
+    # Contexto: últimos 30 mensajes completos vs presupuesto + resumen
+    # ======================================================
+    def medir_contexto(self, options, falso):
+        """
+        Simula conversaciones de distinto largo en memoria (sin BD) y mide el
+        último turno: tokens del prompt y tiempo al primer token con el
+        contexto antiguo (sistema + 30 mensajes) y con el de contexto_chat.
+        Los resúmenes se generan contra el Ollama falso, como en producción.
+        """
+        gestor = contexto_chat.gestor_contexto
+        cliente = chat_virtual.cliente
+        # Preguntas de largo realista: el historial pesa más que la pregunta suelta
+        pregunta = PREGUNTA_EJEMPLO + " Entreno 4 días a la semana y quiero ganar fuerza sin lesionarme el hombro."
+
+        def primer_token(mensajes):
+            t0 = time.perf_counter()
+            eventos = iter(cliente.chat(model=chat_virtual.MODELO_IA, messages=mensajes, stream=True))
+            next(eventos)
+            transcurrido = time.perf_counter() - t0
+            for _ in eventos:
+                pass
+            return transcurrido
+
+        filas = []
+        for turnos in (5, 10, 20, 50, 100):
+            mensajes, resumen, resumido_hasta, resumenes = [], None, 0, 0
+            for turno in range(1, turnos):
+                mensajes += [
+                    {"role": "user", "content": f"{pregunta} ({turno})"},
+                    {"role": "assistant", "content": falso.respuesta},
+                ]
+                # Igual que GestorContexto: ventana tras el resumen, resumir lo que no cupo
+                pendientes = mensajes[resumido_hasta:][-gestor.ventana:]
+                _, _, fuera = contexto_chat.armar_contexto(
+                    chat_virtual.PROMPT_SISTEMA, resumen, pendientes, {"role": "user", "content": pregunta},
+                    gestor.presupuesto_tokens,
+                )
+                if fuera >= gestor.min_para_resumir:
+                    inicio = len(mensajes) - len(pendientes)
+                    resumen = contexto_chat.resumir(
+                        cliente, chat_virtual.MODELO_IA, resumen, mensajes[resumido_hasta:inicio + fuera]
+                    )
+                    resumido_hasta = inicio + fuera
+                    resumenes += 1
+
+            nuevo = {"role": "user", "content": f"{pregunta} ({turnos})"}
+            antiguo = [{"role": "system", "content": chat_virtual.PROMPT_SISTEMA}] + mensajes[-chat_virtual.MAX_HISTORIAL:] + [nuevo]
+            actual, tokens_actual, _ = contexto_chat.armar_contexto(
+                chat_virtual.PROMPT_SISTEMA, resumen, mensajes[resumido_hasta:][-gestor.ventana:], nuevo,
+                gestor.presupuesto_tokens,
+            )
+
+            filas.append({
+                "turnos": turnos,
+                "antes_tokens_prompt": sum(contexto_chat.tokens_mensaje(m) for m in antiguo),
+                "despues_tokens_prompt": tokens_actual,
+                "antes_primer_token_ms": round(primer_token(antiguo) * 1000, 1),
+                "despues_primer_token_ms": round(primer_token(actual) * 1000, 1),
+                "resumenes_generados": resumenes,
+            })
+
+        self.reportar("Prompt del último turno según largo de la conversación", {
+            "presupuesto_tokens": gestor.presupuesto_tokens,
+            "min_para_resumir": gestor.min_para_resumir,
+            "latencia_prompt_token_s": options["latencia_prompt_token"],
+            "por_largo": filas,
+        })
+
+    # ======================================================
+    # Caché de respuestas: variantes de una misma pregunta de primer turno
+    # ======================================================
+    def medir_cache(self, options, falso):
+        variantes = [
+            PREGUNTA_EJEMPLO,
+            "cuantas series hago para pecho",
+            "¿Cuántas series hago para el pecho?",
+            "CUÁNTAS SERIES HAGO PARA PECHO",
+        ]
+        cache_respuestas_chat.limpiar()
+        cache_respuestas_chat.aciertos = cache_respuestas_chat.fallos = 0
+
+        con_cache, sin_cache = [], []
+        peticiones_antes = falso.peticiones
+        for i in range(options["repeticiones"]):
+            # Sesión nueva en cada petición: siempre es primer turno
+            t0 = time.perf_counter()
+            chat_virtual.chat_api(self.peticion(variantes[i % len(variantes)]))
+            con_cache.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            chat_virtual.chat_api(self.peticion(variantes[i % len(variantes)], ruta="/ia/chat_api/?sin_cache=1"))
+            sin_cache.append(time.perf_counter() - t0)
+
+        self.reportar("Caché de respuestas del chat", {
+            "peticiones": options["repeticiones"] * 2,
+            "llamadas_a_ollama": falso.peticiones - peticiones_antes,
+            "con_cache_p50_ms": ms(con_cache, 50),
+            "con_cache_p95_ms": ms(con_cache, 95),
+            "sin_cache_p50_ms": ms(sin_cache, 50),
+            "sin_cache_p95_ms": ms(sin_cache, 95),
+            "cache": cache_respuestas_chat.estadisticas(),
+        })
+
+    # ======================================================
+    # Admisión: ráfaga de chats contra un Ollama que atiende de a uno
+    # ======================================================
+    def medir_admision(self, options, falso):
+        """
+        Sin control, todos los chats llegan a Ollama a la vez, se encolan
+        dentro de él y vencen juntos por timeout. Con control, se atienden
+        hasta max_concurrencia, esperan hasta max_cola y el resto recibe
+        "ocupado" al instante.
+        """
+        chats = options["chats"]
+        paralelo = options["paralelo_ollama"] or chats
+
+        def rafaga(control):
+            anterior_control, anterior_cliente = chat_virtual.control_admision, chat_virtual.cliente
+            chat_virtual.control_admision = control
+            chat_virtual.cliente = ollama.Client(host=falso.url, timeout=options["timeout"])
+
+            def un_chat(_):
+                try:
+                    t0 = time.perf_counter()
+                    respuesta = chat_virtual.chat_api(self.peticion(ruta="/ia/chat_api/?sin_cache=1"))
+                    datos = json.loads(respuesta.content)
+                    if datos.get("ocupado"):
+                        estado = "ocupado"
+                    elif datos["respuesta"].startswith("⚠️"):
+                        estado = "error"
+                    else:
+                        estado = "ok"
+                    return estado, time.perf_counter() - t0
+                finally:
+                    connection.close()
+
+            try:
+                with ThreadPoolExecutor(max_workers=chats) as ejecutor:
+                    resultados = list(ejecutor.map(un_chat, range(chats)))
+            finally:
+                chat_virtual.control_admision, chat_virtual.cliente = anterior_control, anterior_cliente
+
+            por_estado = {e: [t for estado, t in resultados if estado == e] for e in ("ok", "ocupado", "error")}
+            return {
+                "atendidos": len(por_estado["ok"]),
+                "ocupados": len(por_estado["ocupado"]),
+                "errores_timeout": len(por_estado["error"]),
+                "atendidos_p50_ms": ms(por_estado["ok"], 50),
+                "atendidos_p95_ms": ms(por_estado["ok"], 95),
+                "ocupado_p95_ms": ms(por_estado["ocupado"], 95),
+                "error_p95_ms": ms(por_estado["error"], 95),
+                "admision": control.estadisticas(),
+            }
+
+        sin_control = rafaga(ControlAdmision(max_concurrencia=chats, max_cola=chats, espera_max_s=options["timeout"],
+                                             limite_por_minuto=0))
+        con_control = rafaga(ControlAdmision(max_concurrencia=paralelo, max_cola=options["max_cola"],
+                                             espera_max_s=options["espera_max"], limite_por_minuto=0))
+
+        self.reportar("Ráfaga de chats contra un Ollama acotado", {
+            "chats": chats,
+            "paralelo_ollama": options["paralelo_ollama"] or "sin límite",
+            "timeout_cliente_s": options["timeout"],
+            "sin_control": sin_control,
+            "con_control": con_control,
+        })
+
+    # ======================================================
+    # Búsqueda en el catálogo: armado del índice y latencia por pregunta
+    # ======================================================
+    def medir_rag(self, options, falso):
+        preguntas = [
+            PREGUNTA_EJEMPLO,
+            "¿Qué ejercicios hago para la espalda con mancuernas?",
+            "Tengo dolor de rodilla, ¿qué puedo entrenar de pierna?",
+            "¿Cuánto debo descansar entre series?",
+            "Rutina de abdomen para principiantes",
+        ]
+
+        indice = IndiceBM25()
+        t0 = time.perf_counter()
+        indice.buscar("pecho")  # arma el índice con el catálogo real
+        armado = time.perf_counter() - t0
+        reales = len(indice._documentos)
+
+        palabras = ("press", "remo", "curl", "sentadilla", "plancha", "barra", "mancuerna", "polea", "banco", "fuerza")
+        musculos = ("pecho", "espalda", "pierna", "hombro", "brazo", "abdomen")
+        for i in range(options["sinteticos"]):
+            nombre = f"{palabras[i % len(palabras)]} {musculos[i % len(musculos)]} {i}"
+            descripcion = " ".join(palabras[(i + j) % len(palabras)] for j in range(25))
+            indice._poner(("sintetico", i), _documento_ejercicio(nombre, descripcion, musculos[i % len(musculos)],
+                                                                  "Fuerza", "Intermedio"))
+
+        latencias = []
+        for i in range(options["repeticiones"]):
+            t0 = time.perf_counter()
+            indice.buscar(preguntas[i % len(preguntas)])
+            latencias.append(time.perf_counter() - t0)
+
+        self.reportar("Búsqueda BM25 en el catálogo", {
+            "documentos_reales": reales,
+            "documentos_sinteticos": options["sinteticos"],
+            "terminos": len(indice._postings),
+            "armado_ms": round(armado * 1000, 1),
+            "busqueda_p50_ms": round(percentil(latencias, 50) * 1000, 3),
+            "busqueda_p95_ms": round(percentil(latencias, 95) * 1000, 3),
+            "ejemplo": {"pregunta": preguntas[0], "fragmentos": indice.buscar(preguntas[0])},
+        })
+
+    # ======================================================
+    # Primer token con el modelo descargado vs precalentado
+    # ======================================================
+    def medir_frio(self, options, falso):
+        calentador = BackendChat(host=falso.url, modelo=backend_chat.modelo, keep_alive=backend_chat.keep_alive)
+
+        def primer_token():
+            request = self.peticion(ruta="/ia/chat_api/stream/?sin_cache=1")
+            t0 = time.perf_counter()
+            eventos = iter(chat_virtual.chat_api_stream(request).streaming_content)
+            next(eventos)
+            transcurrido = time.perf_counter() - t0
+            for _ in eventos:
+                pass
+            return transcurrido
+
+        frio, caliente = [], []
+        for _ in range(options["repeticiones"]):
+            falso.descargar()   # venció keep_alive: el usuario paga la carga
+            frio.append(primer_token())
+
+            falso.descargar()
+            calentador.calentar()   # lo que hace el hilo de IA_CHAT_CALENTAR
+            caliente.append(primer_token())
+
+        self.reportar("Primer token tras inactividad", {
+            "latencia_carga_s": options["latencia_carga"],
+            "modelo": backend_chat.modelo,
+            "keep_alive": backend_chat.keep_alive,
+            "frio_primer_token_p50_ms": ms(frio, 50),
+            "precalentado_primer_token_p50_ms": ms(caliente, 50),
+            "calentamiento": calentador.estado(consultar_ollama=True),
+        })
@@ -0,0 +1,196 @@
+"""
+Mediciones de rendimiento del recomendador AthletIA.
+
+    python manage.py benchmark_ia --modo carga
+    python manage.py benchmark_ia --modo lotes --repeticiones 20
+    python manage.py benchmark_ia --modo inferencia --repeticiones 200
+    python manage.py benchmark_ia --modo caracteristicas --muestras 1000
+"""
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from IA import ia
+from IA.caracteristicas import CodificadorCaracteristicas, verificar_equivalencia
+from IA.lotes import PlanificadorLotes
+
+
+TAMANOS_LOTE = [1, 2, 4, 8, 16, 32, 64]
+
+# Fila de entrada típica del wizard (mismas columnas que recomendar_rutina)
+FILA_EJEMPLO = {
+    "edad": 28.0,
+    "imc": 24.2,
+    "ritmo_cardiaco": 75.0,
+    "duracion_min": 45.0,
+    "calorias_quemadas": 300.0,
+    "altura_cm": 170.0,
+    "peso_kg": 70.0,
+    "grasa_corporal": 18.0,
+    "masa_muscular": 32.0,
+    "cintura_cm": 85.0,
+    "cadera_cm": 97.0,
+    "fuma": "No",
+    "bebe": "No",
+    "lesiones_actuales": "No tengo lesiones",
+    "enfermedades_preexistentes": "No poseo",
+    "horas_dormidas": "7 a 8 horas (óptimo)",
+    "calidad_sueno": "Buena",
+    "despertares_nocturnos": "1 vez",
+    "tipo_comida_principal": "Balanceada",
+    "calorias_diarias_aprox": "2000 - 2500 kcal",
+    "consumo_proteinas": "Moderado",
+    "meta_peso_corporal": "Mantener peso actual",
+    "meta_grasa_corporal": "Entre 10% y 15%",
+    "objetivo": "Mantener peso actual",
+    "nivel_experiencia": "Intermedio",
+}
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(int(len(ordenados) * p / 100), len(ordenados) - 1)]
+
+
+class Command(BaseCommand):
+    help = "Mide tiempos y memoria del recomendador AthletIA."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modo", choices=["carga", "lotes", "inferencia", "caracteristicas"], default="carga")
+        parser.add_argument("--repeticiones", type=int, default=10)
+        parser.add_argument("--ventana-ms", type=float, default=5)
+        parser.add_argument("--muestras", type=int, default=500)
+
+    def handle(self, *args, **options):
+        getattr(self, f"medir_{options['modo']}")(options)
+
+    def reportar(self, titulo, datos):
+        self.stdout.write(self.style.SUCCESS(f"== {titulo} =="))
+        self.stdout.write(json.dumps(datos, indent=2, ensure_ascii=False))
+
+    # ======================================================
+    # Arranque en frío: carga perezosa vs carga al importar
+    # ======================================================
+    def medir_carga(self, options):
+        # Las vistas ya se importaron con los system checks: lo que interesa es
+        # que eso no cargó el modelo y cuánto cuesta la primera carga.
+        antes = ia.estadisticas_runtime()
+
+        # Runtime nuevo (fuera del registro) con los artefactos de la versión activa
+        runtime = ia.ModeloRuntime(antes["model_dir"], antes["version"])
+        t0 = time.perf_counter()
+        runtime.cargar()
+        t_carga = time.perf_counter() - t0
+
+        self.reportar("Arranque en frío", {
+            "cargado_al_importar": antes["cargado"],
+            "rss_al_importar_mb": antes["rss_actual_mb"],
+            "carga_s": round(t_carga, 3),
+            "primera_carga": runtime.estadisticas(),
+        })
+
+    # ======================================================
+    # Micro-lotes: lote directo y cola con llamadores concurrentes
+    # ======================================================
+    def medir_lotes(self, options):
+        runtime = ia.obtener_runtime()
+        repeticiones = options["repeticiones"]
+        runtime.puntuar_filas([FILA_EJEMPLO])  # calentamiento
+
+        resultados = []
+        for n in TAMANOS_LOTE:
+            # 1) Una sola llamada con n filas
+            tiempos = []
+            for _ in range(repeticiones):
+                t0 = time.perf_counter()
+                runtime.puntuar_filas([FILA_EJEMPLO] * n)
+                tiempos.append(time.perf_counter() - t0)
+            lote_s = statistics.median(tiempos)
+
+            # 2) n peticiones concurrentes a través del planificador
+            planificador = PlanificadorLotes(runtime.puntuar_filas, ventana_ms=options["ventana_ms"], max_lote=n)
+            latencias = []
+
+            def _peticion(_):
+                t0 = time.perf_counter()
+                planificador.puntuar(FILA_EJEMPLO)
+                return time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=n) as pool:
+                for _ in range(repeticiones):
+                    latencias.extend(pool.map(_peticion, range(n)))
+            total_s = time.perf_counter() - t0
+
+            resultados.append({
+                "lote": n,
+                "lote_directo_ms": round(lote_s * 1000, 2),
+                "lote_directo_filas_s": round(n / lote_s, 1),
+                "cola_filas_s": round(len(latencias) / total_s, 1),
+                "cola_latencia_p50_ms": round(percentil(latencias, 50) * 1000, 2),
+                "cola_latencia_p95_ms": round(percentil(latencias, 95) * 1000, 2),
+            })
+
+        self.reportar("Micro-lotes", resultados)
+
+    # ======================================================
+    # Inferencia de una fila: model.predict vs forward compilado
+    # ======================================================
+    def medir_inferencia(self, options):
+        import numpy as np
+        import pandas as pd
+
+        runtime = ia.obtener_runtime()
+        if not runtime.compilado:
+            self.stderr.write("IA_INFERENCIA_COMPILADA está desactivado; no hay ruta compilada que medir.")
+            return
+
+        X = runtime.preprocessor.transform(pd.DataFrame([FILA_EJEMPLO]))
+        base = runtime.predecir(X, compilado=False)
+        rapida = runtime.predecir(X, compilado=True)
+        top3_base = np.argsort(base[0])[-3:][::-1]
+        top3_rapida = np.argsort(rapida[0])[-3:][::-1]
+
+        datos = {
+            "top3_identico": bool((top3_base == top3_rapida).all()),
+            "prob_top3_identicas": bool(np.allclose(base[0][top3_base], rapida[0][top3_rapida], rtol=0, atol=1e-6)),
+            "max_diferencia": float(np.abs(base - rapida).max()),
+        }
+        for nombre, compilado in (("predict", False), ("compilado", True)):
+            tiempos = []
+            for _ in range(options["repeticiones"]):
+                t0 = time.perf_counter()
+                runtime.predecir(X, compilado=compilado)
+                tiempos.append(time.perf_counter() - t0)
+            datos[f"{nombre}_p50_ms"] = round(percentil(tiempos, 50) * 1000, 3)
+            datos[f"{nombre}_p95_ms"] = round(percentil(tiempos, 95) * 1000, 3)
+        datos["aceleracion_p50"] = round(datos["predict_p50_ms"] / datos["compilado_p50_ms"], 1)
+
+        self.reportar("Inferencia de una fila", datos)
+
+    # ======================================================
+    # Codificación: ColumnTransformer + pandas vs tablas NumPy
+    # ======================================================
+    def medir_caracteristicas(self, options):
+        import pandas as pd
+
+        runtime = ia.obtener_runtime()
+        codificador = CodificadorCaracteristicas(runtime.preprocessor)
+        datos = verificar_equivalencia(runtime.preprocessor, codificador, n=options["muestras"])
+
+        tiempos_pandas, tiempos_numpy = [], []
+        for _ in range(options["repeticiones"]):
+            t0 = time.perf_counter()
+            runtime.preprocessor.transform(pd.DataFrame([FILA_EJEMPLO]))
+            tiempos_pandas.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            codificador.transformar([FILA_EJEMPLO])
+            tiempos_numpy.append(time.perf_counter() - t0)
+
+        datos["pandas_p50_ms"] = round(percentil(tiempos_pandas, 50) * 1000, 3)
+        datos["numpy_p50_ms"] = round(percentil(tiempos_numpy, 50) * 1000, 3)
+        self.reportar("Codificación de una fila", datos)
@@ -0,0 +1,101 @@
+"""
+Administración de versiones del recomendador AthletIA.
+
+    python manage.py modelo_ia                              # versiones y selección actual
+    python manage.py modelo_ia --activar "AthletIA v14"     # compara latencia y activa
+    python manage.py modelo_ia --activar "AthletIA v14" --forzar
+    python manage.py modelo_ia --sombra "AthletIA v14"
+    python manage.py modelo_ia --sin-sombra
+
+Los servidores en ejecución aplican el cambio en su próximo sondeo
+(IA_MODELO_SONDEO_S), sin reiniciar.
+"""
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from IA.ia import ModeloRuntime
+from IA.management.commands.benchmark_ia import FILA_EJEMPLO, percentil
+from IA.registro_modelos import registro
+
+
+class Command(BaseCommand):
+    help = "Lista, activa o pone en sombra versiones del modelo AthletIA."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--activar", metavar="VERSION")
+        parser.add_argument("--sombra", metavar="VERSION")
+        parser.add_argument("--sin-sombra", action="store_true")
+        parser.add_argument("--forzar", action="store_true", help="Activar aunque sea más lenta que la actual.")
+        parser.add_argument("--tolerancia", type=float, default=0.2, help="Regresión de latencia p50 aceptada (0.2 = +20%%).")
+        parser.add_argument("--repeticiones", type=int, default=50)
+        parser.add_argument("--lote", type=int, default=32)
+
+    def handle(self, *args, **options):
+        versiones = registro.versiones()
+        actual = registro.activo().version
+        sombra = registro.estadisticas()["sombra"]
+
+        if not options["activar"] and not options["sombra"] and not options["sin_sombra"]:
+            self.reportar("Versiones del modelo", {
+                "activo": actual,
+                "sombra": sombra,
+                "archivo_estado": registro.archivo_estado,
+                "disponibles": versiones,
+            })
+            return
+
+        for version in filter(None, (options["activar"], options["sombra"])):
+            if version not in versiones:
+                raise CommandError(f"Versión desconocida: '{version}'. Disponibles: {list(versiones)}")
+
+        if options["sin_sombra"]:
+            sombra = None
+        elif options["sombra"]:
+            sombra = options["sombra"]
+
+        nuevo = actual
+        if options["activar"] and options["activar"] != actual:
+            nuevo = options["activar"]
+            comparacion = {
+                actual: self.medir(ModeloRuntime(versiones[actual], actual), options),
+                nuevo: self.medir(ModeloRuntime(versiones[nuevo], nuevo), options),
+            }
+            self.reportar("Comparación de versiones", comparacion)
+
+            limite = comparacion[actual]["p50_ms"] * (1 + options["tolerancia"])
+            if comparacion[nuevo]["p50_ms"] > limite and not options["forzar"]:
+                raise CommandError(
+                    f"'{nuevo}' es más lenta ({comparacion[nuevo]['p50_ms']} ms p50 vs "
+                    f"{comparacion[actual]['p50_ms']} ms). Usa --forzar para activarla igual."
+                )
+
+        registro.seleccionar(nuevo, sombra if sombra != nuevo else None)
+        self.stdout.write(self.style.SUCCESS(f"✅ Activo: '{nuevo}' · Sombra: '{sombra if sombra != nuevo else None}'"))
+
+    def medir(self, runtime, options):
+        """Latencia de puntuar_filas para un lote típico y memoria de carga."""
+        runtime.cargar()
+        filas = [FILA_EJEMPLO] * options["lote"]
+        runtime.puntuar_filas(filas)  # calentamiento
+
+        tiempos = []
+        for _ in range(options["repeticiones"]):
+            t0 = time.perf_counter()
+            runtime.puntuar_filas(filas)
+            tiempos.append(time.perf_counter() - t0)
+
+        return {
+            "lote": options["lote"],
+            "p50_ms": round(percentil(tiempos, 50) * 1000, 3),
+            "p95_ms": round(percentil(tiempos, 95) * 1000, 3),
+            "parametros": runtime.metricas.get("parametros"),
+            "pesos_mb": runtime.metricas.get("pesos_mb"),
+            "rss_delta_mb": runtime.metricas.get("rss_delta_mb"),
+            "carga_total_s": runtime.metricas.get("carga_total_s"),
+        }
+
+    def reportar(self, titulo, datos):
+        self.stdout.write(self.style.SUCCESS(f"== {titulo} =="))
+        self.stdout.write(json.dumps(datos, indent=2, ensure_ascii=False))
@@ -0,0 +1,166 @@
+"""
+Puntuación offline de todos los perfiles activos con el modelo vigente.
+
+Recorre los perfiles por bloques (un SnapshotPerfil por perfil, una consulta
+por bloque), arma las filas con la misma lógica que recomendar_rutina, las
+puntúa en lotes grandes y guarda una RecomendacionIA "pendiente" por perfil
+con bulk_create. Tras cada bloque se escribe un checkpoint para poder retomar.
+
+    python manage.py puntuar_perfiles
+    python manage.py puntuar_perfiles --procesos 4 --bloque 2000 --lote 512
+    python manage.py puntuar_perfiles --reanudar
+"""
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from App.models import Perfil
+from App.snapshot_perfil import iterar_snapshots
+from IA import ia
+from IA.entrada import construir_entrada, aplicar_correcciones
+from IA.indice_ejercicios import indice_ejercicios
+from IA.models import RecomendacionIA
+
+
+CHECKPOINT_POR_DEFECTO = os.path.join(settings.BASE_DIR, "spool", "puntuar_perfiles.json")
+
+
+def leer_checkpoint(ruta):
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def guardar_checkpoint(ruta, datos):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, ruta)
+
+
+class Command(BaseCommand):
+    help = "Re-puntúa los perfiles activos y guarda una RecomendacionIA por perfil."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bloque", type=int, default=1000, help="Perfiles leídos por consulta.")
+        parser.add_argument("--lote", type=int, default=256, help="Filas por llamada al modelo.")
+        parser.add_argument("--procesos", type=int, default=1, help="Procesos de puntuación (1 = en este proceso).")
+        parser.add_argument("--checkpoint", default=CHECKPOINT_POR_DEFECTO)
+        parser.add_argument("--reanudar", action="store_true", help="Continuar desde el último checkpoint.")
+
+    def handle(self, *args, **options):
+        bloque = max(options["bloque"], 1)
+        lote = max(options["lote"], 1)
+        procesos = max(options["procesos"], 1)
+        ruta_checkpoint = options["checkpoint"]
+        version = ia.estadisticas_runtime()["version"]
+
+        estado = {"version": version, "ultimo_id": 0, "filas": 0, "segundos": 0.0}
+        if options["reanudar"]:
+            previo = leer_checkpoint(ruta_checkpoint)
+            if previo is None:
+                raise CommandError(f"No hay checkpoint en {ruta_checkpoint}")
+            if previo["version"] != version:
+                raise CommandError(f"El checkpoint es de '{previo['version']}', el modelo vigente es '{version}'")
+            estado = previo
+            self.stdout.write(f"↪️ Retomando desde perfil id > {estado['ultimo_id']} ({estado['filas']} filas previas)")
+
+        perfiles = Perfil.objects.filter(is_active=True, vigente=True)
+        tiempos = {"lectura_s": 0.0, "puntuacion_s": 0.0, "escritura_s": 0.0}
+        filas_sesion = 0
+
+        # En modo multiproceso el padre no carga TensorFlow: solo lee y escribe.
+        # Se usa 'spawn' porque TF no soporta fork con el runtime ya iniciado.
+        pool = None
+        if procesos > 1:
+            pool = ProcessPoolExecutor(
+                max_workers=procesos,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=ia.obtener_runtime,
+            )
+
+            def puntuar_lotes(lotes):
+                return pool.map(ia.puntuar_en_proceso, lotes)
+        else:
+            runtime = ia.obtener_runtime()
+
+            def puntuar_lotes(lotes):
+                return map(runtime.puntuar_filas, lotes)
+
+        segundos_previos = estado["segundos"]
+        t_inicio = time.perf_counter()
+        try:
+            t = time.perf_counter()
+            for snaps in iterar_snapshots(perfiles, tamano=bloque, desde_id=estado["ultimo_id"]):
+                ahora = time.perf_counter()
+                tiempos["lectura_s"] += ahora - t
+                t = ahora
+
+                entradas = [construir_entrada(snap) for snap in snaps]
+                filas = [e.fila for e in entradas]
+                lotes = [filas[i:i + lote] for i in range(0, len(filas), lote)]
+                resultados = [r for parcial in puntuar_lotes(lotes) for r in parcial]
+                ahora = time.perf_counter()
+                tiempos["puntuacion_s"] += ahora - t
+                t = ahora
+
+                objetos = []
+                for snap, entrada, resultado in zip(snaps, entradas, resultados):
+                    rutina_principal, top3, precision_modelo = aplicar_correcciones(entrada, resultado)
+                    objetos.append(RecomendacionIA(
+                        perfil_id=snap.perfil.pk,
+                        rutina_recomendada=rutina_principal,
+                        top3_recomendaciones=top3,
+                        ejercicios=indice_ejercicios.seleccionar(rutina_principal, entrada.nivel_ajustado, n=8),
+                        parametros_entrada=entrada.fila,
+                        precision_modelo=precision_modelo,
+                        modelo_version=version,
+                        estado="pendiente",
+                    ))
+
+                with transaction.atomic():
+                    RecomendacionIA.objects.bulk_create(objetos)
+
+                # El checkpoint se escribe después del commit: si el proceso
+                # muere entre ambos, al reanudar se repite como mucho un bloque.
+                filas_sesion += len(objetos)
+                estado["ultimo_id"] = snaps[-1].perfil.pk
+                estado["filas"] += len(objetos)
+                estado["segundos"] = round(segundos_previos + (time.perf_counter() - t_inicio), 3)
+                guardar_checkpoint(ruta_checkpoint, estado)
+
+                ahora = time.perf_counter()
+                tiempos["escritura_s"] += ahora - t
+                t = ahora
+
+                transcurrido = ahora - t_inicio
+                self.stdout.write(
+                    f"… {estado['filas']} filas (id ≤ {estado['ultimo_id']}), "
+                    f"{filas_sesion / transcurrido:.1f} filas/s"
+                )
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        total_s = time.perf_counter() - t_inicio
+        self.stdout.write(self.style.SUCCESS("== Puntuación offline =="))
+        self.stdout.write(json.dumps({
+            "version": version,
+            "procesos": procesos,
+            "bloque": bloque,
+            "lote": lote,
+            "filas": filas_sesion,
+            "filas_acumuladas": estado["filas"],
+            "total_s": round(total_s, 3),
+            "filas_s": round(filas_sesion / total_s, 1) if total_s else None,
+            **{k: round(v, 3) for k, v in tiempos.items()},
+        }, indent=2, ensure_ascii=False))
@@ -0,0 +1,30 @@
+"""
+Rehace el resumen mensual del calendario (AdherenciaMensual) desde
+CalendarioRutina. Normalmente no hace falta: las señales de
+IA/adherencia_mensual.py lo mantienen al día; sirve si se tocaron eventos
+sin pasar por el ORM (o con .update()).
+
+    python manage.py recalcular_adherencia
+    python manage.py recalcular_adherencia --usuario ana
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from App.models import Perfil
+from IA.adherencia_mensual import reconstruir
+
+
+class Command(BaseCommand):
+    help = "Recalcula el resumen mensual de adherencia del calendario."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--usuario", help="Username del perfil (por defecto todos).")
+
+    def handle(self, *args, **options):
+        perfil_ids = None
+        if options["usuario"]:
+            perfil_ids = list(Perfil.objects.filter(username=options["usuario"]).values_list("id", flat=True))
+            if not perfil_ids:
+                raise CommandError(f"No existe el perfil '{options['usuario']}'.")
+
+        meses = reconstruir(perfil_ids)
+        self.stdout.write(self.style.SUCCESS(f"Resumen recalculado: {meses} mes(es)."))
@@ -0,0 +1,199 @@
+"""
+Métricas por petición del chat del coach.
+
+Cada respuesta del chat (sync, async, con o sin streaming) deja un registro
+con tokens del prompt y generados (los informa Ollama en su última parte),
+tiempo al primer token, tiempo total, tokens por segundo y cuánto de ese
+tiempo fue Ollama, cola de admisión o Django. El registro va como una línea
+JSON al logger "IA.chat.metricas" (ver LOGGING en settings) y a una ventana
+en memoria de IA_CHAT_METRICAS_VENTANA peticiones, de la que salen los
+percentiles del panel de staff (/panel-admin/chat/) y de /ia/chat_api/estado/.
+
+Sin streaming no hay un primer token que observar: el TTFT se estima como el
+tiempo hasta que Ollama empezó a generar (total de la llamada menos su
+eval_duration).
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+
+
+logger = logging.getLogger("IA.chat.metricas")
+
+# Campos con percentiles en el resumen
+CAMPOS = (
+    "ttft_ms", "total_ms", "ollama_ms", "espera_ms", "django_ms",
+    "carga_ms", "prompt_tokens", "completion_tokens", "tokens_s",
+)
+
+
+def _ms(segundos):
+    return round(segundos * 1000, 1) if segundos is not None else None
+
+
+def _ns_a_s(valor):
+    return valor / 1e9 if valor else None
+
+
+class MedicionChat:
+    """Tiempos y tokens de una petición; se registra una sola vez con terminar()."""
+
+    def __init__(self, vista, modelo, metricas=None):
+        self.vista = vista
+        self.modelo = modelo
+        self.metricas = metricas
+        self.origen = "ollama"
+        self.final = None               # última parte de Ollama (done=True)
+        self._t0 = time.perf_counter()
+        self._t_turno = None            # pidió cupo en control_admision
+        self._t_llamada = None          # obtuvo cupo y llamó a Ollama
+        self._t_primer_token = None
+        self._t_fin_llamada = None
+        self._registrada = False
+
+    # ------------------------------------------------------
+    # Marcas
+    # ------------------------------------------------------
+    def cacheada(self):
+        self.origen = "cache"
+
+    def pedir_turno(self):
+        self._t_turno = time.perf_counter()
+
+    def inicio_llamada(self):
+        self._t_llamada = time.perf_counter()
+        if self._t_turno is None:
+            self._t_turno = self._t_llamada
+
+    def primer_token(self):
+        if self._t_primer_token is None:
+            self._t_primer_token = time.perf_counter()
+
+    def fin_llamada(self, final=None):
+        self._t_fin_llamada = time.perf_counter()
+        if final is not None:
+            self.final = final
+
+    # ------------------------------------------------------
+    # Registro
+    # ------------------------------------------------------
+    def datos(self, estado):
+        fin = time.perf_counter()
+        final = self.final or {}
+        eval_s = _ns_a_s(final.get("eval_duration"))
+        prompt_tokens = final.get("prompt_eval_count")
+        completion_tokens = final.get("eval_count")
+
+        espera = ollama = ttft = tokens_s = None
+        if self._t_llamada is not None:
+            espera = self._t_llamada - self._t_turno
+            ollama = (self._t_fin_llamada or fin) - self._t_llamada
+        if self._t_primer_token is not None:
+            ttft = self._t_primer_token - self._t0
+        elif ollama is not None and eval_s is not None:
+            ttft = self._t_llamada - self._t0 + max(ollama - eval_s, 0)
+        elif self.origen == "cache":
+            ttft = fin - self._t0
+
+        if completion_tokens:
+            if eval_s:
+                tokens_s = completion_tokens / eval_s
+            elif self._t_primer_token is not None and self._t_fin_llamada:
+                tokens_s = completion_tokens / max(self._t_fin_llamada - self._t_primer_token, 1e-6)
+
+        total = fin - self._t0
+        return {
+            "ts": round(time.time(), 3),
+            "vista": self.vista,
+            "modelo": self.modelo,
+            "origen": self.origen,
+            "estado": estado,
+            "ttft_ms": _ms(ttft),
+            "total_ms": _ms(total),
+            "ollama_ms": _ms(ollama),
+            "espera_ms": _ms(espera),
+            "django_ms": _ms(total - (ollama or 0) - (espera or 0)),
+            "carga_ms": _ms(_ns_a_s(final.get("load_duration"))),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens_s": round(tokens_s, 1) if tokens_s else None,
+        }
+
+    def terminar(self, estado="ok"):
+        """Registra la petición; las llamadas siguientes no hacen nada."""
+        if self._registrada:
+            return None
+        self._registrada = True
+        datos = self.datos(estado)
+        if self.metricas is not None:
+            self.metricas.registrar(datos)
+        return datos
+
+
+class MetricasChat:
+    """Ventana con los últimos registros y sus percentiles."""
+
+    def __init__(self, ventana=1000):
+        self.ventana = ventana
+        self._lock = threading.Lock()
+        self._registros = deque(maxlen=ventana)
+        self.total = 0
+
+    def medir(self, vista, modelo):
+        return MedicionChat(vista, modelo, self)
+
+    def registrar(self, datos):
+        with self._lock:
+            self._registros.append(datos)
+            self.total += 1
+        logger.info(json.dumps(datos, ensure_ascii=False))
+
+    @staticmethod
+    def _percentiles(valores):
+        valores = sorted(valores)
+
+        def p(q):
+            return round(valores[min(int(len(valores) * q / 100), len(valores) - 1)], 1)
+
+        return {"n": len(valores), "p50": p(50), "p95": p(95), "p99": p(99), "max": round(valores[-1], 1)}
+
+    def resumen(self):
+        with self._lock:
+            registros = list(self._registros)
+
+        por_origen = {}
+        for origen in ("ollama", "cache"):
+            del_origen = [r for r in registros if r["origen"] == origen and r["estado"] == "ok"]
+            campos = {}
+            for campo in CAMPOS:
+                valores = [r[campo] for r in del_origen if r.get(campo) is not None]
+                if valores:
+                    campos[campo] = self._percentiles(valores)
+            por_origen[origen] = {"peticiones": len(del_origen), **campos}
+
+        estados = {}
+        for r in registros:
+            estados[r["estado"]] = estados.get(r["estado"], 0) + 1
+
+        generados = [r for r in registros if r.get("completion_tokens") and r.get("ollama_ms")]
+        segundos_ollama = sum(r["ollama_ms"] for r in generados) / 1000
+        return {
+            "ventana": self.ventana,
+            "en_ventana": len(registros),
+            "total": self.total,
+            "desde_hace_s": round(time.time() - registros[0]["ts"]) if registros else None,
+            "estados": estados,
+            "tokens_generados": sum(r["completion_tokens"] for r in generados),
+            # Tokens por segundo de llamada a Ollama, sumando todas las peticiones de la ventana
+            "tokens_s_agregado": (
+                round(sum(r["completion_tokens"] for r in generados) / segundos_ollama, 1) if segundos_ollama else None
+            ),
+            **por_origen,
+        }
+
+
+metricas_chat = MetricasChat(getattr(settings, "IA_CHAT_METRICAS_VENTANA", 1000))
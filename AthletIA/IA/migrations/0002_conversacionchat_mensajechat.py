@@ -0,0 +1,43 @@
+# Generated by Django 5.0.1 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('IA', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversacionChat',
+            fields=[
+                ('id', models.AutoField(db_column='ID', primary_key=True, serialize=False)),
+                ('fecha_inicio', models.DateTimeField(auto_now_add=True, db_column='FECHA_INICIO')),
+                ('perfil', models.ForeignKey(blank=True, db_column='PERFIL_ID', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='conversaciones_chat', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Conversación del chat',
+                'verbose_name_plural': 'Conversaciones del chat',
+                'db_table': 'CONVERSACION_CHAT',
+            },
+        ),
+        migrations.CreateModel(
+            name='MensajeChat',
+            fields=[
+                ('id', models.BigAutoField(db_column='ID', primary_key=True, serialize=False)),
+                ('rol', models.CharField(choices=[('user', 'Usuario'), ('assistant', 'Asistente')], db_column='ROL', max_length=20)),
+                ('contenido', models.TextField(db_column='CONTENIDO')),
+                ('fecha', models.DateTimeField(auto_now_add=True, db_column='FECHA')),
+                ('conversacion', models.ForeignKey(db_column='CONVERSACION_ID', on_delete=django.db.models.deletion.CASCADE, related_name='mensajes', to='IA.conversacionchat')),
+            ],
+            options={
+                'db_table': 'MENSAJE_CHAT',
+                'indexes': [models.Index(fields=['conversacion', 'id'], name='IX_MENSAJE_CHAT_CONV_ID')],
+            },
+        ),
+    ]
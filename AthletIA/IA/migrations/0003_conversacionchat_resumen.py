@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-18 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('IA', '0002_conversacionchat_mensajechat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversacionchat',
+            name='resumen',
+            field=models.TextField(blank=True, db_column='RESUMEN', null=True),
+        ),
+        migrations.AddField(
+            model_name='conversacionchat',
+            name='resumen_hasta_id',
+            field=models.BigIntegerField(db_column='RESUMEN_HASTA_ID', default=0),
+        ),
+    ]
@@ -44,3 +44,54 @@ class RecomendacionIA(models.Model):
 
     def __str__(self):
         return f"{self.perfil.username} - {self.rutina_recomendada} ({self.fecha_recomendacion.date()})"
+
+
+class ConversacionChat(models.Model):
+    id = models.AutoField(primary_key=True, db_column="ID")
+    # Nulo para visitantes sin sesión iniciada (el chat no exige login)
+    perfil = models.ForeignKey(
+        'App.Perfil',
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        db_column="PERFIL_ID",
+        related_name="conversaciones_chat"
+    )
+    fecha_inicio = models.DateTimeField(auto_now_add=True, db_column="FECHA_INICIO")
+
+    # Resumen acumulado de los mensajes con id <= resumen_hasta_id (ver IA/contexto_chat.py)
+    resumen = models.TextField(null=True, blank=True, db_column="RESUMEN")
+    resumen_hasta_id = models.BigIntegerField(default=0, db_column="RESUMEN_HASTA_ID")
+
+    class Meta:
+        db_table = "CONVERSACION_CHAT"
+        verbose_name = "Conversación del chat"
+        verbose_name_plural = "Conversaciones del chat"
+
+    def __str__(self):
+        return f"Conversación {self.id}"
+
+
+class MensajeChat(models.Model):
+    id = models.BigAutoField(primary_key=True, db_column="ID")
+    conversacion = models.ForeignKey(
+        ConversacionChat,
+        on_delete=models.CASCADE,
+        db_column="CONVERSACION_ID",
+        related_name="mensajes"
+    )
+    rol = models.CharField(
+        max_length=20,
+        choices=[("user", "Usuario"), ("assistant", "Asistente")],
+        db_column="ROL"
+    )
+    contenido = models.TextField(db_column="CONTENIDO")
+    fecha = models.DateTimeField(auto_now_add=True, db_column="FECHA")
+
+    class Meta:
+        db_table = "MENSAJE_CHAT"
+        # Ventana "últimos N mensajes de la conversación"
+        indexes = [models.Index(fields=["conversacion", "id"], name="IX_MENSAJE_CHAT_CONV_ID")]
+
+    def __str__(self):
+        return f"{self.rol}: {self.contenido[:40]}"
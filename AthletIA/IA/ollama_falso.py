@@ -0,0 +1,196 @@
+"""
+Servidor HTTP local que imita la API de Ollama que usa el chat
+(/api/chat, /api/generate y /api/ps).
+
+Sirve para medir el chat sin GPU ni modelo descargado: responde con una
+frase fija, con una latencia inicial (procesar el prompt, opcionalmente
+proporcional a su largo) y otra por token configurables, en modo streaming
+(NDJSON) o de una sola vez. Con latencia_carga_s simula además la carga del
+modelo cuando no está en memoria y su descarga al vencer keep_alive.
+
+    with ServidorOllamaFalso(latencia_inicial_s=0.5, latencia_token_s=0.03) as falso:
+        cliente = ollama.Client(host=falso.url)
+"""
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+RESPUESTA_POR_DEFECTO = "Haz 3 series de 10 a 12 repeticiones con buena técnica y descansa 90 segundos."
+
+KEEP_ALIVE_POR_DEFECTO_S = 300  # el de Ollama (5m)
+
+
+def _segundos(keep_alive):
+    """"30m", "1h", "45s", 120 o -1 (para siempre) a segundos."""
+    if keep_alive is None:
+        return KEEP_ALIVE_POR_DEFECTO_S
+    if isinstance(keep_alive, (int, float)):
+        return float("inf") if keep_alive < 0 else keep_alive
+    unidades = {"s": 1, "m": 60, "h": 3600}
+    texto = str(keep_alive).strip()
+    if texto[-1:] in unidades:
+        valor = float(texto[:-1])
+        return float("inf") if valor < 0 else valor * unidades[texto[-1]]
+    valor = float(texto)
+    return float("inf") if valor < 0 else valor
+
+
+class ServidorOllamaFalso:
+
+    def __init__(self, latencia_inicial_s=0.5, latencia_token_s=0.03, respuesta=RESPUESTA_POR_DEFECTO,
+                 latencia_prompt_token_s=0.0, paralelo=None, latencia_carga_s=0.0):
+        self.latencia_inicial_s = latencia_inicial_s
+        self.latencia_token_s = latencia_token_s
+        self.latencia_prompt_token_s = latencia_prompt_token_s
+        # Como OLLAMA_NUM_PARALLEL: generaciones a la vez; el resto espera su turno
+        self._paralelo = threading.Semaphore(paralelo) if paralelo else None
+        self.latencia_carga_s = latencia_carga_s
+        self._carga = threading.Lock()
+        self._cargado_hasta = 0.0   # time.monotonic() en que vence keep_alive
+        self._modelo = None
+        self.cargas = 0
+        self.respuesta = respuesta
+        self.peticiones = 0
+        self._servidor = None
+        self._hilo = None
+
+    @property
+    def tokens(self):
+        # Aproximación: una "palabra + espacio" por token
+        palabras = self.respuesta.split(" ")
+        return [p + (" " if i < len(palabras) - 1 else "") for i, p in enumerate(palabras)]
+
+    @property
+    def url(self):
+        host, puerto = self._servidor.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def descargar(self):
+        """Como si venciera keep_alive: la próxima petición paga la carga."""
+        self._cargado_hasta = 0.0
+
+    def _asegurar_cargado(self, modelo, keep_alive):
+        """Devuelve load_duration (ns) de esta petición."""
+        with self._carga:
+            self._modelo = modelo
+            t0 = time.perf_counter()
+            if time.monotonic() >= self._cargado_hasta:
+                time.sleep(self.latencia_carga_s)
+                self.cargas += 1
+            self._cargado_hasta = time.monotonic() + _segundos(keep_alive)
+            return int((time.perf_counter() - t0) * 1e9)
+
+    def iniciar(self):
+        falso = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                largo = int(self.headers.get("Content-Length") or 0)
+                cuerpo = json.loads(self.rfile.read(largo) or b"{}")
+                falso.peticiones += 1
+
+                if self.path == "/api/generate":
+                    # Solo el uso del chat: prompt vacío = cargar el modelo
+                    carga = falso._asegurar_cargado(cuerpo.get("model", "falso"), cuerpo.get("keep_alive"))
+                    self._json({
+                        "model": cuerpo.get("model", "falso"), "created_at": datetime.now(timezone.utc).isoformat(),
+                        "response": "", "done": True, "done_reason": "load", "load_duration": carga,
+                    })
+                    return
+
+                if self.path != "/api/chat":
+                    self._json({}, estado=404)
+                    return
+
+                if falso._paralelo is None:
+                    self._generar(cuerpo)
+                else:
+                    with falso._paralelo:
+                        self._generar(cuerpo)
+
+            def do_GET(self):
+                if self.path != "/api/ps":
+                    self._json({}, estado=404)
+                    return
+                restante = falso._cargado_hasta - time.monotonic()
+                modelos = []
+                if restante > 0:
+                    vence = datetime.fromtimestamp(time.time() + restante, timezone.utc).isoformat()
+                    modelos.append({"model": falso._modelo, "name": falso._modelo, "expires_at": vence})
+                self._json({"models": modelos})
+
+            def _json(self, datos, estado=200):
+                cuerpo = json.dumps(datos).encode()
+                self.send_response(estado)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def _generar(self, cuerpo):
+                modelo = cuerpo.get("model", "falso")
+                falso._asegurar_cargado(modelo, cuerpo.get("keep_alive"))
+                prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in cuerpo.get("messages", []))
+                time.sleep(falso.latencia_inicial_s + falso.latencia_prompt_token_s * prompt_tokens)
+
+                if cuerpo.get("stream", True):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    for token in falso.tokens:
+                        self._fragmento(falso._parte(modelo, token))
+                        time.sleep(falso.latencia_token_s)
+                    self._fragmento(falso._parte(modelo, "", fin=True, prompt_tokens=prompt_tokens))
+                    self.wfile.write(b"0\r\n\r\n")
+                else:
+                    time.sleep(falso.latencia_token_s * len(falso.tokens))
+                    self._json(falso._parte(modelo, falso.respuesta, fin=True, prompt_tokens=prompt_tokens))
+
+            def _fragmento(self, datos):
+                linea = (json.dumps(datos) + "\n").encode()
+                self.wfile.write(f"{len(linea):x}\r\n".encode() + linea + b"\r\n")
+                self.wfile.flush()
+
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+        self._servidor.daemon_threads = True
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, name="ollama-falso", daemon=True)
+        self._hilo.start()
+        return self
+
+    def detener(self):
+        if self._servidor is not None:
+            self._servidor.shutdown()
+            self._servidor.server_close()
+            self._servidor = None
+
+    def _parte(self, modelo, contenido, fin=False, prompt_tokens=0):
+        parte = {
+            "model": modelo,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "message": {"role": "assistant", "content": contenido},
+            "done": fin,
+        }
+        if fin:
+            parte.update({
+                "done_reason": "stop",
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(self.latencia_prompt_token_s * prompt_tokens * 1e9),
+                "eval_count": len(self.tokens),
+                "eval_duration": int(self.latencia_token_s * len(self.tokens) * 1e9),
+            })
+        return parte
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.detener()
@@ -0,0 +1,341 @@
+"""
+Registro de versiones del recomendador AthletIA.
+
+Cada subcarpeta de IA/modelos con los tres artefactos es una versión (el
+nombre sale de su `version.json` o, si no tiene, del nombre de la carpeta);
+los archivos sueltos en IA/modelos son la versión histórica MODELO_VERSION.
+
+Una versión es la activa y, opcionalmente, otra es la sombra: la sombra puntúa
+los mismos lotes fuera del camino de la respuesta y se registra cuánto
+coincide con la activa. La selección vive en IA_MODELO_ESTADO_ARCHIVO y cada
+proceso la relee cada IA_MODELO_SONDEO_S segundos, así que cambiar de versión
+(`manage.py modelo_ia --activar ...`) no requiere reiniciar el servidor.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .ia import MODEL_DIR, MODELO_VERSION, ModeloRuntime
+
+
+ARTEFACTOS = ("athletia_recomendador.keras", "preprocessor_athletia.pkl", "label_encoder_athletia.pkl")
+
+# Largo máximo de RecomendacionIA.modelo_version
+MAX_NOMBRE_VERSION = 50
+
+# Cada cuántas filas comparadas se imprime el resumen de la sombra
+RESUMEN_SOMBRA_CADA = 100
+
+logger = logging.getLogger("IA.modelos")
+
+
+def tiene_artefactos(ruta):
+    return all(os.path.isfile(os.path.join(ruta, a)) for a in ARTEFACTOS)
+
+
+def descubrir_versiones(directorio=MODEL_DIR):
+    """Devuelve {nombre de versión: carpeta de artefactos}."""
+    versiones = {}
+    if tiene_artefactos(directorio):
+        versiones[MODELO_VERSION] = directorio
+
+    try:
+        entradas = sorted(os.listdir(directorio))
+    except FileNotFoundError:
+        return versiones
+
+    for nombre in entradas:
+        ruta = os.path.join(directorio, nombre)
+        if not os.path.isdir(ruta) or not tiene_artefactos(ruta):
+            continue
+
+        version = nombre
+        try:
+            with open(os.path.join(ruta, "version.json"), encoding="utf-8") as f:
+                version = json.load(f).get("version") or nombre
+        except (FileNotFoundError, ValueError):
+            pass
+
+        if len(version) > MAX_NOMBRE_VERSION:
+            logger.warning("⚠️ Versión de modelo ignorada (nombre de más de %s caracteres): %s", MAX_NOMBRE_VERSION, version)
+            continue
+        versiones[version] = ruta
+
+    return versiones
+
+
+def leer_seleccion(ruta):
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def guardar_seleccion(ruta, activo, sombra=None):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f"{ruta}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump({"activo": activo, "sombra": sombra}, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, ruta)
+
+
+class ComparacionSombra:
+    """Coincidencia acumulada entre la versión activa y una versión sombra."""
+
+    def __init__(self):
+        self.filas = 0
+        self.coincide_top1 = 0
+        self.solapamiento_top3 = 0.0
+        self.descartadas = 0
+        self.errores = 0
+
+    def registrar(self, activos, sombra):
+        for a, s in zip(activos, sombra):
+            self.filas += 1
+            if a["rutina_principal"] == s["rutina_principal"]:
+                self.coincide_top1 += 1
+            top_a = {x["rutina"] for x in a["top3"]}
+            top_s = {x["rutina"] for x in s["top3"]}
+            self.solapamiento_top3 += len(top_a & top_s) / max(len(top_a), 1)
+
+    def estadisticas(self):
+        return {
+            "filas": self.filas,
+            "coincidencia_top1": round(self.coincide_top1 / self.filas, 3) if self.filas else None,
+            "solapamiento_top3": round(self.solapamiento_top3 / self.filas, 3) if self.filas else None,
+            "descartadas": self.descartadas,
+            "errores": self.errores,
+        }
+
+
+class RegistroModelos:
+
+    def __init__(self, directorio, archivo_estado, sondeo_s=5.0, sombra_max_pendientes=64):
+        self.directorio = directorio
+        self.archivo_estado = archivo_estado
+        self.sondeo_s = sondeo_s
+        self.sombra_max_pendientes = sombra_max_pendientes
+        self._runtimes = {}          # versión -> ModeloRuntime
+        self._activo = None
+        self._sombra = None
+        self._cargando = None        # versión que se está cargando para reemplazar a la activa
+        self._lock = threading.RLock()
+        self._mtime_estado = None
+        self._proximo_sondeo = 0.0
+        self._ejecutor = None
+        self._pid = None
+        self._pendientes_sombra = 0
+        self.comparaciones = {}      # versión sombra -> ComparacionSombra
+        self.cambios = 0
+
+    # ------------------------------------------------------
+    # Selección de versiones
+    # ------------------------------------------------------
+    def versiones(self):
+        return descubrir_versiones(self.directorio)
+
+    def _runtime(self, version, versiones=None):
+        runtime = self._runtimes.get(version)
+        if runtime is None:
+            versiones = self.versiones() if versiones is None else versiones
+            if version not in versiones:
+                raise KeyError(f"Versión de modelo desconocida: {version}")
+            runtime = self._runtimes.setdefault(version, ModeloRuntime(versiones[version], version))
+        return runtime
+
+    def seleccionar(self, activo, sombra=None):
+        """Guarda la selección; este y los demás procesos la aplican en el próximo sondeo."""
+        versiones = self.versiones()
+        for version in filter(None, (activo, sombra)):
+            if version not in versiones:
+                raise KeyError(f"Versión de modelo desconocida: {version}")
+        guardar_seleccion(self.archivo_estado, activo, sombra)
+        self._proximo_sondeo = 0.0
+
+    def _sincronizar(self):
+        ahora = time.monotonic()
+        if self._activo is not None and ahora < self._proximo_sondeo:
+            return
+
+        with self._lock:
+            if self._activo is not None and ahora < self._proximo_sondeo:
+                return
+            self._proximo_sondeo = ahora + self.sondeo_s
+
+            try:
+                mtime = os.path.getmtime(self.archivo_estado)
+            except OSError:
+                mtime = None
+            if self._activo is not None and mtime == self._mtime_estado:
+                return
+            self._mtime_estado = mtime
+
+            seleccion = leer_seleccion(self.archivo_estado)
+            activo = seleccion.get("activo") or getattr(settings, "IA_MODELO_ACTIVO", "") or MODELO_VERSION
+            sombra = seleccion["sombra"] if "sombra" in seleccion else getattr(settings, "IA_MODELO_SOMBRA", "")
+            self._aplicar(activo, sombra or None)
+
+    def _aplicar(self, activo, sombra):
+        versiones = self.versiones()
+
+        if activo not in versiones:
+            logger.warning("⚠️ Versión de modelo '%s' no encontrada en %s", activo, self.directorio)
+            activo = self._activo or MODELO_VERSION
+            if activo not in versiones:
+                # Sin artefactos: se mantiene el comportamiento histórico (falla al cargar)
+                self._runtimes.setdefault(activo, ModeloRuntime(self.directorio, activo))
+                versiones = {activo: self.directorio, **versiones}
+
+        self._sombra = sombra if sombra in versiones and sombra != activo else None
+        if self._sombra is not None:
+            # Se carga perezosamente con el primer lote que recibe (en el hilo de la sombra)
+            self._runtime(self._sombra, versiones)
+
+        if self._activo is None:
+            self._runtime(activo, versiones)
+            self._activo = activo
+        elif activo == self._activo:
+            self._cargando = None  # se volvió a la versión actual: se descarta el cambio pendiente
+        elif activo != self._activo and activo != self._cargando:
+            nuevo = self._runtime(activo, versiones)
+            if nuevo.cargado or not self._runtimes[self._activo].cargado:
+                self._cambiar(activo)
+            else:
+                # Se carga en segundo plano; mientras tanto sigue respondiendo la versión actual
+                self._cargando = activo
+                threading.Thread(target=self._cargar_y_cambiar, args=(activo,), name="ia-cambio-modelo", daemon=True).start()
+
+        self._liberar()
+
+    def _cargar_y_cambiar(self, version):
+        try:
+            with self._lock:
+                runtime = self._runtimes.get(version)
+            if runtime is None:
+                return  # se descartó el cambio antes de empezar a cargar
+            runtime.cargar()
+            with self._lock:
+                if self._cargando == version:
+                    self._cambiar(version)
+        except Exception as e:
+            logger.error("🔥 ERROR cargando la versión '%s', se mantiene '%s': %s", version, self._activo, e)
+        finally:
+            with self._lock:
+                if self._cargando == version:
+                    self._cargando = None
+                self._liberar()
+
+    def _cambiar(self, version):
+        anterior, self._activo = self._activo, version
+        self._cargando = None
+        self.cambios += 1
+        logger.info("🔁 Modelo IA activo: '%s' → '%s'", anterior, version)
+
+    def _liberar(self):
+        """Suelta los runtimes que ya no son activos, sombra ni se están cargando."""
+        en_uso = {self._activo, self._sombra, self._cargando}
+        for version in [v for v in self._runtimes if v not in en_uso]:
+            del self._runtimes[version]
+
+    # ------------------------------------------------------
+    # Acceso
+    # ------------------------------------------------------
+    def activo(self):
+        """Runtime de la versión activa (sin forzar la carga)."""
+        self._sincronizar()
+        # _cambiar + _liberar corren con el lock: así la versión y su runtime se leen juntos
+        with self._lock:
+            return self._runtimes[self._activo]
+
+    def runtime_activo(self):
+        return self.activo().cargar()
+
+    def puntuar(self, filas):
+        """Puntúa con la versión activa y, si hay sombra, le envía el mismo lote."""
+        runtime = self.runtime_activo()
+        return self.puntuar_codificadas(runtime, runtime.codificar(filas), filas)
+
+    def puntuar_codificadas(self, runtime, X, filas):
+        """
+        Puntúa la matriz X, codificada por `runtime`, con ese mismo runtime
+        (aunque ya no sea el activo) y envía `filas` a la sombra si la hay.
+        """
+        resultados = runtime.puntuar_matriz(X)
+        sombra = self._sombra
+        if sombra is not None and sombra != runtime.version:
+            self._enviar_sombra(sombra, filas, resultados)
+        return resultados
+
+    # ------------------------------------------------------
+    # Sombra (fuera del camino de la respuesta)
+    # ------------------------------------------------------
+    def _asegurar_ejecutor(self):
+        if self._ejecutor is not None and self._pid == os.getpid():
+            return self._ejecutor
+        with self._lock:
+            if self._ejecutor is None or self._pid != os.getpid():
+                self._ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ia-sombra")
+                self._pid = os.getpid()
+                self._pendientes_sombra = 0
+            return self._ejecutor
+
+    def _enviar_sombra(self, version, filas, resultados):
+        ejecutor = self._asegurar_ejecutor()
+        with self._lock:
+            comparacion = self.comparaciones.setdefault(version, ComparacionSombra())
+            if self._pendientes_sombra >= self.sombra_max_pendientes:
+                comparacion.descartadas += len(filas)
+                return
+            self._pendientes_sombra += 1
+        ejecutor.submit(self._puntuar_sombra, version, comparacion, filas, resultados)
+
+    def _puntuar_sombra(self, version, comparacion, filas, resultados):
+        try:
+            runtime = self._runtimes.get(version)
+            if runtime is None:
+                # Dejó de ser sombra antes de procesarse (o nunca se creó su runtime)
+                comparacion.descartadas += len(filas)
+                logger.warning("⚠️ Sombra '%s' sin runtime: %s fila(s) descartadas", version, len(filas))
+                return
+            sombra = runtime.cargar().puntuar_filas(filas)
+
+            antes = comparacion.filas
+            comparacion.registrar(resultados, sombra)
+            if comparacion.filas // RESUMEN_SOMBRA_CADA != antes // RESUMEN_SOMBRA_CADA:
+                logger.info("🕵️ Sombra '%s': %s", version, {**comparacion.estadisticas(), **runtime.latencias()})
+        except Exception as e:
+            comparacion.errores += 1
+            logger.error("🔥 ERROR en la versión sombra '%s': %s", version, e)
+        finally:
+            with self._lock:
+                self._pendientes_sombra -= 1
+
+    # ------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------
+    def estadisticas(self):
+        self._sincronizar()
+        return {
+            "activo": self._activo,
+            "sombra": self._sombra,
+            "cargando": self._cargando,
+            "cambios": self.cambios,
+            "disponibles": list(self.versiones()),
+            "por_version": {v: r.estadisticas() for v, r in list(self._runtimes.items())},
+            "sombra_pendientes": self._pendientes_sombra,
+            "comparaciones": {v: c.estadisticas() for v, c in self.comparaciones.items()},
+        }
+
+
+registro = RegistroModelos(
+    directorio=getattr(settings, "IA_MODELOS_DIR", MODEL_DIR),
+    archivo_estado=getattr(settings, "IA_MODELO_ESTADO_ARCHIVO", os.path.join(settings.BASE_DIR, "spool", "modelo_activo.json")),
+    sondeo_s=getattr(settings, "IA_MODELO_SONDEO_S", 5.0),
+    sombra_max_pendientes=getattr(settings, "IA_MODELO_SOMBRA_MAX_PENDIENTES", 64),
+)
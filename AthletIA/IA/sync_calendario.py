@@ -0,0 +1,152 @@
+"""
+Ventana de fechas y sincronización incremental del feed del calendario.
+
+FullCalendar pide los eventos de lo que muestra (`start`/`end`, fin
+exclusivo) y el feed devuelve solo ese rango. Cada respuesta trae un token
+(cabecera X-Sync-Token, o `sync_token` en modo incremental); con `?since=<token>`
+el feed devuelve solo los eventos de la ventana que cambiaron desde entonces
+y los ids de los que se borraron o salieron de ella, así recargar el mes
+tras marcar una rutina no vuelve a bajar todo.
+
+Un evento "cambió" si cambió su fila o su rutina (nombre, vigencia o
+ejercicios: Rutina.actualizado, que se sube una vez por transacción aunque
+se reemplacen todos los ejercicios). Los borrados y los cambios de fecha quedan
+en CalendarioRutinaEliminado con la fecha que dejó el evento, así solo se
+avisa a la ventana que lo tenía; se guardan por
+IA_CALENDARIO_SYNC_RETENCION_DIAS y un token más viejo que eso obliga a una
+recarga completa.
+"""
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from App.models import Perfil
+from api_ejercicio.models import CalendarioRutina, CalendarioRutinaEliminado, Ejercicio, Rutina, RutinaEjercicio
+
+
+# El token se entrega algo atrasado: una escritura que se confirmó mientras se
+# armaba la respuesta vuelve a llegar en la siguiente (el cliente la pisa).
+MARGEN_TOKEN = timedelta(seconds=5)
+
+RETENCION = timedelta(days=getattr(settings, "IA_CALENDARIO_SYNC_RETENCION_DIAS", 30))
+
+# Rutinas cuyo `actualizado` se sube al confirmar la transacción en curso, por hilo y BD
+_por_tocar = threading.local()
+
+
+def ventana(request):
+    """(desde, hasta) de `start`/`end` (hasta exclusivo), o (None, None) si no vienen."""
+    inicio, fin = request.GET.get("start"), request.GET.get("end")
+    if not inicio or not fin:
+        return None, None
+    # FullCalendar manda "2025-03-30T00:00:00-03:00"; basta la fecha
+    desde, hasta = parse_date(inicio[:10]), parse_date(fin[:10])
+    if desde is None or hasta is None or hasta <= desde:
+        raise ValueError("Rango de fechas inválido.")
+    return desde, hasta
+
+
+def leer_token(request):
+    """Momento del `since` recibido, o None si no viene."""
+    valor = request.GET.get("since")
+    if not valor:
+        return None
+    # Un "+00:00" sin codificar llega como espacio
+    momento = parse_datetime(valor.replace(" ", "+"))
+    if momento is None:
+        raise ValueError("Token de sincronización inválido.")
+    if timezone.is_naive(momento):
+        momento = timezone.make_aware(momento)
+    return momento
+
+
+def nuevo_token():
+    """Token para la próxima petición; se toma antes de consultar."""
+    return (timezone.now() - MARGEN_TOKEN).isoformat()
+
+
+def token_vigente(momento):
+    return momento >= timezone.now() - RETENCION
+
+
+def eliminados_desde(perfil_id, momento, desde=None, hasta=None):
+    """Ids borrados o movidos desde `momento` que estaban en [desde, hasta) (todos si no hay ventana)."""
+    salidas = CalendarioRutinaEliminado.objects.filter(perfil_id=perfil_id, eliminado__gt=momento)
+    if desde:
+        salidas = salidas.filter(Q(fecha__gte=desde, fecha__lt=hasta) | Q(fecha__isnull=True))
+    return list(dict.fromkeys(salidas.order_by("id").values_list("evento_id", flat=True)))
+
+
+def depurar(perfil_id):
+    """Borra los eliminados que ya ningún token vigente puede pedir."""
+    CalendarioRutinaEliminado.objects.filter(
+        perfil_id=perfil_id, eliminado__lt=timezone.now() - RETENCION
+    ).delete()
+
+
+# ==========================================================
+# Marcas de cambio
+# ==========================================================
+def _registrar_salida(evento, fecha):
+    CalendarioRutinaEliminado.objects.create(perfil_id=evento.perfil_id, evento_id=evento.pk, fecha=fecha)
+    depurar(evento.perfil_id)
+
+
+@receiver(post_init, sender=CalendarioRutina)
+def recordar_fecha(sender, instance, **kwargs):
+    # None si se leyó sin la fecha (.only/.defer)
+    instance._fecha_sync = instance.__dict__.get("fecha")
+
+
+@receiver(post_save, sender=CalendarioRutina)
+def registrar_movido(sender, instance, created=False, **kwargs):
+    # Un evento que cambió de fecha "sale" de la ventana que lo tenía
+    antes, ahora = getattr(instance, "_fecha_sync", None), instance.__dict__.get("fecha")
+    if not created and antes is not None and str(antes) != str(ahora):
+        _registrar_salida(instance, antes)
+    instance._fecha_sync = ahora
+
+
+@receiver(post_delete, sender=CalendarioRutina)
+def registrar_eliminado(sender, instance, origin=None, **kwargs):
+    # Si se borra el perfil completo no hay cliente al que avisarle
+    if isinstance(origin, Perfil):
+        return
+    _registrar_salida(instance, instance.__dict__.get("fecha"))
+
+
+def _tocar_pendientes(using, pendiente):
+    if getattr(_por_tocar, using, None) is pendiente:
+        delattr(_por_tocar, using)
+    Rutina.objects.using(using).filter(pk__in=pendiente[1]).update(actualizado=timezone.now())
+
+
+@receiver([post_save, post_delete], sender=RutinaEjercicio)
+def tocar_rutina(sender, instance, using="default", **kwargs):
+    conexion = transaction.get_connection(using)
+    if not conexion.in_atomic_block:
+        Rutina.objects.using(using).filter(pk=instance.rutina_id).update(actualizado=timezone.now())
+        return
+    # Reemplazar los ejercicios de una rutina toca muchas filas: se junta una
+    # sola marca por rutina para cuando se confirme la transacción. Django
+    # rehace la lista de on_commit al confirmar o deshacer, así un conjunto que
+    # quedó de una transacción deshecha no se reusa.
+    pendiente = getattr(_por_tocar, using, None)
+    if pendiente is None or pendiente[0] is not conexion.run_on_commit:
+        pendiente = (conexion.run_on_commit, set())
+        setattr(_por_tocar, using, pendiente)
+        transaction.on_commit(lambda: _tocar_pendientes(using, pendiente), using=using)
+    pendiente[1].add(instance.rutina_id)
+
+
+@receiver(post_save, sender=Ejercicio)
+def tocar_rutinas_del_ejercicio(sender, instance, created=False, **kwargs):
+    if not created:
+        Rutina.objects.filter(rutinaejercicio__ejercicio_id=instance.pk).update(actualizado=timezone.now())
@@ -1,3 +1,1006 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturoVencido
+from datetime import date, timedelta
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from App.models import (
+    Perfil, SaludUsuario, ProgresoUsuario, HistorialMedidas, TipoObjetivo,
+    ObjetivoUsuario, SuenoUsuario, NutricionRegistro
+)
+from App.snapshot_perfil import cargar_snapshot
+from api_ejercicio.models import (
+    CalendarioRutina, Ejercicio, Musculo, NivelDificultad, Rutina, RutinaEjercicio, TipoEjercicio
+)
+from . import adherencia_mensual, chat_virtual, historial_chat, views, views_calendario, views_detalle_rutina
+from .admision_chat import ChatOcupado, ControlAdmision, respuesta_ocupado
+from .backend_chat import BackendChat
+from .cache_recomendaciones import CacheLRU, CacheLRUConVencimiento, clave_vector
+from .cache_chat import CacheRespuestasChat, normalizar_pregunta
+from .caracteristicas import CodificadorCaracteristicas
+from .contenido_rutinas import contenido_rutinas
+from .contexto_chat import Contexto, GestorContexto, armar_contexto, tokens_mensaje
+from .ia import MODEL_DIR
+from .lotes import PlanificadorLotes, _puntuar_lote
+from .models import ConversacionChat, MensajeChat
+from .ollama_falso import ServidorOllamaFalso
+from .registro_modelos import registro
+
+
+# ==========================================================
+# Codificador NumPy vs preprocessor.transform
+# ==========================================================
+class CodificadorCaracteristicasTests(SimpleTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        import joblib
+
+        cls.preprocessor = joblib.load(os.path.join(MODEL_DIR, "preprocessor_athletia.pkl"))
+        cls.codificador = CodificadorCaracteristicas(cls.preprocessor)
+
+    def transformar_con_pandas(self, filas):
+        import pandas as pd
+
+        esperado = self.preprocessor.transform(pd.DataFrame(filas, columns=self.codificador.columnas_entrada))
+        if hasattr(esperado, "toarray"):
+            esperado = esperado.toarray()
+        return np.asarray(esperado, dtype=np.float64)
+
+    def test_equivale_en_la_grilla_muestreada(self):
+        # La grilla incluye categorías desconocidas (handle_unknown="ignore")
+        for semilla in range(4):
+            with self.subTest(semilla=semilla):
+                filas = self.codificador.grilla_muestras(n=256, semilla=semilla)
+                np.testing.assert_allclose(
+                    self.codificador.transformar(filas), self.transformar_con_pandas(filas), rtol=0, atol=1e-9
+                )
+
+    def test_una_fila(self):
+        filas = self.codificador.grilla_muestras(n=1, semilla=11)
+        obtenido = self.codificador.transformar(filas)
+        self.assertEqual(obtenido.shape, (1, self.codificador.n_salida))
+        np.testing.assert_allclose(obtenido, self.transformar_con_pandas(filas), rtol=0, atol=1e-9)
+
+
+# ==========================================================
+# Perfil del recomendador en una sola consulta
+# ==========================================================
+class SnapshotPerfilConsultasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        salud = SaludUsuario.objects.create(frecuencia_cardiaca_reposo=62, bebe=True)
+        cls.perfil = Perfil.objects.create_user(
+            username="ana", password="clave", fecha_nacimiento=date(1995, 5, 1), salud_usuario=salud
+        )
+        progreso = ProgresoUsuario.objects.create(perfil=cls.perfil, peso_kg=64, altura_cm=168)
+        HistorialMedidas.objects.create(
+            progreso_usuario=progreso, perfil=cls.perfil,
+            grasa_corporal=22, masa_muscular=30, cintura_cm=70, cadera_cm=95,
+        )
+        ObjetivoUsuario.objects.create(
+            perfil=cls.perfil, tipo_objetivo=TipoObjetivo.objects.create(nombre="Ganar masa muscular"),
+            fecha_inicio=date.today(), estado="En curso",
+        )
+        SuenoUsuario.objects.create(
+            perfil=cls.perfil, fecha=date.today(), horas_dormidas=7.5, calidad_sueno="Buena", despertares_nocturnos=1
+        )
+        NutricionRegistro.objects.create(
+            perfil=cls.perfil, fecha=date.today(), comida="Balanceada", calorias=2200, proteinas=120
+        )
+        cls.sin_datos = Perfil.objects.create_user(username="beto", password="clave")
+        NivelDificultad.objects.create(nombre="Intermedio")
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_snapshot_una_consulta(self):
+        with self.assertNumQueries(1):
+            snap = cargar_snapshot(self.perfil)
+            # La ficha de salud viene en la misma consulta (select_related)
+            self.assertEqual(snap.salud.frecuencia_cardiaca_reposo, 62)
+        self.assertEqual((snap.altura_cm, snap.peso_kg), (168, 64))
+        self.assertEqual(snap.objetivo_nombre, "Ganar masa muscular")
+        self.assertEqual(snap.calidad_sueno, "Buena")
+        self.assertEqual(snap.proteinas, 120)
+        self.assertEqual(snap.grasa_corporal, 22)
+
+        with self.assertNumQueries(1):
+            vacio = cargar_snapshot(self.sin_datos)
+        self.assertIsNone(vacio.salud)
+        self.assertFalse(vacio.tiene_progreso or vacio.tiene_objetivo or vacio.tiene_sueno or vacio.tiene_nutricion)
+
+    def test_verificar_datos_usuario_una_consulta(self):
+        request = self.factory.get("/ia/verificar_datos_usuario/")
+        request.user = self.perfil
+        with self.assertNumQueries(1):
+            respuesta = views.verificar_datos_usuario(request)
+        self.assertEqual(json.loads(respuesta.content), {"faltantes": []})
+
+    def recomendar(self):
+        request = self.factory.post("/ia/recomendar/", data="{}", content_type="application/json")
+        request.user = self.perfil
+        return views.recomendar_rutina(request)
+
+    def test_recomendar_rutina_dos_consultas(self):
+        runtime = mock.Mock(version="prueba")
+        runtime.codificar.return_value = np.zeros((1, 4))
+        resultado = {
+            "top3": [{"rutina": "Fuerza", "probabilidad": 80.0}],
+            "rutina_principal": "Fuerza",
+            "precision_modelo": 80.0,
+        }
+
+        with mock.patch.object(views, "obtener_runtime", return_value=runtime), \
+                mock.patch.object(views.planificador, "puntuar", return_value=resultado), \
+                mock.patch.object(views, "registrar_recomendacion") as registrar:
+            views.cache_predicciones.limpiar()
+            # La primera petición crea la "Rutina IA" y carga el índice de ejercicios
+            primera = json.loads(self.recomendar().content)
+            self.assertTrue(primera["nueva_rutina"])
+
+            # El perfil completo y el id de la "Rutina IA"
+            with self.assertNumQueries(2):
+                respuesta = json.loads(self.recomendar().content)
+
+            # Si un admin la borra, la siguiente petición la vuelve a crear
+            Rutina.objects.filter(pk=primera["rutina_id"]).delete()
+            recreada = json.loads(self.recomendar().content)
+
+        self.assertEqual(respuesta["recommendation"], "Fuerza")
+        self.assertEqual(respuesta["rutina_id"], primera["rutina_id"])
+        self.assertFalse(respuesta["nueva_rutina"])
+        self.assertTrue(recreada["nueva_rutina"])
+        self.assertEqual(Rutina.objects.get(pk=recreada["rutina_id"]).nombre, "Rutina IA - Fuerza")
+        self.assertEqual(registrar.call_args.kwargs["modelo_version"], "prueba")
+
+    def test_cambio_de_version_no_reusa_cache(self):
+        def runtime_falso(version):
+            runtime = mock.Mock(version=version)
+            runtime.codificar.return_value = np.ones((1, 4))
+            return runtime
+
+        def puntuar(pedido):
+            runtime, _, _ = pedido
+            return {"top3": [], "rutina_principal": f"Rutina {runtime.version}", "precision_modelo": 90.0}
+
+        with mock.patch.object(views.planificador, "puntuar", side_effect=puntuar) as puntuar_lote, \
+                mock.patch.object(views, "registrar_recomendacion"):
+            views.cache_predicciones.limpiar()
+            for version, esperado in (("v1", "Rutina v1"), ("v1", "Rutina v1"), ("v2", "Rutina v2"), ("v1", "Rutina v1")):
+                with mock.patch.object(views, "obtener_runtime", return_value=runtime_falso(version)):
+                    self.assertEqual(json.loads(self.recomendar().content)["recommendation"], esperado)
+
+        # La misma entrada se puntúa una vez por versión
+        self.assertEqual(puntuar_lote.call_count, 2)
+
+
+# ==========================================================
+# Feed del calendario: consultas fijas sin importar cuántas rutinas
+# ==========================================================
+class CalendarioConsultasTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        nivel = NivelDificultad.objects.create(nombre="Intermedio")
+        tipo = TipoEjercicio.objects.create(nombre="Fuerza")
+        musculo = Musculo.objects.create(nombre="Piernas")
+        ejercicios = [
+            Ejercicio.objects.create(nombre=f"Ejercicio {i}", descripcion="", tipo_ejercicio=tipo, musculo=musculo)
+            for i in range(3)
+        ]
+
+        cls.uno = Perfil.objects.create_user(username="uno", password="clave")
+        cls.varios = Perfil.objects.create_user(username="varios", password="clave")
+        for perfil, n_rutinas in ((cls.uno, 1), (cls.varios, 8)):
+            for i in range(n_rutinas):
+                rutina = Rutina.objects.create(nombre=f"Rutina {i}", perfil=perfil, nivel_dificultad=nivel)
+                for orden, ejercicio in enumerate(ejercicios):
+                    RutinaEjercicio.objects.create(rutina=rutina, ejercicio=ejercicio, repeticiones=10, orden=orden)
+                CalendarioRutina.objects.create(perfil=perfil, rutina=rutina, fecha=date(2026, 3, 1 + i))
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def obtener(self, perfil):
+        request = self.factory.get("/ia/obtener_calendario/", {"start": "2026-03-01", "end": "2026-04-01"})
+        request.user = perfil
+        return json.loads(views_calendario.obtener_calendario(request).content)
+
+    def test_consultas_no_dependen_de_las_rutinas(self):
+        for perfil, n_rutinas in ((self.uno, 1), (self.varios, 8)):
+            with self.subTest(rutinas=n_rutinas):
+                contenido_rutinas.limpiar()
+                # Los eventos con su rutina y dueño, y los ejercicios de todas las rutinas
+                with self.assertNumQueries(2):
+                    eventos = self.obtener(perfil)
+                self.assertEqual(len(eventos), n_rutinas)
+                self.assertTrue(all(len(e["extendedProps"]["ejercicios"]) == 3 for e in eventos))
+
+                # Con el contenido ya en memoria basta la consulta de eventos
+                with self.assertNumQueries(1):
+                    self.assertEqual(self.obtener(perfil), eventos)
+
+
+# ==========================================================
+# Sincronización incremental del calendario
+# ==========================================================
+class SyncCalendarioTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        nivel = NivelDificultad.objects.create(nombre="Intermedio")
+        tipo = TipoEjercicio.objects.create(nombre="Fuerza")
+        musculo = Musculo.objects.create(nombre="Piernas")
+        cls.ejercicios = [
+            Ejercicio.objects.create(nombre=f"Ejercicio {i}", descripcion="", tipo_ejercicio=tipo, musculo=musculo)
+            for i in range(3)
+        ]
+        cls.perfil = Perfil.objects.create_user(username="sync", password="clave")
+        cls.rutinas = [
+            Rutina.objects.create(nombre=f"Rutina {i}", perfil=cls.perfil, nivel_dificultad=nivel) for i in range(3)
+        ]
+        for rutina in cls.rutinas:
+            for ejercicio in cls.ejercicios:
+                RutinaEjercicio.objects.create(rutina=rutina, ejercicio=ejercicio)
+        # Dos en la ventana de marzo y uno en abril
+        cls.marzo_5 = CalendarioRutina.objects.create(perfil=cls.perfil, rutina=cls.rutinas[0], fecha=date(2026, 3, 5))
+        cls.marzo_10 = CalendarioRutina.objects.create(perfil=cls.perfil, rutina=cls.rutinas[1], fecha=date(2026, 3, 10))
+        cls.abril_5 = CalendarioRutina.objects.create(perfil=cls.perfil, rutina=cls.rutinas[2], fecha=date(2026, 4, 5))
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        # Todo quedó sincronizado antes del token
+        hace_una_hora = timezone.now() - timedelta(hours=1)
+        Rutina.objects.update(actualizado=hace_una_hora)
+        CalendarioRutina.objects.update(actualizado=hace_una_hora)
+        self.since = (timezone.now() - timedelta(minutes=1)).isoformat()
+
+    def cambios(self, ventana=True):
+        parametros = {"since": self.since}
+        if ventana:
+            parametros.update(start="2026-03-01", end="2026-04-01")
+        request = self.factory.get("/ia/obtener_calendario/", parametros)
+        request.user = self.perfil
+        datos = json.loads(views_calendario.obtener_calendario(request).content)
+        self.assertFalse(datos["completo"])
+        return {e["id"] for e in datos["eventos"]}, datos["eliminados"]
+
+    def editar(self, rutina, ejercicios):
+        request = self.factory.post("/ia/editar_rutina/", json.dumps({
+            "rutina_id": rutina.id, "nombre": "Editada", "ejercicios": [{"id": e.id} for e in ejercicios],
+        }), content_type="application/json")
+        request.user = self.perfil
+        with CaptureQueriesContext(connection) as consultas:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertEqual(views_detalle_rutina.editar_rutina(request).status_code, 200)
+        return [c["sql"] for c in consultas.captured_queries if c["sql"].startswith('UPDATE "RUTINA"')]
+
+    def test_sin_cambios(self):
+        self.assertEqual(self.cambios(), (set(), []))
+
+    def test_borrados_y_movidos_segun_la_ventana(self):
+        ids = (self.marzo_5.id, self.marzo_10.id, self.abril_5.id)
+        self.marzo_5.delete()
+        self.abril_5.delete()
+        movido = CalendarioRutina.objects.get(pk=self.marzo_10.pk)
+        movido.fecha = date(2026, 4, 10)
+        movido.save()
+
+        # Marzo tenía el borrado y el que se fue a abril; el borrado de abril no le toca
+        eventos, eliminados = self.cambios()
+        self.assertEqual(eventos, set())
+        self.assertEqual(sorted(eliminados), sorted(ids[:2]))
+
+        # Sin ventana: el movido sigue existiendo y llega como evento, no como eliminado
+        eventos, eliminados = self.cambios(ventana=False)
+        self.assertEqual(eventos, {ids[1]})
+        self.assertEqual(sorted(eliminados), [ids[0], ids[2]])
+
+    def test_cambios_fuera_de_la_ventana_no_llegan(self):
+        evento = CalendarioRutina.objects.get(pk=self.abril_5.pk)
+        evento.completada = True
+        evento.save()
+        self.editar(self.rutinas[2], self.ejercicios)
+        self.assertEqual(self.cambios(), (set(), []))
+
+    def test_editar_rutina_marca_sus_eventos_una_vez(self):
+        # El UPDATE de la rutina no crece con la cantidad de ejercicios
+        con_uno = self.editar(self.rutinas[0], self.ejercicios[:1])
+        con_tres = self.editar(self.rutinas[1], self.ejercicios)
+        self.assertEqual(len(con_uno), len(con_tres))
+        self.assertEqual(len([sql for sql in con_tres if '"ACTUALIZADO"' in sql]), 2)   # save() y la marca
+
+        self.assertEqual(self.cambios(), ({self.marzo_5.id, self.marzo_10.id}, []))
+        self.assertEqual(RutinaEjercicio.objects.filter(rutina=self.rutinas[1]).count(), 3)
+
+
+# ==========================================================
+# Programar una rutina en muchas fechas
+# ==========================================================
+class ProgramarRutinaCalendarioTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        nivel = NivelDificultad.objects.create(nombre="Intermedio")
+        cls.perfil = Perfil.objects.create_user(username="programa", password="clave")
+        cls.rutina = Rutina.objects.create(nombre="Piernas", perfil=cls.perfil, nivel_dificultad=nivel)
+        cls.otra = Rutina.objects.create(nombre="Espalda", perfil=cls.perfil, nivel_dificultad=nivel)
+        # Lunes 4 de mayo ya tiene esta rutina y el miércoles 6 otra
+        CalendarioRutina.objects.create(perfil=cls.perfil, rutina=cls.rutina, fecha=date(2026, 5, 4))
+        cls.conflicto = CalendarioRutina.objects.create(perfil=cls.perfil, rutina=cls.otra, fecha=date(2026, 5, 6))
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def programar(self, **cuerpo):
+        cuerpo.setdefault("rutina_id", self.rutina.id)
+        request = self.factory.post("/ia/calendario/programar/", json.dumps(cuerpo), content_type="application/json")
+        request.user = self.perfil
+        respuesta = views_calendario.programar_rutina_calendario(request)
+        return respuesta.status_code, json.loads(respuesta.content)
+
+    def rutinas_del_dia(self, dia):
+        return sorted(
+            CalendarioRutina.objects.filter(perfil=self.perfil, fecha=date(2026, 5, dia)).values_list("rutina_id", flat=True)
+        )
+
+    def test_omitir_deja_los_dias_ocupados(self):
+        estado, datos = self.programar(fechas=["2026-05-04", "2026-05-05", "2026-05-06"], hora="18:30", notas="Fuerte")
+        self.assertEqual(estado, 200)
+        self.assertEqual(datos["creadas"], ["2026-05-05"])
+        self.assertEqual(datos["duplicadas"], ["2026-05-04"])
+        self.assertEqual(datos["omitidas"], ["2026-05-06"])
+        self.assertEqual(datos["reemplazadas"], 0)
+        self.assertEqual(self.rutinas_del_dia(6), [self.otra.id])
+        evento = CalendarioRutina.objects.get(perfil=self.perfil, fecha=date(2026, 5, 5))
+        self.assertEqual((evento.rutina_id, str(evento.hora), evento.notas), (self.rutina.id, "18:30:00", "Fuerte"))
+
+    def test_reemplazar_borra_la_otra_rutina(self):
+        estado, datos = self.programar(fechas=["2026-05-04", "2026-05-05", "2026-05-06"], conflictos="reemplazar")
+        self.assertEqual(estado, 200)
+        self.assertEqual(datos["creadas"], ["2026-05-05", "2026-05-06"])
+        self.assertEqual(datos["duplicadas"], ["2026-05-04"])
+        self.assertEqual(datos["reemplazadas"], 1)
+        self.assertFalse(CalendarioRutina.objects.filter(pk=self.conflicto.pk).exists())
+        self.assertEqual(self.rutinas_del_dia(6), [self.rutina.id])
+        self.assertEqual(self.rutinas_del_dia(4), [self.rutina.id])
+
+    def test_agregar_deja_las_dos_rutinas(self):
+        estado, datos = self.programar(fechas=["2026-05-04", "2026-05-05", "2026-05-06"], conflictos="agregar")
+        self.assertEqual(estado, 200)
+        self.assertEqual(datos["creadas"], ["2026-05-05", "2026-05-06"])
+        self.assertEqual((datos["duplicadas"], datos["omitidas"], datos["reemplazadas"]), (["2026-05-04"], [], 0))
+        self.assertEqual(self.rutinas_del_dia(6), sorted([self.rutina.id, self.otra.id]))
+
+    def test_recurrencia(self):
+        # Lunes y miércoles por dos semanas desde el lunes 4: el 4 y el 6 ya están ocupados
+        estado, datos = self.programar(recurrencia={"dias": ["lunes", 2], "desde": "2026-05-04", "semanas": 2})
+        self.assertEqual(estado, 200)
+        self.assertEqual(datos["creadas"], ["2026-05-11", "2026-05-13"])
+        self.assertEqual(datos["duplicadas"], ["2026-05-04"])
+        self.assertEqual(datos["omitidas"], ["2026-05-06"])
+
+        # Con fecha final (inclusive): los viernes de mayo
+        estado, datos = self.programar(recurrencia={"dias": ["viernes"], "desde": "2026-05-01", "hasta": "2026-05-29"})
+        self.assertEqual(datos["creadas"], ["2026-05-01", "2026-05-08", "2026-05-15", "2026-05-22", "2026-05-29"])
+
+    def test_peticiones_invalidas(self):
+        for cuerpo in (
+            {"fechas": ["2026-05-04"], "conflictos": "mezclar"},
+            {"fechas": []},
+            {"fechas": ["04/05/2026"]},
+            {"recurrencia": {"dias": ["domingo"], "desde": "2026-05-10", "hasta": "2026-05-01"}},
+            {"recurrencia": {"dias": ["feriado"], "desde": "2026-05-01", "semanas": 1}},
+        ):
+            with self.subTest(cuerpo=cuerpo):
+                self.assertEqual(self.programar(**cuerpo)[0], 400)
+        self.assertEqual(CalendarioRutina.objects.filter(perfil=self.perfil).count(), 2)
+
+    def test_consultas_no_dependen_de_las_fechas(self):
+        def consultas(fechas):
+            with CaptureQueriesContext(connection) as capturadas:
+                estado, datos = self.programar(fechas=[f.isoformat() for f in fechas])
+            self.assertEqual((estado, len(datos["creadas"])), (200, len(fechas)))
+            return len(capturadas)
+
+        # La primera vez del mes además crea su fila de resumen
+        junio = [date(2026, 6, dia) for dia in range(1, 31)]
+        consultas(junio[:1])
+        self.assertEqual(consultas(junio[1:3]), consultas(junio[3:]))
+
+
+# ==========================================================
+# Resumen mensual de adherencia
+# ==========================================================
+class AdherenciaMensualTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        nivel = NivelDificultad.objects.create(nombre="Intermedio")
+        cls.perfil = Perfil.objects.create_user(username="adherencia", password="clave")
+        cls.rutinas = [
+            Rutina.objects.create(nombre=f"Rutina {i}", perfil=cls.perfil, nivel_dificultad=nivel) for i in range(2)
+        ]
+        cls.eventos = [
+            CalendarioRutina.objects.create(perfil=cls.perfil, rutina=cls.rutinas[0], fecha=date(2026, 3, 3)),
+            CalendarioRutina.objects.create(
+                perfil=cls.perfil, rutina=cls.rutinas[1], fecha=date(2026, 3, 3), completada=True
+            ),
+            CalendarioRutina.objects.create(perfil=cls.perfil, rutina=cls.rutinas[0], fecha=date(2026, 3, 20)),
+        ]
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def post(self, vista, cuerpo):
+        request = self.factory.post("/ia/calendario/", json.dumps(cuerpo), content_type="application/json")
+        request.user = self.perfil
+        self.assertEqual(vista(request).status_code, 200)
+
+    def assertCoincideConReconstruir(self, *meses):
+        """El resumen mantenido por diferencias es el mismo que se rearma desde el calendario."""
+        mantenidos = [adherencia_mensual.del_mes(self.perfil.id, 2026, mes) for mes in meses]
+        adherencia_mensual.reconstruir([self.perfil.id])
+        self.assertEqual(mantenidos, [adherencia_mensual.del_mes(self.perfil.id, 2026, mes) for mes in meses])
+        return mantenidos
+
+    def test_estado_inicial(self):
+        marzo, = self.assertCoincideConReconstruir(3)
+        self.assertEqual(marzo, {"programadas": 3, "completadas": 1, "dias_completados": {"3": 1}})
+
+    def test_marcar_y_desmarcar_completada(self):
+        self.post(views_calendario.actualizar_rutina_calendario, {"id": self.eventos[0].id, "completada": True})
+        marzo, = self.assertCoincideConReconstruir(3)
+        self.assertEqual(marzo, {"programadas": 3, "completadas": 2, "dias_completados": {"3": 2}})
+
+        for evento in self.eventos[:2]:
+            self.post(views_calendario.actualizar_rutina_calendario, {"id": evento.id, "completada": False})
+        marzo, = self.assertCoincideConReconstruir(3)
+        self.assertEqual(marzo, {"programadas": 3, "completadas": 0, "dias_completados": {}})
+
+    def test_mover_a_otro_mes(self):
+        self.post(views_calendario.mover_rutina_calendario, {"id": self.eventos[1].id, "nueva_fecha": "2026-04-07T00:00:00"})
+        marzo, abril = self.assertCoincideConReconstruir(3, 4)
+        self.assertEqual(marzo, {"programadas": 2, "completadas": 0, "dias_completados": {}})
+        self.assertEqual(abril, {"programadas": 1, "completadas": 1, "dias_completados": {"7": 1}})
+
+    def test_borrar(self):
+        self.eventos[1].delete()
+        CalendarioRutina.objects.filter(pk=self.eventos[2].pk).delete()
+        marzo, = self.assertCoincideConReconstruir(3)
+        self.assertEqual(marzo, {"programadas": 1, "completadas": 0, "dias_completados": {}})
+
+    def test_bulk_create_con_registrar_nuevas(self):
+        fechas = [date(2026, 3, 25), date(2026, 4, 1), date(2026, 4, 2)]
+        CalendarioRutina.objects.bulk_create([
+            CalendarioRutina(perfil=self.perfil, rutina=self.rutinas[1], fecha=fecha, completada=True) for fecha in fechas
+        ])
+        adherencia_mensual.registrar_nuevas(self.perfil.id, fechas, completada=True)
+        marzo, abril = self.assertCoincideConReconstruir(3, 4)
+        self.assertEqual(marzo, {"programadas": 4, "completadas": 2, "dias_completados": {"3": 1, "25": 1}})
+        self.assertEqual(abril, {"programadas": 2, "completadas": 2, "dias_completados": {"1": 1, "2": 1}})
+
+
+# ==========================================================
+# Micro-lotes del recomendador
+# ==========================================================
+class RuntimeFalso:
+    """Puntúa cada fila codificada como (versión, primer valor)."""
+
+    def __init__(self, version):
+        self.version = version
+
+    def puntuar_matriz(self, X):
+        return [(self.version, float(fila[0])) for fila in X]
+
+
+class PlanificadorLotesTests(SimpleTestCase):
+
+    def puntuar_concurrente(self, planificador, pedidos):
+        with ThreadPoolExecutor(max_workers=len(pedidos)) as ejecutor:
+            return list(ejecutor.map(planificador.puntuar, pedidos))
+
+    def test_cada_llamador_recibe_su_fila(self):
+        lotes = []
+
+        def duplicar(filas):
+            lotes.append(len(filas))
+            time.sleep(0.005)
+            return [fila * 2 for fila in filas]
+
+        planificador = PlanificadorLotes(duplicar, ventana_ms=20, max_lote=8)
+        pedidos = list(range(40))
+        self.assertEqual(self.puntuar_concurrente(planificador, pedidos), [p * 2 for p in pedidos])
+        self.assertEqual(sum(lotes), len(pedidos))
+        self.assertLessEqual(max(lotes), 8)
+        self.assertGreater(max(lotes), 1)
+
+    def test_lote_con_dos_runtimes(self):
+        # Tras un cambio de versión un lote puede traer filas codificadas por ambos
+        runtimes = [RuntimeFalso("v1"), RuntimeFalso("v2")]
+        pedidos = [(runtimes[i % 2], np.array([[float(i)]]), {"fila": i}) for i in range(24)]
+        planificador = PlanificadorLotes(_puntuar_lote, ventana_ms=20, max_lote=32)
+
+        with mock.patch.object(registro, "_sombra", None):
+            resultados = self.puntuar_concurrente(planificador, pedidos)
+
+        self.assertEqual(resultados, [(runtime.version, X[0, 0]) for runtime, X, _ in pedidos])
+
+    def test_lote_incompleto_falla_a_todos(self):
+        planificador = PlanificadorLotes(lambda filas: filas[:-1], ventana_ms=20, max_lote=8)
+        futuros = [planificador.enviar(i) for i in range(4)]
+        for futuro in futuros:
+            with self.assertRaises(RuntimeError):
+                futuro.result(timeout=5)
+
+    def test_timeout_no_cuelga(self):
+        liberar = threading.Event()
+
+        def bloqueada(filas):
+            liberar.wait(5)
+            return filas
+
+        planificador = PlanificadorLotes(bloqueada, ventana_ms=1, max_lote=8, timeout_s=0.1)
+        t0 = time.monotonic()
+        try:
+            with self.assertRaises(FuturoVencido):
+                planificador.puntuar(1)
+        finally:
+            liberar.set()
+        self.assertLess(time.monotonic() - t0, 2)
+        # El hilo sigue atendiendo después del lote lento
+        self.assertEqual(planificador.puntuar(2, timeout=5), 2)
+
+
+# ==========================================================
+# Cachés LRU del recomendador
+# ==========================================================
+class CacheLRUTests(SimpleTestCase):
+
+    def test_expulsa_el_menos_usado(self):
+        cache = CacheLRU(max_items=2)
+        cache.guardar("a", 1)
+        cache.guardar("b", 2)
+        cache.obtener("a")          # "b" pasa a ser el menos usado
+        cache.guardar("c", 3)
+        self.assertIsNone(cache.obtener("b"))
+        self.assertEqual((cache.obtener("a"), cache.obtener("c")), (1, 3))
+        self.assertEqual(cache.estadisticas()["expulsiones"], 1)
+
+    def test_devuelve_copias(self):
+        cache = CacheLRU(max_items=4)
+        valor = {"top3": [1, 2, 3]}
+        cache.guardar("a", valor)
+        valor["top3"].append(4)
+        cache.obtener("a")["top3"].clear()
+        self.assertEqual(cache.obtener("a"), {"top3": [1, 2, 3]})
+
+    def test_sin_capacidad_no_guarda(self):
+        cache = CacheLRU(max_items=0)
+        cache.guardar("a", 1)
+        self.assertIsNone(cache.obtener("a"))
+
+    def test_vencimiento(self):
+        cache = CacheLRUConVencimiento(max_items=4, ttl_s=10)
+        with mock.patch("IA.cache_recomendaciones.time.monotonic", return_value=100.0):
+            cache.guardar("a", 1)
+        with mock.patch("IA.cache_recomendaciones.time.monotonic", return_value=109.9):
+            self.assertEqual(cache.obtener("a"), 1)
+        with mock.patch("IA.cache_recomendaciones.time.monotonic", return_value=110.0):
+            self.assertIsNone(cache.obtener("a"))
+        self.assertEqual(cache.estadisticas()["expiradas"], 1)
+        self.assertEqual(cache.estadisticas()["items"], 0)
+
+    def test_clave_por_version(self):
+        X = np.array([[0.1, -0.0, 3.000001]])
+        self.assertEqual(clave_vector("v1", X), clave_vector("v1", np.array([[0.1, 0.0, 3.0]])))
+        self.assertNotEqual(clave_vector("v1", X), clave_vector("v2", X))
+
+        cache = CacheLRU()
+        cache.guardar(clave_vector("v1", X), "de v1")
+        self.assertIsNone(cache.obtener(clave_vector("v2", X)))
+
+
+# ==========================================================
+# Historial del chat en la BD
+# ==========================================================
+class HistorialChatTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.perfil = Perfil.objects.create_user(username="chat", password="clave")
+
+    def peticion(self):
+        request = RequestFactory().post("/ia/chat_api/")
+        request.user = self.perfil
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+        return request
+
+    def turnos(self, n):
+        mensajes = []
+        for i in range(n):
+            mensajes += [{"role": "user", "content": f"pregunta {i}"}, {"role": "assistant", "content": f"respuesta {i}"}]
+        return mensajes
+
+    def test_ventana_acotada(self):
+        conversacion = ConversacionChat.objects.create(perfil=self.perfil)
+        mensajes = self.turnos(5)
+        historial_chat.agregar_mensajes(conversacion.id, mensajes)
+
+        with self.assertNumQueries(1):
+            historial = historial_chat.cargar_historial(conversacion.id, 4)
+        # Los últimos 4, en orden cronológico
+        self.assertEqual(historial, mensajes[-4:])
+
+    def test_conversacion_de_la_sesion(self):
+        request = self.peticion()
+        conversacion_id = historial_chat.conversacion_actual(request, 4)
+        self.assertEqual(ConversacionChat.objects.get(pk=conversacion_id).perfil, self.perfil)
+        with self.assertNumQueries(0):
+            self.assertEqual(historial_chat.conversacion_actual(request, 4), conversacion_id)
+
+        historial_chat.reiniciar(request)
+        self.assertNotEqual(historial_chat.conversacion_actual(request, 4), conversacion_id)
+
+    def test_migra_el_historial_de_la_sesion(self):
+        request = self.peticion()
+        antiguo = self.turnos(3)
+        request.session[historial_chat.SESION_HISTORIAL_ANTIGUO] = antiguo
+
+        conversacion_id = historial_chat.conversacion_actual(request, 4)
+        self.assertNotIn(historial_chat.SESION_HISTORIAL_ANTIGUO, request.session)
+        self.assertEqual(historial_chat.cargar_historial(conversacion_id, 10), antiguo[-4:])
+
+    def test_turno_completo_sincrono(self):
+        request = self.peticion()
+        conversacion_id = historial_chat.conversacion_actual(request, 4)
+        turno = self.turnos(1)
+        with self.assertNumQueries(1):
+            historial_chat.agregar_mensajes(conversacion_id, turno)
+        self.assertEqual(
+            list(MensajeChat.objects.filter(conversacion_id=conversacion_id).order_by("id").values_list("rol", flat=True)),
+            ["user", "assistant"],
+        )
+        self.assertEqual(historial_chat.cargar_historial(conversacion_id, 4), turno)
+
+    async def test_turno_completo_async(self):
+        request = self.peticion()
+        conversacion_id = await historial_chat.aconversacion_actual(request, 4)
+        self.assertEqual(await historial_chat.aconversacion_actual(request, 4), conversacion_id)
+
+        turnos = self.turnos(3)
+        for i in range(0, len(turnos), 2):
+            await historial_chat.aagregar_mensajes(conversacion_id, turnos[i:i + 2])
+        self.assertEqual(await historial_chat.acargar_historial(conversacion_id, 4), turnos[-4:])
+        self.assertEqual(await MensajeChat.objects.filter(conversacion_id=conversacion_id).acount(), 6)
+
+        await historial_chat.areiniciar(request)
+        self.assertNotIn(historial_chat.SESION_CONVERSACION, request.session)
+        self.assertNotEqual(await historial_chat.aconversacion_actual(request, 4), conversacion_id)
+
+
+# ==========================================================
+# Ventana de contexto con presupuesto de tokens
+# ==========================================================
+class ArmarContextoTests(SimpleTestCase):
+
+    sistema = "Eres un entrenador."
+    nuevo = {"role": "user", "content": "¿Qué entreno hoy?"}
+
+    def turnos(self, n, largo=40):
+        mensajes = []
+        for i in range(n):
+            mensajes += [
+                {"role": "user", "content": f"pregunta {i} " + "x" * largo},
+                {"role": "assistant", "content": f"respuesta {i} " + "y" * largo},
+            ]
+        return mensajes
+
+    def test_todo_cabe(self):
+        anteriores = self.turnos(2)
+        mensajes, tokens, fuera = armar_contexto(self.sistema, None, anteriores, self.nuevo, 10_000)
+        self.assertEqual(mensajes, [{"role": "system", "content": self.sistema}] + anteriores + [self.nuevo])
+        self.assertEqual(tokens, sum(tokens_mensaje(m) for m in mensajes))
+        self.assertEqual(fuera, 0)
+
+    def test_sobre_el_presupuesto_quedan_los_recientes(self):
+        anteriores = self.turnos(10)
+        presupuesto = 120
+        mensajes, tokens, fuera = armar_contexto(self.sistema, None, anteriores, self.nuevo, presupuesto)
+
+        self.assertLessEqual(tokens, presupuesto)
+        self.assertEqual(mensajes[0]["role"], "system")
+        self.assertEqual(mensajes[-1], self.nuevo)
+        # Lo que queda es el final de la conversación, empezando por una pregunta
+        recientes = mensajes[1:-1]
+        self.assertTrue(recientes)
+        self.assertEqual(recientes, anteriores[fuera:])
+        self.assertEqual(recientes[0]["role"], "user")
+        self.assertGreater(fuera, 0)
+
+    def test_resumen_va_en_el_mensaje_de_sistema(self):
+        mensajes, _, _ = armar_contexto(self.sistema, "Tiene una lesión de rodilla.", [], self.nuevo, 10_000)
+        self.assertIn("Tiene una lesión de rodilla.", mensajes[0]["content"])
+        self.assertTrue(mensajes[0]["content"].startswith(self.sistema))
+
+    def test_sistema_y_mensaje_nuevo_siempre_van(self):
+        anteriores = self.turnos(3)
+        mensajes, _, fuera = armar_contexto(self.sistema, None, anteriores, self.nuevo, 1)
+        self.assertEqual(mensajes, [{"role": "system", "content": self.sistema}, self.nuevo])
+        self.assertEqual(fuera, len(anteriores))
+
+    def test_marca_hasta_donde_resumir(self):
+        gestor = GestorContexto(presupuesto_tokens=120, min_para_resumir=6)
+        anteriores = self.turnos(10)
+        # Como las devuelve la consulta: (id, rol, contenido), de la más nueva a la más vieja
+        filas = [(i + 1, m["role"], m["content"]) for i, m in enumerate(anteriores)][::-1]
+
+        contexto = gestor._contexto(self.sistema, {"resumen": None}, filas, self.nuevo)
+        fuera = len(anteriores) - (len(contexto.mensajes) - 2)
+        self.assertGreaterEqual(fuera, 6)
+        # El último mensaje que quedó fuera de la ventana es el que se pliega en el resumen
+        self.assertEqual(contexto.resumir_hasta_id, fuera)
+        self.assertFalse(contexto.primer_turno)
+
+        poco = GestorContexto(presupuesto_tokens=10_000, min_para_resumir=6)
+        self.assertIsNone(poco._contexto(self.sistema, {"resumen": None}, filas, self.nuevo).resumir_hasta_id)
+        self.assertTrue(poco._contexto(self.sistema, {"resumen": None}, [], self.nuevo).primer_turno)
+
+
+# ==========================================================
+# Caché de respuestas del chat
+# ==========================================================
+class CacheRespuestasChatTests(SimpleTestCase):
+
+    def setUp(self):
+        self.cache = CacheRespuestasChat(max_items=8, ttl_s=60)
+        self.request = RequestFactory().post("/ia/chat_api/")
+
+    def contexto(self, pregunta, sistema="Eres un entrenador.", primer_turno=True):
+        mensajes = [{"role": "system", "content": sistema}, {"role": "user", "content": pregunta}]
+        return Contexto(mensajes, 0, primer_turno=primer_turno)
+
+    def test_normalizacion(self):
+        self.assertEqual(
+            normalizar_pregunta("¿Cuántas series hago para pecho?"),
+            normalizar_pregunta("cuantas series hago para el PECHO"),
+        )
+        self.assertEqual(normalizar_pregunta("pecho y espalda"), normalizar_pregunta("espalda, pecho"))
+        self.assertNotEqual(normalizar_pregunta("series para pecho"), normalizar_pregunta("series para pierna"))
+        self.assertEqual(normalizar_pregunta("¿¡de la!?"), "")
+
+    def test_misma_clave_para_preguntas_equivalentes(self):
+        clave = self.cache.clave(self.request, self.contexto("¿Cuántas series hago para pecho?"), "phi3")
+        self.assertIsNotNone(clave)
+        self.assertEqual(clave, self.cache.clave(self.request, self.contexto("cuantas series hago para el pecho"), "phi3"))
+
+    def test_modelo_y_sistema_cambian_la_clave(self):
+        pregunta = "¿Cuántas series hago para pecho?"
+        base = self.cache.clave(self.request, self.contexto(pregunta), "phi3")
+        self.assertNotEqual(base, self.cache.clave(self.request, self.contexto(pregunta), "llama3"))
+        self.assertNotEqual(base, self.cache.clave(self.request, self.contexto(pregunta, sistema="Otro prompt."), "phi3"))
+
+    def test_solo_el_primer_turno(self):
+        self.assertIsNone(self.cache.clave(self.request, self.contexto("hola coach", primer_turno=False), "phi3"))
+        sin_cache = RequestFactory().post("/ia/chat_api/?sin_cache=1")
+        self.assertIsNone(self.cache.clave(sin_cache, self.contexto("hola coach"), "phi3"))
+        self.assertIsNone(self.cache.clave(self.request, self.contexto("x " * 200), "phi3"))
+        self.assertIsNone(self.cache.clave(self.request, self.contexto("¿de la?"), "phi3"))
+        self.assertEqual(self.cache.estadisticas()["omitidas"], 4)
+
+    def test_guardar_y_obtener(self):
+        clave = self.cache.clave(self.request, self.contexto("rutina para principiantes"), "phi3")
+        self.cache.guardar(clave, "Empieza con tres días.")
+        otra = self.cache.clave(self.request, self.contexto("¿Rutina para los principiantes?"), "phi3")
+        self.assertEqual(self.cache.obtener(otra), "Empieza con tres días.")
+
+
+# ==========================================================
+# Control de admisión del chat contra un Ollama falso
+# ==========================================================
+class ControlAdmisionTests(SimpleTestCase):
+
+    mensajes = [{"role": "user", "content": "¿Cuántas series hago?"}]
+
+    def setUp(self):
+        import ollama
+
+        self.falso = ServidorOllamaFalso(latencia_inicial_s=0.15, latencia_token_s=0.0).iniciar()
+        self.addCleanup(self.falso.detener)
+        self.cliente = ollama.Client(host=self.falso.url)
+        self._lock = threading.Lock()
+        self.activos = 0
+        self.pico = 0
+
+    def entrar(self):
+        with self._lock:
+            self.activos += 1
+            self.pico = max(self.pico, self.activos)
+
+    def salir(self):
+        with self._lock:
+            self.activos -= 1
+
+    def chat(self, control, usuario):
+        control.admitir(usuario)
+        with control.turno():
+            self.entrar()
+            try:
+                return self.cliente.chat(model="falso", messages=self.mensajes, stream=False)["message"]["content"]
+            finally:
+                self.salir()
+
+    async def achat(self, control, usuario, cliente):
+        control.admitir(usuario)
+        async with control.aturno():
+            self.entrar()
+            try:
+                return (await cliente.chat(model="falso", messages=self.mensajes, stream=False))["message"]["content"]
+            finally:
+                self.salir()
+
+    def esperar(self, condicion):
+        limite = time.monotonic() + 5
+        while not condicion():
+            self.assertLess(time.monotonic(), limite, "el control no llegó al estado esperado")
+            time.sleep(0.005)
+
+    def assertSinCuposTomados(self, control):
+        estadisticas = control.estadisticas()
+        self.assertEqual((estadisticas["en_curso"], estadisticas["esperando"]), (0, 0))
+        self.assertFalse(control._cola)
+        self.assertFalse(control._reservas)
+
+    def test_cola_llena_responde_503(self):
+        control = ControlAdmision(max_concurrencia=1, max_cola=1, espera_max_s=5, limite_por_minuto=0)
+        with ThreadPoolExecutor(max_workers=2) as ejecutor:
+            primero = ejecutor.submit(self.chat, control, "u1")
+            self.esperar(lambda: control.en_curso == 1)
+            segundo = ejecutor.submit(self.chat, control, "u2")
+            self.esperar(lambda: control.esperando == 1)
+
+            with self.assertRaises(ChatOcupado) as ocupado:
+                control.admitir("u3")
+            respuesta = respuesta_ocupado(ocupado.exception)
+            self.assertEqual(respuesta.status_code, 503)
+            self.assertGreaterEqual(int(respuesta["Retry-After"]), 1)
+
+            self.assertEqual(primero.result(), self.falso.respuesta)
+            self.assertEqual(segundo.result(), self.falso.respuesta)
+        self.assertEqual(control.rechazos["cola"], 1)
+        self.assertSinCuposTomados(control)
+
+    def test_limite_por_usuario_responde_429(self):
+        control = ControlAdmision(max_concurrencia=2, max_cola=8, espera_max_s=5, limite_por_minuto=2)
+        for _ in range(2):
+            self.chat(control, "u1")
+
+        with self.assertRaises(ChatOcupado) as ocupado:
+            self.chat(control, "u1")
+        respuesta = respuesta_ocupado(ocupado.exception)
+        self.assertEqual(respuesta.status_code, 429)
+        self.assertTrue(1 <= int(respuesta["Retry-After"]) <= 60)
+
+        # Otro usuario no se ve afectado
+        self.assertEqual(self.chat(control, "u2"), self.falso.respuesta)
+        self.assertEqual(control.rechazos["limite"], 1)
+        self.assertSinCuposTomados(control)
+
+    def test_sync_y_async_comparten_el_cupo(self):
+        import ollama
+
+        control = ControlAdmision(max_concurrencia=2, max_cola=32, espera_max_s=10, limite_por_minuto=0)
+
+        async def varios_async():
+            cliente = ollama.AsyncClient(host=self.falso.url)
+            return await asyncio.gather(*(self.achat(control, f"a{i}", cliente) for i in range(4)))
+
+        with ThreadPoolExecutor(max_workers=5) as ejecutor:
+            sincronos = [ejecutor.submit(self.chat, control, f"s{i}") for i in range(4)]
+            asincronos = ejecutor.submit(asyncio.run, varios_async())
+            respuestas = [f.result() for f in sincronos] + asincronos.result()
+
+        self.assertEqual(respuestas, [self.falso.respuesta] * 8)
+        self.assertEqual(self.pico, 2)
+        self.assertEqual(control.admitidas, 8)
+        self.assertSinCuposTomados(control)
+
+    def test_timeout_y_cancelacion_no_pierden_cupos(self):
+        control = ControlAdmision(max_concurrencia=1, max_cola=8, espera_max_s=0.1, limite_por_minuto=0)
+        self.falso.latencia_inicial_s = 0.4
+
+        with ThreadPoolExecutor(max_workers=1) as ejecutor:
+            ocupado = ejecutor.submit(self.chat, control, "u1")
+            self.esperar(lambda: control.en_curso == 1)
+
+            # Vence la espera (síncrona y async) mientras el cupo está tomado
+            with self.assertRaises(ChatOcupado) as vencido:
+                self.chat(control, "u2")
+            self.assertEqual(vencido.exception.motivo, "espera")
+
+            async def vencer_async():
+                async with control.aturno():
+                    pass
+
+            with self.assertRaises(ChatOcupado):
+                asyncio.run(vencer_async())
+            ocupado.result()
+
+        self.assertEqual(control.rechazos["espera"], 2)
+        self.assertSinCuposTomados(control)
+
+        async def cancelar():
+            control.espera_max_s = 5
+            entradas = []
+
+            async def esperar_turno():
+                async with control.aturno():
+                    entradas.append(1)
+
+            # Cancelado mientras espera en la cola
+            turno = control.turno()
+            turno.__enter__()
+            tarea = asyncio.create_task(esperar_turno())
+            await asyncio.sleep(0.01)
+            tarea.cancel()
+            await asyncio.gather(tarea, return_exceptions=True)
+            self.assertEqual(control.esperando, 0)
+
+            # Cancelado justo después de que se le cedió el cupo
+            tarea = asyncio.create_task(esperar_turno())
+            await asyncio.sleep(0.01)
+            turno.__exit__(None, None, None)
+            tarea.cancel()
+            await asyncio.gather(tarea, return_exceptions=True)
+
+        asyncio.run(cancelar())
+        self.assertSinCuposTomados(control)
+        # El único cupo sigue disponible
+        self.assertEqual(self.chat(control, "u3"), self.falso.respuesta)
+
+
+# ==========================================================
+# Salud del chat (endpoint sin sesión)
+# ==========================================================
+class SaludChatTests(SimpleTestCase):
+
+    def setUp(self):
+        self.falso = ServidorOllamaFalso(latencia_inicial_s=0, latencia_token_s=0).iniciar()
+        self.addCleanup(self.falso.detener)
+        self.backend = BackendChat(host=self.falso.url, modelo="falso", salud_cache_s=60)
+        self.backend.calentar()
+
+    def salud(self):
+        request = RequestFactory().get("/ia/chat_api/salud/")
+        with mock.patch.object(chat_virtual, "backend_chat", self.backend):
+            return chat_virtual.salud_chat(request)
+
+    def test_reutiliza_la_consulta_a_ollama(self):
+        with mock.patch.object(self.backend, "_cargado_en_ollama", wraps=self.backend._cargado_en_ollama) as ps:
+            for _ in range(20):
+                respuesta = self.salud()
+                self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(ps.call_count, 1)
+        # Solo el estado: sin host ni errores para quien no inició sesión
+        self.assertEqual(json.loads(respuesta.content), {"cargado": True, "listo": True})
+
+    def test_informa_la_descarga_al_vencer(self):
+        self.assertEqual(self.salud().status_code, 200)
+        self.falso.descargar()
+        self.assertEqual(self.salud().status_code, 200)   # todavía la consulta anterior
+        self.backend.salud_cache_s = 0
+        self.assertEqual(self.salud().status_code, 503)
@@ -15,6 +15,7 @@ urlpatterns = [
     path("recomendar/", views.recomendar_rutina, name="recomendar_rutina"),
     path("guardar_rutina/", views.guardar_rutina, name="guardar_rutina"),
     path("recomendador/wizard/", views.recomendador_wizard_view, name="recomendador_wizard"),
+    path("modelo/estado/", views.estado_modelo, name="estado_modelo"),
 
     # Interfaz principal
     path("recomendador/", views.recomendador_view, name="recomendador_view"),
@@ -29,6 +30,7 @@ urlpatterns = [
     path("calendario/registrar/", views_calendario.registrar_rutina_calendario, name="registrar_rutina_calendario"),
     path("calendario/eventos/", views_calendario.obtener_calendario, name="obtener_calendario"),
     path("calendario/actualizar/", views_calendario.actualizar_rutina_calendario, name="actualizar_rutina_calendario"),
+    path("calendario/programar/", views_calendario.programar_rutina_calendario, name="programar_rutina_calendario"),
 
     # KPI mensual
     path("calendario/kpi-mensual/", views_calendario.obtener_kpi_mensual, name="obtener_kpi_mensual"),
@@ -5,8 +5,8 @@ from django.shortcuts import render
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
-from django.db import transaction
-from django.db.models import Count
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
 import traceback
 import os
 from google_auth_oauthlib.flow import Flow
@@ -15,7 +15,11 @@ from googleapiclient.discovery import build
 from django.shortcuts import redirect
 from django.conf import settings
 from App.models import Perfil
-from api_ejercicio.models import Rutina, CalendarioRutina, RutinaEjercicio, RutinaGuardada
+from api_ejercicio.models import Rutina, CalendarioRutina, RutinaGuardada
+
+from . import adherencia_mensual, sync_calendario
+from .contenido_rutinas import contenido_rutinas
+from .contexto_usuario import contexto_usuario
 
 # ==========================================================
 # Vista principal del calendario (HTML)
@@ -74,53 +78,96 @@ def registrar_rutina_calendario(request):
 # ==========================================================
 # Obtener eventos del calendario (JSON)
 # ==========================================================
-@login_required
-def obtener_calendario(request):
-    try:
-        perfil = Perfil.objects.get(id=request.user.id)
-        rutinas = (
-            CalendarioRutina.objects
-            .filter(perfil=perfil)
-            .select_related("rutina", "rutina__nivel_dificultad")
-            .order_by("fecha")
-        )
+def _descripcion_ejercicios(ejercicios):
+    return [
+        {"nombre": e["nombre"], "descripcion": e["descripcion"] or "Sin descripción disponible."}
+        for e in ejercicios
+    ]
 
-        eventos = []
-        for r in rutinas:
-            ejercicios_qs = (
-                RutinaEjercicio.objects
-                .filter(rutina=r.rutina)
-                .select_related("ejercicio")
-                .values("ejercicio__nombre", "ejercicio__descripcion")
-            )
 
-            ejercicios = [
-                {
-                    "nombre": e["ejercicio__nombre"],
-                    "descripcion": e["ejercicio__descripcion"] or "Sin descripción disponible."
-                }
-                for e in ejercicios_qs
-            ]
+def _eventos(consulta, perfil_id):
+    """
+    Eventos de FullCalendar para `consulta` (CalendarioRutina del usuario) en
+    a lo más dos consultas: los eventos con su rutina y dueño, y los ejercicios
+    de las rutinas que no estén en contenido_rutinas.
+    """
+    rutinas = list(
+        consulta
+        .select_related("rutina", "rutina__perfil")
+        .only(
+            "id", "fecha", "hora", "completada", "notas",
+            "rutina__id", "rutina__nombre", "rutina__vigente", "rutina__actualizado", "rutina__perfil__username",
+        )
+        .order_by("fecha")
+    )
+    contenido = contenido_rutinas.varias({r.rutina_id: r.rutina.actualizado for r in rutinas})
+    ejercicios = {rutina_id: _descripcion_ejercicios(lista) for rutina_id, lista in contenido.items()}
+
+    eventos = []
+    for r in rutinas:
+        eventos.append({
+            "id": r.id,
+            "title": f"🏋️ {r.rutina.nombre}",
+            "start": r.fecha.strftime("%Y-%m-%d"),
+            "color": "#00b894" if r.completada else "#25e2d7",
+            "textColor": "#003135",
+            "extendedProps": {
+                "completada": r.completada,
+                "notas": r.notas or "",
+                "hora": str(r.hora) if r.hora else "",
+                "ejercicios": ejercicios[r.rutina_id],
+                "rutina_id": r.rutina.id,
+                "propietario": r.rutina.perfil.username,
+                "es_mia": (r.rutina.perfil_id == perfil_id),
+                "vigente": r.rutina.vigente,
+            }
+        })
+    return eventos
+
 
-            eventos.append({
-                "id": r.id,
-                "title": f"🏋️ {r.rutina.nombre}",
-                "start": r.fecha.strftime("%Y-%m-%d"),
-                "color": "#00b894" if r.completada else "#25e2d7",
-                "textColor": "#003135",
-                "extendedProps": {
-                    "completada": r.completada,
-                    "notas": r.notas or "",
-                    "hora": str(r.hora) if r.hora else "",
-                    "ejercicios": ejercicios,
-                    "rutina_id": r.rutina.id,
-                    "propietario": r.rutina.perfil.username,
-                    "es_mia": (r.rutina.perfil_id == request.user.id),
-                    "vigente": r.rutina.vigente,
-                }
+@login_required
+def obtener_calendario(request):
+    """
+    Eventos del usuario. Con `start`/`end` (los manda FullCalendar) solo los de
+    ese rango; sin ellos, todos. La lista va con la cabecera X-Sync-Token.
+    Con `?since=<token>` responde solo los cambios:
+    {"eventos": [...], "eliminados": [ids], "sync_token": "...", "completo": false}
+    ("completo": true si el token venció y `eventos` trae la ventana entera).
+    """
+    try:
+        try:
+            desde, hasta = sync_calendario.ventana(request)
+            since = sync_calendario.leer_token(request)
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        perfil_id = request.user.id
+        token = sync_calendario.nuevo_token()
+        propios = CalendarioRutina.objects.filter(perfil_id=perfil_id)
+        en_ventana = propios.filter(fecha__gte=desde, fecha__lt=hasta) if desde else propios
+
+        if since is None:
+            respuesta = JsonResponse(_eventos(en_ventana, perfil_id), safe=False)
+            respuesta["X-Sync-Token"] = token
+            return respuesta
+
+        if not sync_calendario.token_vigente(since):
+            return JsonResponse({
+                "eventos": _eventos(en_ventana, perfil_id), "eliminados": [], "sync_token": token, "completo": True,
             })
 
-        return JsonResponse(eventos, safe=False)
+        # Cambios dentro de la ventana; los borrados o movidos se avisan solo si
+        # su fecha anterior caía en ella (el cliente los tenía)
+        eventos = _eventos(
+            en_ventana.filter(Q(actualizado__gt=since) | Q(rutina__actualizado__gt=since)), perfil_id
+        )
+        vigentes = {e["id"] for e in eventos}
+        eliminados = [
+            evento_id for evento_id in sync_calendario.eliminados_desde(perfil_id, since, desde, hasta)
+            if evento_id not in vigentes
+        ]
+
+        return JsonResponse({"eventos": eventos, "eliminados": eliminados, "sync_token": token, "completo": False})
     except Exception as e:
         print("🔥 ERROR obtener_calendario:", traceback.format_exc())
         return JsonResponse({"error": str(e)}, status=500)
@@ -215,8 +262,9 @@ def actualizar_rutina_calendario(request):
         if not rutina_id:
             return JsonResponse({"success": False, "error": "ID de evento no proporcionado."}, status=400)
 
+        # Con la fila bloqueada: dos marcas simultáneas no suman dos veces al resumen mensual
         with transaction.atomic():
-            evento = CalendarioRutina.objects.get(id=rutina_id, perfil=perfil)
+            evento = CalendarioRutina.objects.select_for_update().get(id=rutina_id, perfil=perfil)
             evento.notas = notas
             evento.completada = completada
             evento.save()
@@ -235,32 +283,36 @@ def actualizar_rutina_calendario(request):
 @login_required
 def obtener_kpi_mensual(request):
     try:
-        perfil = Perfil.objects.get(id=request.user.id)
-        hoy = date.today()
+        # ?mes=AAAA-MM (por defecto el mes actual)
+        mes_str = request.GET.get("mes")
+        if mes_str:
+            try:
+                inicio_mes = datetime.strptime(mes_str, "%Y-%m").date()
+            except ValueError:
+                return JsonResponse({"error": "Formato de mes inválido (AAAA-MM)."}, status=400)
+        else:
+            inicio_mes = date.today().replace(day=1)
 
-        inicio_mes = hoy.replace(day=1)
-        if hoy.month == 12:
-            fin_mes = hoy.replace(year=hoy.year + 1, month=1, day=1) - timedelta(days=1)
+        if inicio_mes.month == 12:
+            fin_mes = inicio_mes.replace(year=inicio_mes.year + 1, month=1) - timedelta(days=1)
         else:
-            fin_mes = hoy.replace(month=hoy.month + 1, day=1) - timedelta(days=1)
+            fin_mes = inicio_mes.replace(month=inicio_mes.month + 1) - timedelta(days=1)
 
-        rutinas_mes = CalendarioRutina.objects.filter(
-            perfil=perfil,
-            fecha__range=[inicio_mes, fin_mes]
-        )
+        # Totales ya calculados (IA/adherencia_mensual.py): una fila por perfil y mes
+        resumen = adherencia_mensual.del_mes(request.user.id, inicio_mes.year, inicio_mes.month)
 
-        total = rutinas_mes.count()
-        completadas = rutinas_mes.filter(completada=True).count()
+        total = resumen["programadas"]
+        completadas = resumen["completadas"]
         pendientes = total - completadas
         cumplimiento = round((completadas / total) * 100, 1) if total > 0 else 0
 
-        dias_completados = {}
-        for r in rutinas_mes.filter(completada=True):
-            dia = r.fecha.day
-            dias_completados[dia] = dias_completados.get(dia, 0) + 1
+        dias_completados = {
+            int(dia): n for dia, n in sorted(resumen["dias_completados"].items(), key=lambda d: int(d[0]))
+        }
 
         data = {
-            "mes": hoy.strftime("%B %Y").capitalize(),
+            "mes": inicio_mes.strftime("%B %Y").capitalize(),
+            "periodo": inicio_mes.strftime("%Y-%m"),
             "inicio_mes": inicio_mes.strftime("%d-%m-%Y"),
             "fin_mes": fin_mes.strftime("%d-%m-%Y"),
             "total": total,
@@ -332,20 +384,21 @@ def obtener_rutinas_guardadas(request):
             .order_by("-fecha_guardado")
         )
 
+        guardadas = list(guardadas)
+        contenido = contenido_rutinas.varias({g.rutina_id: g.rutina.actualizado for g in guardadas})
+
         data = []
         for g in guardadas:
-            ejercicios = (
-                RutinaEjercicio.objects
-                .filter(rutina=g.rutina)
-                .select_related("ejercicio")
-                .values("ejercicio__nombre", "ejercicio__descripcion")
-            )
+            ejercicios = [
+                {"ejercicio__nombre": e["nombre"], "ejercicio__descripcion": e["descripcion"]}
+                for e in contenido[g.rutina_id]
+            ]
             data.append({
                 "id": g.rutina.id,
                 "nombre": g.rutina.nombre,
                 "descripcion": g.rutina.descripcion or "",
                 "nivel": g.rutina.nivel_dificultad.nombre if g.rutina.nivel_dificultad else "Sin nivel",
-                "ejercicios": list(ejercicios),
+                "ejercicios": ejercicios,
                 "fecha_guardado": g.fecha_guardado.strftime("%d/%m/%Y"),
             })
 
@@ -471,6 +524,153 @@ def asignar_rutina_guardada(request):
         return JsonResponse({"success": False, "error": str(e)}, status=500)
 
 
+# ==========================================================
+# Programar una rutina en varias fechas (lista o recurrencia)
+# ==========================================================
+DIAS_SEMANA = {
+    "lunes": 0, "martes": 1, "miercoles": 2, "miércoles": 2, "jueves": 3,
+    "viernes": 4, "sabado": 5, "sábado": 5, "domingo": 6,
+}
+
+MAX_FECHAS_PROGRAMAR = getattr(settings, "IA_CALENDARIO_MAX_FECHAS_PROGRAMAR", 366)
+
+
+def _fechas_recurrencia(regla):
+    """
+    Fechas de {"dias": ["lunes", "miercoles", "viernes"] o [0, 2, 4] (lunes = 0),
+    "desde": "AAAA-MM-DD", y "semanas": N o "hasta": "AAAA-MM-DD" (inclusive)}.
+    """
+    dias = set()
+    for dia in regla.get("dias") or []:
+        texto = str(dia).strip().lower()
+        numero = int(texto) if texto.isdigit() else DIAS_SEMANA.get(texto)
+        if numero is None or not 0 <= numero <= 6:
+            raise ValueError(f"Día de la semana inválido: {dia}.")
+        dias.add(numero)
+    if not dias:
+        raise ValueError("La recurrencia necesita al menos un día de la semana.")
+
+    desde = datetime.strptime(regla.get("desde") or "", "%Y-%m-%d").date()
+    if regla.get("hasta"):
+        hasta = datetime.strptime(regla["hasta"], "%Y-%m-%d").date()
+    else:
+        semanas = int(regla.get("semanas") or 0)
+        if semanas < 1:
+            raise ValueError("Indica las semanas o la fecha final de la recurrencia.")
+        hasta = desde + timedelta(weeks=semanas, days=-1)
+    if hasta < desde:
+        raise ValueError("La fecha final es anterior a la inicial.")
+
+    total_dias = (hasta - desde).days + 1
+    if total_dias > MAX_FECHAS_PROGRAMAR * 7:
+        raise ValueError("El rango de la recurrencia es demasiado largo.")
+    return [desde + timedelta(days=i) for i in range(total_dias) if (desde + timedelta(days=i)).weekday() in dias]
+
+
+@csrf_exempt
+@login_required
+@require_http_methods(["POST"])
+def programar_rutina_calendario(request):
+    """
+    Programa una rutina en muchas fechas con una sola petición.
+
+    Cuerpo: {"rutina_id", "fechas": [...]} o {"rutina_id", "recurrencia": {...}}
+    (ver _fechas_recurrencia), más "hora" y "notas" opcionales y
+    "conflictos" para los días que ya tienen otra rutina: "omitir" (por
+    defecto), "reemplazar" o "agregar". Las fechas donde ya está esta misma
+    rutina se omiten siempre. Se resuelve con una consulta de los eventos
+    existentes y un bulk_create, todo en una transacción.
+    """
+    try:
+        data = json.loads(request.body.decode("utf-8"))
+        rutina_id = data.get("rutina_id")
+        conflictos = data.get("conflictos", "omitir")
+        notas = data.get("notas", "")
+        hora = data.get("hora") or None
+
+        if not rutina_id:
+            return JsonResponse({"success": False, "error": "La rutina es obligatoria."}, status=400)
+        if conflictos not in ("omitir", "reemplazar", "agregar"):
+            return JsonResponse({"success": False, "error": "Valor de 'conflictos' inválido."}, status=400)
+
+        try:
+            if data.get("recurrencia"):
+                fechas = _fechas_recurrencia(data["recurrencia"])
+            else:
+                fechas = [datetime.strptime(f, "%Y-%m-%d").date() for f in data.get("fechas") or []]
+            if hora:
+                hora = datetime.strptime(hora[:5], "%H:%M").time()
+        except (ValueError, TypeError, AttributeError) as e:
+            return JsonResponse({"success": False, "error": f"Fechas inválidas: {e}"}, status=400)
+
+        fechas = sorted(set(fechas))
+        if not fechas:
+            return JsonResponse({"success": False, "error": "No hay fechas para programar."}, status=400)
+        if len(fechas) > MAX_FECHAS_PROGRAMAR:
+            return JsonResponse({
+                "success": False, "error": f"Máximo {MAX_FECHAS_PROGRAMAR} fechas por petición."
+            }, status=400)
+
+        rutina = Rutina.objects.get(id=rutina_id)
+        if not rutina.vigente:
+            return JsonResponse({"success": False, "error": "No se puede asignar una rutina desactivada."}, status=400)
+
+        with transaction.atomic():
+            # Una sola consulta para todos los conflictos (índice perfil + fecha)
+            existentes = {}
+            for id_, fecha, otra_rutina_id in (
+                CalendarioRutina.objects
+                .select_for_update()
+                .filter(perfil=request.user, fecha__gte=fechas[0], fecha__lte=fechas[-1])
+                .values_list("id", "fecha", "rutina_id")
+            ):
+                existentes.setdefault(fecha, []).append((id_, otra_rutina_id))
+
+            duplicadas, omitidas, reemplazar, nuevas = [], [], [], []
+            for fecha in fechas:
+                del_dia = existentes.get(fecha, [])
+                if any(otra == rutina.id for _, otra in del_dia):
+                    duplicadas.append(fecha)
+                elif del_dia and conflictos == "omitir":
+                    omitidas.append(fecha)
+                else:
+                    if del_dia and conflictos == "reemplazar":
+                        reemplazar.extend(id_ for id_, _ in del_dia)
+                    nuevas.append(fecha)
+
+            if reemplazar:
+                CalendarioRutina.objects.filter(id__in=reemplazar).delete()
+            CalendarioRutina.objects.bulk_create([
+                CalendarioRutina(perfil=request.user, rutina=rutina, fecha=fecha, hora=hora, notas=notas)
+                for fecha in nuevas
+            ])
+            # bulk_create no emite post_save: el resumen mensual se suma a mano
+            adherencia_mensual.registrar_nuevas(request.user.id, nuevas)
+
+        # Tampoco se entera el contexto del chat
+        contexto_usuario.invalidar([request.user.id])
+
+        return JsonResponse({
+            "success": True,
+            "message": f"La rutina '{rutina.nombre}' fue programada en {len(nuevas)} fecha(s).",
+            "creadas": [f.isoformat() for f in nuevas],
+            "duplicadas": [f.isoformat() for f in duplicadas],
+            "omitidas": [f.isoformat() for f in omitidas],
+            "reemplazadas": len(reemplazar),
+        })
+
+    except Rutina.DoesNotExist:
+        return JsonResponse({"success": False, "error": "Rutina no encontrada."}, status=404)
+    except IntegrityError:
+        # Otra petición agendó la misma rutina en alguna de esas fechas mientras tanto
+        return JsonResponse({
+            "success": False, "error": "El calendario cambió mientras se programaba. Intenta de nuevo."
+        }, status=409)
+    except Exception as e:
+        print("🔥 ERROR programar_rutina_calendario:", traceback.format_exc())
+        return JsonResponse({"success": False, "error": str(e)}, status=500)
+
+
 # ==========================================================
 # TENDENCIAS
 # ==========================================================
@@ -561,10 +761,11 @@ def mover_rutina_calendario(request):
 
         perfil = Perfil.objects.get(id=request.user.id)
 
-        # Buscar el evento existente y actualizar su fecha
-        evento = CalendarioRutina.objects.get(id=evento_id, perfil=perfil)
-        evento.fecha = nueva_fecha
-        evento.save()
+        # Buscar el evento existente y actualizar su fecha (el resumen mensual cambia en la misma transacción)
+        with transaction.atomic():
+            evento = CalendarioRutina.objects.select_for_update().get(id=evento_id, perfil=perfil)
+            evento.fecha = nueva_fecha
+            evento.save()
 
         return JsonResponse({"success": True, "message": "Rutina movida correctamente."})
 
@@ -662,11 +863,10 @@ def sincronizar_rutina_google(request):
         service = build('calendar', 'v3', credentials=creds)
 
         # Construir descripción detallada con los ejercicios
-        ejercicios = RutinaEjercicio.objects.filter(rutina=rutina)
         desc_texto = f"💪 Rutina: {rutina.nombre}\n🔥 Nivel: {rutina.nivel_dificultad}\n\n📝 Ejercicios a realizar:\n"
         
-        for re in ejercicios:
-            desc_texto += f"- {re.ejercicio.nombre} ({re.ejercicio.musculo})\n"
+        for e in contenido_rutinas.de_rutina(rutina):
+            desc_texto += f"- {e['nombre']} ({e['musculo']})\n"
         
         if calendario_rutina.notas:
             desc_texto += f"\n📌 Notas personales: {calendario_rutina.notas}\n"
@@ -3,6 +3,7 @@ from django.views.decorators.http import require_POST
 from django.http import JsonResponse
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from api_ejercicio.models import (
     Rutina,
     RutinaEjercicio,
@@ -13,34 +14,23 @@ from api_ejercicio.models import (
 import json
 import traceback
 
+from .contenido_rutinas import contenido_rutinas
+
 
 @login_required
 def ver_rutina_detalle(request, rutina_id):
-    rutina = get_object_or_404(Rutina, id=rutina_id)
-
-    ejercicios_qs = (
-        RutinaEjercicio.objects
-        .filter(rutina=rutina)
-        .select_related("ejercicio")
-        .values(
-            "ejercicio__id",
-            "ejercicio__nombre",
-            "ejercicio__descripcion",
-            "ejercicio__musculo__nombre",
-            "ejercicio__nivel_dificultad__nombre"
-        )
-    )
+    rutina = get_object_or_404(Rutina.objects.select_related("nivel_dificultad"), id=rutina_id)
 
     ejercicios = []
-    for e in ejercicios_qs:
+    for e in contenido_rutinas.de_rutina(rutina):
         # Manejo seguro de None
-        musculo = e.get("ejercicio__musculo__nombre") or "General"
-        nivel = e.get("ejercicio__nivel_dificultad__nombre") or "Básico"
+        musculo = e["musculo"] or "General"
+        nivel = e["nivel"] or "Básico"
         
         ejercicios.append({
-            "id": e["ejercicio__id"],
-            "nombre": e["ejercicio__nombre"],
-            "descripcion": e["ejercicio__descripcion"] or "",
+            "id": e["id"],
+            "nombre": e["nombre"],
+            "descripcion": e["descripcion"] or "",
             "musculo": musculo,
             "nivel": nivel,
         })
@@ -80,23 +70,25 @@ def editar_rutina(request):
         # Verificar propiedad
         rutina = Rutina.objects.get(id=rutina_id, perfil=request.user)
 
-        # Actualizar nombre y descripción
-        rutina.nombre = nuevo_nombre
-        rutina.descripcion = nueva_desc or rutina.descripcion
-        rutina.save()
-
-        # Resetear ejercicios (Borrar y crear)
-        RutinaEjercicio.objects.filter(rutina=rutina).delete()
-
-        # Insertar nuevos ejercicios
-        for e in nuevos_ejercicios:
-            ej_id = e.get("id")
-            if ej_id:
-                try:
-                    ej = Ejercicio.objects.get(id=ej_id)
-                    RutinaEjercicio.objects.create(rutina=rutina, ejercicio=ej)
-                except Ejercicio.DoesNotExist:
-                    continue 
+        # En una transacción: la rutina se marca como actualizada una sola vez al confirmar
+        with transaction.atomic():
+            # Actualizar nombre y descripción
+            rutina.nombre = nuevo_nombre
+            rutina.descripcion = nueva_desc or rutina.descripcion
+            rutina.save()
+
+            # Resetear ejercicios (Borrar y crear)
+            RutinaEjercicio.objects.filter(rutina=rutina).delete()
+
+            # Insertar nuevos ejercicios
+            for e in nuevos_ejercicios:
+                ej_id = e.get("id")
+                if ej_id:
+                    try:
+                        ej = Ejercicio.objects.get(id=ej_id)
+                        RutinaEjercicio.objects.create(rutina=rutina, ejercicio=ej)
+                    except Ejercicio.DoesNotExist:
+                        continue
 
         return JsonResponse({
             "success": True,
@@ -126,25 +118,26 @@ def duplicar_rutina(request):
         if not rutina.vigente:
             return JsonResponse({"success": False, "error": "No se puede duplicar una rutina desactivada."}, status=400)
 
-        # Crear copia
-        nueva_rutina = Rutina.objects.create(
-            nombre=f"{rutina.nombre} (Copia)",
-            descripcion=rutina.descripcion,
-            perfil=request.user,
-            nivel_dificultad=rutina.nivel_dificultad,
-            vigente=True,
-        )
-
-        # Copiar ejercicios
-        ejercicios = RutinaEjercicio.objects.filter(rutina=rutina)
-        for e in ejercicios:
-            RutinaEjercicio.objects.create(
-                rutina=nueva_rutina,
-                ejercicio=e.ejercicio,
-                repeticiones=e.repeticiones,
-                orden=e.orden,
+        with transaction.atomic():
+            # Crear copia
+            nueva_rutina = Rutina.objects.create(
+                nombre=f"{rutina.nombre} (Copia)",
+                descripcion=rutina.descripcion,
+                perfil=request.user,
+                nivel_dificultad=rutina.nivel_dificultad,
+                vigente=True,
             )
 
+            # Copiar ejercicios
+            ejercicios = RutinaEjercicio.objects.filter(rutina=rutina)
+            for e in ejercicios:
+                RutinaEjercicio.objects.create(
+                    rutina=nueva_rutina,
+                    ejercicio=e.ejercicio,
+                    repeticiones=e.repeticiones,
+                    orden=e.orden,
+                )
+
         return JsonResponse({
             "success": True,
             "message": "Rutina duplicada correctamente.",
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.1 on 2026-10-18 13:00
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_ejercicio', '0004_rutinaguardada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rutina',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True, db_column='ACTUALIZADO', default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='calendariorutina',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True, db_column='ACTUALIZADO', default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='calendariorutina',
+            index=models.Index(fields=['perfil', 'fecha'], name='calendario_perfil_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='calendariorutina',
+            index=models.Index(fields=['perfil', 'actualizado'], name='calendario_perfil_act_idx'),
+        ),
+        migrations.CreateModel(
+            name='CalendarioRutinaEliminado',
+            fields=[
+                ('id', models.AutoField(db_column='ID', primary_key=True, serialize=False)),
+                ('perfil_id', models.BigIntegerField(db_column='PERFIL_ID')),
+                ('evento_id', models.IntegerField(db_column='EVENTO_ID')),
+                ('eliminado', models.DateTimeField(auto_now_add=True, db_column='ELIMINADO')),
+            ],
+            options={
+                'db_table': 'CALENDARIO_RUTINA_ELIMINADO',
+                'indexes': [models.Index(fields=['perfil_id', 'eliminado'], name='calendario_elim_perfil_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.0.1 on 2026-10-18 16:00
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def llenar_adherencia(apps, schema_editor):
+    CalendarioRutina = apps.get_model('api_ejercicio', 'CalendarioRutina')
+    AdherenciaMensual = apps.get_model('api_ejercicio', 'AdherenciaMensual')
+
+    meses = defaultdict(lambda: {'programadas': 0, 'completadas': 0, 'dias': defaultdict(int)})
+    for perfil_id, fecha, completada in CalendarioRutina.objects.values_list('perfil_id', 'fecha', 'completada').iterator():
+        mes = meses[(perfil_id, fecha.year, fecha.month)]
+        mes['programadas'] += 1
+        if completada:
+            mes['completadas'] += 1
+            mes['dias'][fecha.day] += 1
+
+    AdherenciaMensual.objects.bulk_create([
+        AdherenciaMensual(
+            perfil_id=perfil_id, anio=anio, mes=numero,
+            programadas=mes['programadas'], completadas=mes['completadas'],
+            dias_completados={str(dia): n for dia, n in sorted(mes['dias'].items())},
+        )
+        for (perfil_id, anio, numero), mes in meses.items()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_ejercicio', '0005_calendario_sync'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AdherenciaMensual',
+            fields=[
+                ('id', models.AutoField(db_column='ID', primary_key=True, serialize=False)),
+                ('anio', models.PositiveSmallIntegerField(db_column='ANIO')),
+                ('mes', models.PositiveSmallIntegerField(db_column='MES')),
+                ('programadas', models.IntegerField(db_column='PROGRAMADAS', default=0)),
+                ('completadas', models.IntegerField(db_column='COMPLETADAS', default=0)),
+                ('dias_completados', models.JSONField(db_column='DIAS_COMPLETADOS', default=dict)),
+                ('perfil', models.ForeignKey(db_column='PERFIL_ID', on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'ADHERENCIA_MENSUAL',
+                'unique_together': {('perfil', 'anio', 'mes')},
+            },
+        ),
+        migrations.RunPython(llenar_adherencia, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 18:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api_ejercicio', '0006_adherenciamensual'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calendariorutinaeliminado',
+            name='fecha',
+            field=models.DateField(blank=True, db_column='FECHA', null=True),
+        ),
+    ]
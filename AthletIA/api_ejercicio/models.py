@@ -77,6 +77,8 @@ class Rutina(models.Model):
     descripcion = models.TextField(null=True, db_column="DESCRIPCION")
     fecha_creacion = models.DateTimeField(auto_now_add=True, db_column="FECHA_CREACION")
     vigente = models.BooleanField(default=True, db_column="VIGENTE")
+    # Último cambio de la rutina o de sus ejercicios (feed incremental del calendario)
+    actualizado = models.DateTimeField(auto_now=True, db_column="ACTUALIZADO")
 
     perfil = models.ForeignKey('App.Perfil', on_delete=models.CASCADE, db_column="PERFIL_ID")
     nivel_dificultad = models.ForeignKey(NivelDificultad, on_delete=models.PROTECT, db_column="NIVEL_DIFICULTAD_DIFICULTAD_ID")
@@ -138,10 +140,43 @@ class CalendarioRutina(models.Model):
     hora = models.TimeField(null=True, blank=True, db_column="HORA")
     completada = models.BooleanField(default=False, db_column="COMPLETADA")
     notas = models.TextField(null=True, blank=True, db_column="NOTAS")
+    actualizado = models.DateTimeField(auto_now=True, db_column="ACTUALIZADO")
 
     def __str__(self):
         return f"{self.perfil.username} - {self.rutina.nombre} ({self.fecha})"
 
     class Meta:
         db_table = "CALENDARIO_RUTINA"
-        unique_together = ('perfil', 'rutina', 'fecha')
\ No newline at end of file
+        unique_together = ('perfil', 'rutina', 'fecha')
+        indexes = [
+            models.Index(fields=["perfil", "fecha"], name="calendario_perfil_fecha_idx"),
+            models.Index(fields=["perfil", "actualizado"], name="calendario_perfil_act_idx"),
+        ]
+
+
+class CalendarioRutinaEliminado(models.Model):
+    """Eventos borrados del calendario o movidos de fecha, para que el feed incremental avise al cliente."""
+    id = models.AutoField(primary_key=True, db_column="ID")
+    perfil_id = models.BigIntegerField(db_column="PERFIL_ID")
+    evento_id = models.IntegerField(db_column="EVENTO_ID")
+    fecha = models.DateField(null=True, blank=True, db_column="FECHA")   # fecha que dejó el evento
+    eliminado = models.DateTimeField(auto_now_add=True, db_column="ELIMINADO")
+
+    class Meta:
+        db_table = "CALENDARIO_RUTINA_ELIMINADO"
+        indexes = [models.Index(fields=["perfil_id", "eliminado"], name="calendario_elim_perfil_idx")]
+
+
+class AdherenciaMensual(models.Model):
+    """Resumen por perfil y mes del calendario (KPI mensual); lo mantiene IA/adherencia_mensual.py."""
+    id = models.AutoField(primary_key=True, db_column="ID")
+    perfil = models.ForeignKey('App.Perfil', on_delete=models.CASCADE, db_column="PERFIL_ID")
+    anio = models.PositiveSmallIntegerField(db_column="ANIO")
+    mes = models.PositiveSmallIntegerField(db_column="MES")
+    programadas = models.IntegerField(default=0, db_column="PROGRAMADAS")
+    completadas = models.IntegerField(default=0, db_column="COMPLETADAS")
+    dias_completados = models.JSONField(default=dict, db_column="DIAS_COMPLETADOS")
+
+    class Meta:
+        db_table = "ADHERENCIA_MENSUAL"
+        unique_together = ('perfil', 'anio', 'mes')
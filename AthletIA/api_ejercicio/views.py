@@ -4,20 +4,18 @@ from django.urls import reverse
 from django.contrib import messages
 
 from App.models import ObjetivoUsuario, Perfil, ProgresoUsuario
+from App.snapshot_perfil import cargar_snapshot
 from api_ejercicio.forms import *
 from api_ejercicio.models import *
 
 @login_required
 def generar_rutina(request):
-    perfil = Perfil.objects.get(id=request.user.id)
-    progreso = ProgresoUsuario.objects.filter(perfil=perfil).first()
-    objetivo = ObjetivoUsuario.objects.filter(perfil=perfil, activo=True).first()
-    salud = getattr(perfil, 'salud_usuario', None)
+    snap = cargar_snapshot(request.user)
 
-    if progreso and objetivo and salud and progreso.peso_kg and progreso.altura_cm:
+    if snap.tiene_objetivo and snap.salud and snap.peso_kg and snap.altura_cm:
         return redirect('recomendador_view')
 
-    return render(request, 'IA/stepper_rutina.html', {"perfil": perfil})
+    return render(request, 'IA/stepper_rutina.html', {"perfil": snap.perfil})
 
 @login_required
 def mapa_corporal(request):